@@ -0,0 +1,266 @@
+import time
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+
+from instrumentation import instrumentation
+
+
+class OptimizationTimeout(Exception):
+    """Levée quand une optimisation SLSQP dépasse sa durée maximale."""
+
+
+# Régularisation relative de la diagonale, pour les actifs de variance nulle (rendements complétés par des zéros)
+RIDGE = 1e-4
+
+
+def project_capped_simplex(weights: np.ndarray, max_weight: float) -> np.ndarray:
+    """
+    Ramène des poids bruts à des poids positifs, plafonnés et de somme 1 (ou moins si le plafond l'impose).
+
+    Args:
+        weights: Poids bruts (trajectoires × produits)
+        max_weight: Poids maximal par produit
+
+    Returns:
+        np.ndarray: Poids admissibles
+    """
+    weights = np.clip(weights, 0.0, None)
+    total = weights.sum(axis=1, keepdims=True)
+    nb_products = weights.shape[1]
+    weights = np.where(total > 0, weights / np.where(total > 0, total, 1.0), 1.0 / nb_products)
+
+    # Redistribution itérative de l'excédent des produits plafonnés
+    for _ in range(nb_products):
+        excess = np.clip(weights - max_weight, 0.0, None).sum(axis=1, keepdims=True)
+        if not excess.any():
+            break
+        weights = np.minimum(weights, max_weight)
+        free = np.where(weights < max_weight, weights, 0.0)
+        free_total = free.sum(axis=1, keepdims=True)
+        weights = weights + np.where(free_total > 0, excess * free / np.where(free_total > 0, free_total, 1.0), 0.0)
+
+    return np.minimum(weights, max_weight)
+
+
+def regularized_covariance(returns_df: pd.DataFrame) -> np.ndarray:
+    """
+    Calcule la matrice de covariance d'une fenêtre de rendements, rétrécie vers sa diagonale.
+
+    Avec 12 semaines de rendements, la covariance empirique est singulière dès 12 actifs. Elle est
+    combinée à sa diagonale avec l'intensité de Ledoit-Wolf, qui croît avec le bruit d'estimation,
+    puis légèrement régularisée pour être inversible.
+
+    Args:
+        returns_df: Rendements historiques (une colonne par actif, NaN remplacés par la moyenne de l'actif)
+
+    Returns:
+        np.ndarray: Covariance (actifs × actifs)
+    """
+    returns = returns_df.to_numpy(dtype=float)
+    with np.errstate(invalid='ignore'):
+        centered = np.nan_to_num(returns - np.nanmean(returns, axis=0))
+    nb_weeks, nb_assets = centered.shape
+    sample = centered.T @ centered / nb_weeks
+    variances = np.diag(sample)
+
+    # Intensité de Ledoit-Wolf vers la diagonale : variance d'estimation des covariances / leur dispersion
+    squares = centered * centered
+    pi_full = np.sum(squares.sum(axis=1) ** 2) / nb_weeks - np.sum(sample * sample)
+    pi_diagonal = np.sum(squares * squares) / nb_weeks - np.sum(variances * variances)
+    gamma = np.sum(sample * sample) - np.sum(variances * variances)
+    shrinkage = float(np.clip((pi_full - pi_diagonal) / (nb_weeks * gamma), 0.0, 1.0)) if gamma > 0 else 1.0
+
+    cov = ((1 - shrinkage) * sample + shrinkage * np.diag(variances)) * nb_weeks / max(nb_weeks - 1, 1)
+    ridge = RIDGE * np.trace(cov) / max(nb_assets, 1) + 1e-12
+    return cov + ridge * np.eye(nb_assets)
+
+
+def min_variance_weights(cov: np.ndarray, max_weight: float) -> np.ndarray:
+    """
+    Portefeuille de variance minimale, en forme fermée.
+
+    Poids proportionnels à Σ⁻¹1 ; les poids négatifs sont ramenés à 0 puis les poids sont plafonnés.
+
+    Args:
+        cov: Covariance régularisée (actifs × actifs)
+        max_weight: Poids maximal par actif
+
+    Returns:
+        np.ndarray: Poids
+    """
+    raw = np.linalg.solve(cov, np.ones(cov.shape[0]))
+    return project_capped_simplex(raw[None, :], max_weight)[0]
+
+
+def inverse_volatility_weights(cov: np.ndarray, max_weight: float) -> np.ndarray:
+    """
+    Poids inversement proportionnels à la volatilité de chaque actif.
+
+    Args:
+        cov: Covariance régularisée (actifs × actifs)
+        max_weight: Poids maximal par actif
+
+    Returns:
+        np.ndarray: Poids
+    """
+    raw = 1 / np.sqrt(np.diag(cov))
+    return project_capped_simplex(raw[None, :], max_weight)[0]
+
+
+def risk_parity_weights(cov: np.ndarray, max_weight: float, tol: float = 1e-10, max_iter: int = 1000) -> np.ndarray:
+    """
+    Portefeuille de parité de risque (contributions au risque égales), par point fixe.
+
+    Le portefeuille minimise f(x) = ½ xᵀΣx - Σ b_i log x_i. Chaque itération calcule, pour tous les actifs
+    à la fois, la racine positive de σ_ii x_i² + c_i x_i - b_i = 0 (minimum de f selon x_i, les autres
+    poids étant fixés), puis avance vers ce point fixe avec un pas réduit tant que f ne diminue pas.
+    Une itération ne coûte que deux produits matrice-vecteur.
+
+    Args:
+        cov: Covariance régularisée (actifs × actifs)
+        max_weight: Poids maximal par actif
+        tol: Écart relatif maximal entre deux itérations pour s'arrêter
+        max_iter: Nombre maximal d'itérations
+
+    Returns:
+        np.ndarray: Poids
+    """
+    nb_assets = cov.shape[0]
+    budget = np.full(nb_assets, 1.0 / nb_assets)
+    variances = np.diag(cov)
+
+    def objective(x: np.ndarray, cov_x: np.ndarray) -> float:
+        return 0.5 * x @ cov_x - budget @ np.log(x)
+
+    # Départ : poids inverses de la volatilité
+    x = 1 / np.sqrt(variances)
+    x /= np.sqrt(x @ cov @ x)
+    cov_x = cov @ x
+    value = objective(x, cov_x)
+
+    for _ in range(max_iter):
+        others = cov_x - variances * x
+        step = (-others + np.sqrt(others * others + 4 * variances * budget)) / (2 * variances) - x
+        cov_step = cov @ step
+
+        # Recherche linéaire : la direction diminue f, le pas complet peut la dépasser
+        alpha = 1.0
+        while True:
+            candidate = x + alpha * step
+            candidate_value = objective(candidate, cov_x + alpha * cov_step)
+            if candidate_value <= value or alpha < 1e-6:
+                break
+            alpha /= 2
+
+        converged = np.max(np.abs(candidate - x)) < tol * np.max(candidate)
+        x, cov_x, value = candidate, cov_x + alpha * cov_step, candidate_value
+        if converged:
+            break
+
+    return project_capped_simplex(x[None, :], max_weight)[0]
+
+
+# Allocateurs rapides sélectionnables par nom (voir Simulation.allocate)
+ALLOCATORS: Dict[str, Callable[[np.ndarray, float], np.ndarray]] = {
+    'min_variance': min_variance_weights,
+    'inverse_volatility': inverse_volatility_weights,
+    'risk_parity': risk_parity_weights,
+}
+
+
+def allocate_weights(allocator: str, returns_df: pd.DataFrame, max_weight: float = 0.20) -> Dict[str, float]:
+    """
+    Calcule les poids cibles d'une fenêtre de rendements avec un allocateur rapide.
+
+    Args:
+        allocator: Nom de l'allocateur (voir ALLOCATORS)
+        returns_df: Rendements historiques (une colonne par actif)
+        max_weight: Poids maximal par actif
+
+    Returns:
+        Dict[str, float]: Poids cible de chaque actif
+    """
+    if allocator not in ALLOCATORS:
+        raise ValueError(f"Allocateur inconnu : {allocator}")
+    weights = ALLOCATORS[allocator](regularized_covariance(returns_df), max_weight)
+    return dict(zip(returns_df.columns, weights))
+
+
+def max_sharpe_slsqp(returns_df: pd.DataFrame, risk_free_rate: float = 0.02, max_weight: float = 0.20,
+                     timeout: Optional[float] = None, fallback: Optional[str] = None) -> Dict[str, float]:
+    """
+    Optimize portfolio weights to maximize Sharpe ratio (SLSQP)
+    
+    Args:
+        returns_df: DataFrame with historical returns (one column per asset)
+        risk_free_rate: Annual risk-free rate (default: 2%)
+        max_weight: Maximum weight per asset (default: 20%)
+        timeout: Maximum duration of the optimization in seconds (default: none)
+        fallback: Fast allocator (see ALLOCATORS) used if SLSQP fails or times out (default: none,
+                  SLSQP weights are returned as is and a timeout raises OptimizationTimeout)
+        
+    Returns:
+        Dictionary mapping asset tickers to their optimal weights
+    """
+    if fallback is not None and fallback not in ALLOCATORS:
+        raise ValueError(f"Allocateur inconnu : {fallback}")
+    deadline = None if timeout is None else time.perf_counter() + timeout
+    
+    # Calculer la matrice de covariance
+    cov_matrix = returns_df.cov()
+    
+    # Calculer les rendements moyens
+    mean_returns = returns_df.mean()
+    
+    # Fonction objective : maximiser le ratio de Sharpe
+    def objective(weights):
+        if deadline is not None and time.perf_counter() > deadline:
+            raise OptimizationTimeout(f"Optimisation interrompue après {timeout} s")
+        portfolio_return = np.sum(mean_returns * weights) * 252  # Annualisé
+        portfolio_volatility = np.sqrt(np.dot(weights.T, np.dot(cov_matrix, weights))) * np.sqrt(252)
+        sharpe_ratio = (portfolio_return - risk_free_rate) / portfolio_volatility
+        return -sharpe_ratio  # On minimise le négatif pour maximiser le ratio
+    
+    # Contraintes
+    n_assets = len(returns_df.columns)
+    constraints = [
+        {'type': 'eq', 'fun': lambda x: np.sum(x) - 1},  # Somme des poids = 1
+        {'type': 'ineq', 'fun': lambda x: x}  # Poids >= 0
+    ]
+    bounds = tuple((0, max_weight) for _ in range(n_assets))  # Maximum max_weight par actif
+    
+    # Poids initiaux (égaux)
+    initial_weights = np.array([1/n_assets] * n_assets)
+    
+    # Optimisation
+    try:
+        result = minimize(
+            objective,
+            initial_weights,
+            method='SLSQP',
+            bounds=bounds,
+            constraints=constraints
+        )
+    except OptimizationTimeout:
+        if fallback is None:
+            raise
+        instrumentation.count('optimize_fallbacks')
+        return allocate_weights(fallback, returns_df, max_weight)
+    
+    instrumentation.count('optimize_iterations', result.nit)
+    
+    # Échec de SLSQP : poids de l'allocateur de repli
+    if fallback is not None and not (result.success and np.isfinite(result.x).all()):
+        instrumentation.count('optimize_fallbacks')
+        return allocate_weights(fallback, returns_df, max_weight)
+    
+    # Obtenir les poids optimaux
+    optimal_weights = result.x
+    
+    # Créer un dictionnaire des poids optimaux
+    target_weights = dict(zip(returns_df.columns, optimal_weights))
+    
+    return target_weights
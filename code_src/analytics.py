@@ -0,0 +1,254 @@
+import os
+import sqlite3
+import time
+from typing import Optional, Sequence
+
+import pandas as pd
+
+from base_builder import get_db_path, to_day
+
+try:
+    import duckdb
+except ImportError:  # DuckDB est facultatif : les rapports s'exécutent alors sur SQLite
+    duckdb = None
+
+
+# Tables de la base utilisées par les rapports
+ANALYTICS_TABLES = ('Clients', 'Managers', 'Portfolios', 'Products', 'Portfolios_Products', 'Deals',
+                    'Portfolio_Rankings', 'Manager_Rankings')
+
+# Vues remplacées par l'export Parquet (voir parquet_export.py), avec les colonnes de la table SQLite
+PARQUET_VIEWS = {
+    'Deals': ('deals', 'id, portfolio_id, product_id, date, action, quantity, price'),
+    'Portfolios_Products': ('portfolios_products', 'portfolio_id, product_id, quantity, weight, value'),
+    'Prices': ('prices', 'product_id, ticker, date, price, returns'),
+}
+
+
+class AnalyticsDB:
+    """
+    Couche de requêtes analytiques en lecture seule.
+
+    Avec DuckDB, les tables de la base sont attachées (extension sqlite) ou, si l'extension n'est
+    pas disponible, chargées une fois en colonnes ; les deals, les prix et les compositions peuvent
+    être lus dans l'export Parquet. Sans DuckDB, les mêmes requêtes sont exécutées par SQLite.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, parquet_path: Optional[str] = None, backend: str = 'auto'):
+        """
+        Ouvre la couche analytique.
+
+        Args:
+            db_path: Chemin de la base SQLite (par défaut: get_db_path())
+            parquet_path: (facultatif) Dossier d'un export Parquet remplaçant Deals et Portfolios_Products
+            backend: 'auto' (DuckDB si installé), 'duckdb' ou 'sqlite'
+        """
+        if backend not in ('auto', 'duckdb', 'sqlite'):
+            raise ValueError(f"Moteur inconnu : {backend}")
+        if backend == 'duckdb' and duckdb is None:
+            raise ImportError("DuckDB n'est pas installé (pip install duckdb)")
+        if db_path is None:
+            db_path = get_db_path()
+
+        self.backend = 'sqlite' if backend == 'sqlite' or duckdb is None else 'duckdb'
+        self.db_path = db_path
+
+        if self.backend == 'sqlite':
+            if parquet_path is not None:
+                print("⚠️ L'export Parquet nécessite DuckDB : les tables SQLite sont utilisées")
+            self.connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+            self.tables = {row[0] for row in self.connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+                           if row[0] in ANALYTICS_TABLES}
+        else:
+            self.connection = duckdb.connect()
+            self._load_sqlite_tables()
+            if parquet_path is not None:
+                self._load_parquet_views(parquet_path)
+
+    def _load_sqlite_tables(self) -> None:
+        """Expose les tables de la base comme vues DuckDB (attachées, ou copiées en colonnes à défaut)."""
+        source = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        try:
+            existing = {row[0] for row in source.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            tables = [table for table in ANALYTICS_TABLES if table in existing]
+            self.tables = set(tables)
+            try:
+                self.connection.execute(f"ATTACH '{self.db_path}' AS fund (TYPE sqlite, READ_ONLY)")
+                for table in tables:
+                    self.connection.execute(f"CREATE VIEW {table} AS SELECT * FROM fund.{table}")
+            except duckdb.Error:
+                # Extension sqlite indisponible (hors ligne) : chargement en une requête par table
+                for table in tables:
+                    self.connection.register(table, pd.read_sql_query(f"SELECT * FROM {table}", source))
+        finally:
+            source.close()
+
+    def _load_parquet_views(self, parquet_path: str) -> None:
+        """Remplace les vues des tables exportées par des lectures des fichiers Parquet partitionnés."""
+        for view, (dataset, columns) in PARQUET_VIEWS.items():
+            dataset_path = os.path.join(parquet_path, dataset)
+            if not os.path.isdir(dataset_path):
+                continue
+            if view in {row[0] for row in self.connection.execute("SELECT view_name FROM duckdb_views()").fetchall()}:
+                self.connection.execute(f"DROP VIEW {view}")
+            else:
+                self.connection.unregister(view)
+            pattern = os.path.join(dataset_path, '**', '*.parquet').replace("'", "''")
+            self.connection.execute(f"""
+                CREATE VIEW {view} AS
+                SELECT {columns} FROM read_parquet('{pattern}', hive_partitioning = true)
+            """)
+            self.tables.add(view)
+
+    def month_expression(self, column: str) -> str:
+        """
+        Retourne l'expression SQL du mois 'YYYY-MM' d'une colonne de numéros de jour.
+
+        Args:
+            column: Colonne de dates (numéros de jour depuis le 01/01/1970)
+
+        Returns:
+            str: Expression propre au moteur
+        """
+        if self.backend == 'duckdb':
+            return f"strftime(DATE '1970-01-01' + CAST({column} AS INTEGER), '%Y-%m')"
+        return f"strftime('%Y-%m', {column} * 86400, 'unixepoch')"
+
+    def require(self, table: str) -> None:
+        """
+        Vérifie qu'une table nécessaire à un rapport est disponible.
+
+        Args:
+            table: Nom de la table
+
+        Raises:
+            ValueError: Si la table n'existe pas dans la base (ni dans l'export Parquet)
+        """
+        if table not in self.tables:
+            hint = " (lancer d'abord get_portfolio_rankings)" if table.endswith('_Rankings') else ""
+            raise ValueError(f"Table {table} absente de la base{hint}")
+
+    def query(self, sql: str, params: Sequence = ()) -> pd.DataFrame:
+        """
+        Exécute une requête et retourne son résultat.
+
+        Args:
+            sql: Requête SQL (paramètres '?', syntaxe commune à SQLite et DuckDB)
+            params: Paramètres de la requête
+
+        Returns:
+            pd.DataFrame: Résultat de la requête
+        """
+        if self.backend == 'duckdb':
+            return self.connection.execute(sql, list(params)).df()
+        return pd.read_sql_query(sql, self.connection, params=list(params))
+
+    def close(self) -> None:
+        """Ferme la connexion."""
+        self.connection.close()
+
+    def __enter__(self) -> 'AnalyticsDB':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def portfolio_ranking_report(analytics: AnalyticsDB) -> pd.DataFrame:
+    """
+    Classement des portefeuilles par performance (table Portfolio_Rankings, voir get_portfolio_rankings).
+
+    Args:
+        analytics: Couche analytique
+
+    Returns:
+        pd.DataFrame: Une ligne par portefeuille, avec son rang global et dans sa stratégie
+    """
+    analytics.require('Portfolio_Rankings')
+    return analytics.query("""
+        SELECT portfolio_id, client_name, manager_name, strategy, initial_value, final_value, performance,
+               RANK() OVER (ORDER BY performance DESC) AS rank,
+               RANK() OVER (PARTITION BY strategy ORDER BY performance DESC) AS strategy_rank
+        FROM Portfolio_Rankings
+        ORDER BY rank, portfolio_id
+    """)
+
+
+def manager_aum_report(analytics: AnalyticsDB) -> pd.DataFrame:
+    """
+    Encours (AUM) et performance par manager, à partir des valeurs finales classées.
+
+    Args:
+        analytics: Couche analytique
+
+    Returns:
+        pd.DataFrame: Une ligne par manager : nombre de portefeuilles, investissement initial, AUM,
+        performance moyenne et pondérée par l'investissement, part de l'AUM du fonds
+    """
+    analytics.require('Portfolio_Rankings')
+    return analytics.query("""
+        SELECT manager_id, manager_name,
+               COUNT(*) AS nb_portfolios,
+               SUM(initial_value) AS initial_value,
+               SUM(final_value) AS aum,
+               AVG(performance) AS average_performance,
+               (SUM(final_value) / SUM(initial_value) - 1) * 100 AS weighted_performance,
+               SUM(final_value) / SUM(SUM(final_value)) OVER () AS aum_share
+        FROM Portfolio_Rankings
+        GROUP BY manager_id, manager_name
+        ORDER BY aum DESC
+    """)
+
+
+def deal_turnover_report(analytics: AnalyticsDB, start_date: Optional[str] = None,
+                         end_date: Optional[str] = None) -> pd.DataFrame:
+    """
+    Rotation des deals par mois et par secteur.
+
+    Args:
+        analytics: Couche analytique
+        start_date: (facultatif) Première date incluse ('YYYY-MM-DD')
+        end_date: (facultatif) Dernière date incluse ('YYYY-MM-DD')
+
+    Returns:
+        pd.DataFrame: Une ligne par mois et secteur : nombre de deals, montants achetés et vendus,
+        montant total échangé
+    """
+    analytics.require('Deals')
+    return analytics.query(f"""
+        SELECT {analytics.month_expression('d.date')} AS month, p.sector,
+               COUNT(*) AS nb_deals,
+               SUM(CASE WHEN d.quantity > 0 THEN d.quantity * d.price ELSE 0 END) AS bought,
+               SUM(CASE WHEN d.quantity < 0 THEN -d.quantity * d.price ELSE 0 END) AS sold,
+               SUM(ABS(d.quantity * d.price)) AS turnover
+        FROM Deals d
+        JOIN Products p ON d.product_id = p.id
+        WHERE d.date >= ? AND d.date <= ?
+        GROUP BY month, p.sector
+        ORDER BY month, p.sector
+    """, (-2**31 if start_date is None else to_day(start_date), 2**31 if end_date is None else to_day(end_date)))
+
+
+def print_fund_reports(analytics: AnalyticsDB) -> None:
+    """
+    Affiche les rapports analytiques du fonds et leur durée.
+
+    Args:
+        analytics: Couche analytique
+    """
+    for title, report in (("Classement des portefeuilles", portfolio_ranking_report),
+                          ("AUM par manager", manager_aum_report),
+                          ("Rotation des deals par mois et secteur", deal_turnover_report)):
+        start = time.perf_counter()
+        try:
+            df = report(analytics)
+        except ValueError as e:
+            print(f"⚠️ {title} : {e}")
+            continue
+        print(f"\n=== {title} ({analytics.backend}, {(time.perf_counter() - start) * 1000:.1f} ms) ===")
+        print(df.to_string(index=False))
+
+
+if __name__ == "__main__":
+    with AnalyticsDB() as analytics:
+        print_fund_reports(analytics)
@@ -0,0 +1,240 @@
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from base_builder import Client, Portfolio, from_day, to_day
+from strategies import DEFAULT_PARAMS, Simulation, get_strategy
+from trading_calendar import TradingCalendar
+from position_book import DealBuffer, PositionBook
+from unit_of_work import UnitOfWork
+from repository import Repository
+from performances import SnapshotCollector
+from metrics import compute_performance_metrics
+
+
+class PriceHistory(NamedTuple):
+    """Historique des prix d'un ensemble de produits, chargé une seule fois et partagé en lecture seule."""
+
+    dates: Dict[str, np.ndarray]    # Numéros de jour (int32, voir base_builder.to_day) triés, par ticker
+    prices: Dict[str, np.ndarray]   # Prix, par ticker
+    returns: Dict[str, np.ndarray]  # Rendements (NaN pour la première date), par ticker
+
+
+class PortfolioSetup(NamedTuple):
+    """Description d'un portefeuille nécessaire à sa simulation hors base de données."""
+
+    portfolio_id: int
+    strategy: str
+    registration_date: str                  # 'YYYY-MM-DD'
+    initial_value: float
+    portfolio_size: int
+    tickers: List[str]                      # Ordre des colonnes de get_asset_returns
+    positions: List[Tuple[str, int]]        # (ticker, product_id), ordre de get_portfolio_positions
+    sectors: Dict[str, str]                 # Secteur de chaque ticker (modèle de risque à facteurs)
+
+
+def load_portfolio_setup(db: sqlite3.Connection, portfolio_id: int) -> PortfolioSetup:
+    """
+    Charge la description d'un portefeuille.
+
+    Les produits sont lus par le dépôt, comme dans Simulation, pour conserver le même ordre.
+
+    Args:
+        db: Connexion à la base de données
+        portfolio_id: ID du portefeuille
+
+    Returns:
+        PortfolioSetup: Stratégie, date d'enregistrement, investissement initial et produits du portefeuille
+    """
+    repository = Repository(db)
+    portfolio = repository.get(Portfolio, portfolio_id)
+    client = repository.get(Client, portfolio.client_id) if portfolio else None
+    if client is None:
+        raise ValueError(f"Portefeuille {portfolio_id} non trouvé")
+    products = repository.products_of([portfolio_id])[portfolio_id]
+
+    tickers = [product.ticker for product in products]
+    positions = [(product.ticker, product.id) for product in products]
+    sectors = {product.ticker: product.sector for product in products}
+
+    return PortfolioSetup(portfolio_id, portfolio.strategy, client.registration_date, client.investment_amount,
+                          portfolio.size, tickers, positions, sectors)
+
+def load_price_history(db: sqlite3.Connection, tickers: List[str]) -> PriceHistory:
+    """
+    Charge l'historique complet des prix et rendements de plusieurs produits.
+
+    Args:
+        db: Connexion à la base de données
+        tickers: Tickers des produits
+
+    Returns:
+        PriceHistory: Dates, prix et rendements par ticker
+    """
+    cursor = db.cursor()
+    dates, prices, returns = {}, {}, {}
+    for ticker in dict.fromkeys(tickers):
+        cursor.execute(f"SELECT date, price, returns FROM Returns_{ticker} ORDER BY date")
+        rows = cursor.fetchall()
+        dates[ticker] = np.array([row[0] for row in rows], dtype=np.int32)
+        prices[ticker] = np.array([row[1] for row in rows], dtype=float)
+        returns[ticker] = np.array([np.nan if row[2] is None else row[2] for row in rows], dtype=float)
+    return PriceHistory(dates, prices, returns)
+
+
+class BacktestSimulation(Simulation):
+    """
+    Simulation d'un portefeuille sur un historique de prix en mémoire.
+
+    La logique de la stratégie (_calculate_deals) est celle de Simulation ; seules la lecture des
+    rendements et des positions se fait en mémoire, et l'unité de travail n'a pas de connexion :
+    les deals sont conservés en mémoire, sans modifier la base.
+    Les fenêtres de rendements et les poids optimaux sont mis en cache dans stats_cache, qui peut être
+    partagé entre plusieurs simulations du même portefeuille avec des paramètres différents.
+    """
+
+    def __init__(self, setup: PortfolioSetup, history: PriceHistory, params: Optional[Dict[str, Any]] = None,
+                 stats_cache: Optional[Dict[Any, Any]] = None):
+        """
+        Initialise la simulation.
+
+        Args:
+            setup: Description du portefeuille (voir load_portfolio_setup)
+            history: Historique des prix de ses produits (voir load_price_history)
+            params: Paramètres de la stratégie remplaçant ceux de DEFAULT_PARAMS
+            stats_cache: (facultatif) Cache des statistiques partagé entre simulations
+        """
+        self.db = None
+        self.cursor = None
+        self.portfolio_id = setup.portfolio_id
+        self.strategy = setup.strategy
+        self.registration_date = from_day(to_day(setup.registration_date))
+        self.params = {**DEFAULT_PARAMS, **(params or {})}
+        self.strategy_plugin = get_strategy(setup.strategy, self.params)
+        self.portfolio_value = setup.initial_value
+        self.portfolio_size = setup.portfolio_size
+        self.tickers = list(setup.tickers)
+        self.sectors = dict(setup.sectors)
+        self.repository = None
+        self.portfolio = None  # Pas de carte d'identité : le portefeuille n'existe qu'en mémoire
+
+        self.setup = setup
+        self.history = history
+        self.stats_cache = {} if stats_cache is None else stats_cache
+
+        # État du portefeuille, équivalent de Portfolios_Products et Portfolios.cash_value
+        self.book = PositionBook([ticker for ticker, _ in setup.positions],
+                                 [product_id for _, product_id in setup.positions], setup.initial_value)
+        self.priced = np.ones(len(self.book), dtype=bool)
+        self.deal_buffer = DealBuffer()
+        self.unit_of_work = UnitOfWork(None)  # Sans base : les deals restent en mémoire
+        self.deals = self.unit_of_work.deals  # Tous les deals de la simulation
+
+        self.deals_count = 0
+        self.current_month = None
+        self.rebalance_weights = None
+        self.rebalance_volatility = None
+        self.skipped_rebalances = []
+        self.calendar = None
+        self.query_tracer = None
+        self.query_summary = None
+
+    def _trading_calendar(self, days: np.ndarray) -> TradingCalendar:
+        """Construit le calendrier de rééquilibrage à partir des dates de l'historique en mémoire."""
+        return TradingCalendar(self.history.dates, days)
+
+    def _window(self, ticker: str, date: datetime, lookback_weeks: int) -> Optional[np.ndarray]:
+        """Retourne les lookback_weeks derniers rendements connus à la date donnée, complétés par des zéros."""
+        end = self._asof_row(ticker, date) + 1
+        if end == 0:
+            return None
+        window = self.history.returns[ticker][max(0, end - lookback_weeks):end]
+        if len(window) < lookback_weeks:
+            window = np.concatenate([window, np.zeros(lookback_weeks - len(window))])
+        return window
+
+    def get_asset_returns(self, date: datetime) -> pd.DataFrame:
+        """Get returns for each asset as a DataFrame with the last `lookback_weeks` returns (cached)"""
+        lookback_weeks = self.params['lookback_weeks']
+        key = ('returns', date, lookback_weeks)
+        if key not in self.stats_cache:
+            returns_dict = {}
+            for ticker in self.tickers:
+                window = self._window(ticker, date, lookback_weeks)
+                if window is not None:
+                    returns_dict[ticker] = window
+            self.stats_cache[key] = pd.DataFrame(returns_dict)
+        return self.stats_cache[key]
+
+    def get_portfolio_positions(self, portfolio_id: int, current_date: datetime) -> PositionBook:
+        """
+        Valorise les positions du portefeuille en mémoire au dernier prix connu (mise à jour sur place).
+        """
+        book = self.book
+        for i, ticker in enumerate(book.tickers):
+            end = self._asof_row(ticker, current_date)
+            self.priced[i] = end >= 0
+            if end >= 0:
+                book.prices[i] = self.history.prices[ticker][end]
+        book.revalue()
+        return book.select(self.priced)
+
+    def allocate(self, returns_df: pd.DataFrame, risk_free_rate: float = 0.02, max_weight: float = 0.20) -> Dict[str, float]:
+        """
+        Calcule les poids cibles avec l'allocateur de la stratégie (mis en cache par fenêtre et contraintes).
+        """
+        values = returns_df.to_numpy()
+        key = ('allocate', self.strategy, self.params['allocator'], self.params['fallback_allocator'],
+               self.params['optimize_timeout'], self.params['risk_model'], tuple(returns_df.columns), values.shape, values.tobytes(),
+               risk_free_rate, max_weight)
+        if key not in self.stats_cache:
+            self.stats_cache[key] = super().allocate(returns_df, risk_free_rate, max_weight)
+        return self.stats_cache[key]
+
+
+def run_backtest(setup: PortfolioSetup, history: PriceHistory, params: Optional[Dict[str, Any]] = None,
+                 start_date: Optional[str] = None, end_date: Optional[datetime] = None,
+                 stats_cache: Optional[Dict[Any, Any]] = None) -> Tuple[pd.DataFrame, DealBuffer]:
+    """
+    Simule un portefeuille en mémoire entre deux dates.
+
+    Args:
+        setup: Description du portefeuille
+        history: Historique des prix de ses produits
+        params: Paramètres de la stratégie remplaçant ceux de DEFAULT_PARAMS
+        start_date: Date de début (par défaut: date d'enregistrement du client)
+        end_date: Date de fin (par défaut: 31/12/2024)
+        stats_cache: (facultatif) Cache des statistiques partagé entre simulations
+
+    Returns:
+        Tuple[pd.DataFrame, DealBuffer]:
+            - DataFrame de performance, au format de get_portfolio_performance_df
+            - Deals effectués
+    """
+    simulation = BacktestSimulation(setup, history, params, stats_cache)
+    collector = SnapshotCollector().collect(simulation.iter_weeks(start_date, end_date))
+    return collector.to_dataframe(), simulation.deals
+
+
+def summarize_backtest(performance_df: pd.DataFrame, deals: DealBuffer) -> Dict[str, float]:
+    """
+    Résume le résultat d'une simulation.
+
+    Args:
+        performance_df: DataFrame de performance (colonne 'portfolio_value')
+        deals: Deals effectués
+
+    Returns:
+        Dict[str, float]: Valeur finale, performance, statistiques de performance et nombre de deals
+    """
+    nav = performance_df['portfolio_value'].to_numpy(dtype=float)
+    metrics = compute_performance_metrics(nav)
+    return {
+        'final_value': float(nav[-1]),
+        'performance': float(nav[-1] / nav[0] - 1),
+        **{name: float(values[0]) for name, values in metrics.items()},
+        'nb_deals': len(deals),
+    }
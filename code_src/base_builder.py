@@ -1,7 +1,12 @@
+import numbers
 import os
+import re
 import sqlite3
-from datetime import datetime
-from typing import Optional, List, Dict, Any
+from datetime import date as Date, datetime
+from typing import Optional, List, Dict, Any, Union
+import pandas as pd
+from instrumentation import instrumentation, timed
+from position_book import DealBuffer, PositionBook
 
 
 
@@ -9,14 +14,93 @@ def get_db_path() -> str:
     """
     Retourne le chemin de la base de données dans le dossier parent.
     
+    La variable d'environnement FUND_DB_PATH permet d'utiliser une autre base (tests de performance).
+    
     Returns:
         str: Chemin absolu vers la base de données
     """
+    if os.environ.get("FUND_DB_PATH"):
+        return os.environ["FUND_DB_PATH"]
+    
     # Obtenir le chemin du dossier parent (un niveau au-dessus du dossier code_scr)
     parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     return os.path.join(parent_dir, "fund_database.db")
 
 
+# Les dates sont stockées en numéros de jour depuis le 01/01/1970 (voir BaseModel.migrate_dates_to_integers)
+EPOCH_ORDINAL = Date(1970, 1, 1).toordinal()
+
+# Colonnes de dates des tables (hors tables Returns_{ticker}, colonne date)
+DATE_COLUMNS = {'Deals': 'date', 'Clients': 'registration_date', 'Benchmarks': 'date'}
+
+# Version 'date_encoding' de Data_Version des bases migrées (2 : dates de Benchmarks converties)
+DATE_ENCODING_VERSION = 2
+
+
+def to_day(value: Union[str, Date, datetime, int]) -> int:
+    """
+    Convertit une date en numéro de jour.
+    
+    Args:
+        value: Date 'YYYY-MM-DD', date, datetime ou numéro de jour
+        
+    Returns:
+        int: Nombre de jours depuis le 01/01/1970
+    """
+    if isinstance(value, numbers.Integral):
+        return int(value)
+    if isinstance(value, str):
+        value = Date.fromisoformat(value[:10])
+    return value.toordinal() - EPOCH_ORDINAL
+
+
+def from_day(day: int) -> datetime:
+    """
+    Convertit un numéro de jour en datetime (à minuit).
+    
+    Args:
+        day: Nombre de jours depuis le 01/01/1970
+        
+    Returns:
+        datetime: Date correspondante
+    """
+    return datetime.fromordinal(int(day) + EPOCH_ORDINAL)
+
+
+def day_to_str(day: int) -> str:
+    """
+    Convertit un numéro de jour en date 'YYYY-MM-DD', pour l'affichage et les API.
+    
+    Args:
+        day: Nombre de jours depuis le 01/01/1970
+        
+    Returns:
+        str: Date au format 'YYYY-MM-DD'
+    """
+    return Date.fromordinal(int(day) + EPOCH_ORDINAL).isoformat()
+
+
+# Nombre maximal de clés par liste IN (limite des paramètres de SQLite)
+SQL_IN_CHUNK = 900
+
+
+def in_chunks(keys: List[Any], size: int = SQL_IN_CHUNK):
+    """
+    Découpe des clés en lots pour les requêtes « WHERE ... IN (?, ...) ».
+    
+    Args:
+        keys: Clés à rechercher (doublons retirés, ordre conservé)
+        size: Nombre maximal de clés par lot
+        
+    Yields:
+        Tuple[List[Any], str]: Clés du lot et marqueurs '?, ?, ...' correspondants
+    """
+    keys = list(dict.fromkeys(keys))
+    for start in range(0, len(keys), size):
+        chunk = keys[start:start + size]
+        yield chunk, ", ".join("?" * len(chunk))
+
+
 class BaseModel:
     """Classe de base pour tous les modèles de données."""
     
@@ -35,6 +119,9 @@ class BaseModel:
             conn = sqlite3.connect(db_file)
             cursor = conn.cursor()
 
+            # Convertir les dates d'une base existante avant de compléter son schéma
+            cls.migrate_dates_to_integers(conn)
+
             # Création des tables
             cursor.executescript("""
                 CREATE TABLE IF NOT EXISTS Clients (
@@ -44,7 +131,7 @@ class BaseModel:
                     country TEXT NOT NULL,
                     email TEXT NOT NULL UNIQUE,
                     risk_profile TEXT NOT NULL,
-                    registration_date TEXT NOT NULL,
+                    registration_date INTEGER NOT NULL,
                     investment_amount REAL NOT NULL,
                     manager_id INTEGER NOT NULL,
                     portfolio_id INTEGER NOT NULL,
@@ -114,7 +201,7 @@ class BaseModel:
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     portfolio_id INTEGER NOT NULL,
                     product_id INTEGER NOT NULL,
-                    date TEXT NOT NULL,
+                    date INTEGER NOT NULL,
                     action TEXT NOT NULL,
                     quantity INTEGER NOT NULL,
                     price REAL NOT NULL,
@@ -122,6 +209,42 @@ class BaseModel:
                     FOREIGN KEY (product_id) REFERENCES Products (id)
                 );
 
+                CREATE TABLE IF NOT EXISTS Benchmarks (
+                    name TEXT NOT NULL,
+                    date INTEGER NOT NULL,
+                    price REAL,
+                    returns REAL,
+                    PRIMARY KEY (name, date)
+                );
+
+                CREATE TABLE IF NOT EXISTS Portfolio_Rankings (
+                    portfolio_id INTEGER PRIMARY KEY,
+                    inputs_version TEXT NOT NULL,
+                    manager_id INTEGER NOT NULL,
+                    client_name TEXT NOT NULL,
+                    manager_name TEXT NOT NULL,
+                    strategy TEXT NOT NULL,
+                    initial_value REAL NOT NULL,
+                    final_value REAL NOT NULL,
+                    performance REAL NOT NULL,
+                    FOREIGN KEY (portfolio_id) REFERENCES Portfolios (id),
+                    FOREIGN KEY (manager_id) REFERENCES Managers (id)
+                );
+
+                CREATE TABLE IF NOT EXISTS Manager_Rankings (
+                    manager_id INTEGER PRIMARY KEY,
+                    manager_name TEXT NOT NULL,
+                    nb_portfolios INTEGER NOT NULL,
+                    average_performance REAL NOT NULL,
+                    total_aum REAL NOT NULL,
+                    FOREIGN KEY (manager_id) REFERENCES Managers (id)
+                );
+
+                CREATE TABLE IF NOT EXISTS Data_Version (
+                    name TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL
+                );
+
             """)
             
             conn.commit()
@@ -140,12 +263,185 @@ class BaseModel:
         """
         Crée et retourne une connexion à la base de données avec timeout.
         
+        La base doit avoir été migrée (voir create_database) : la connexion ne modifie pas son schéma.
+        
         Returns:
             sqlite3.Connection: Connexion à la base de données
         """
         conn = sqlite3.connect(get_db_path(), timeout=10)  # 30 secondes de timeout
+        try:
+            cls.check_date_encoding(conn)
+        except Exception:
+            conn.close()
+            raise
         return conn
 
+    @classmethod
+    def check_date_encoding(cls, db: sqlite3.Connection) -> None:
+        """
+        Vérifie que les dates de la base sont stockées en numéros de jour.
+        
+        Args:
+            db: Connexion à la base de données
+            
+        Raises:
+            RuntimeError: Si la base n'a pas été migrée par BaseModel.create_database
+        """
+        if cls.get_data_version(db, 'date_encoding') < DATE_ENCODING_VERSION:
+            raise RuntimeError("❌ Les dates de la base ne sont pas migrées : exécutez d'abord BaseModel.create_database() "
+                               "(ou lancez main.py)")
+
+    @classmethod
+    def snapshot_connection(cls, db: Optional[sqlite3.Connection] = None, path: Optional[str] = None) -> sqlite3.Connection:
+        """
+        Copie la base dans un instantané, en une étape de l'API de sauvegarde de SQLite (backup).
+        
+        Les analyses et simulations exécutées sur l'instantané ne modifient pas la base et ne
+        verrouillent pas ses écritures : aucune réinitialisation des portefeuilles n'est nécessaire
+        ensuite. Chaque portefeuille d'un instantané ne doit être simulé qu'une fois (la simulation
+        modifie ses positions et son cash).
+        
+        Args:
+            db: (facultatif) Connexion à la base à copier (par défaut: nouvelle connexion, fermée après la copie)
+            path: (facultatif) Fichier de l'instantané (par défaut: base en mémoire)
+            
+        Returns:
+            sqlite3.Connection: Connexion à l'instantané
+        """
+        source = cls.get_db_connection() if db is None else db
+        snapshot = sqlite3.connect(path or ":memory:")
+        try:
+            source.backup(snapshot)
+        except Exception:
+            snapshot.close()
+            raise
+        finally:
+            if db is None:
+                source.close()
+        instrumentation.count('snapshots')
+        return snapshot
+
+    @classmethod
+    def migrate_dates_to_integers(cls, db: sqlite3.Connection) -> bool:
+        """
+        Convertit les dates 'YYYY-MM-DD' de la base en numéros de jour (INTEGER).
+        
+        Les tables Returns_{ticker}, Deals, Clients et Benchmarks sont reconstruites avec une colonne
+        de date INTEGER (clé primaire entière, alias du rowid, pour Returns_{ticker}). La migration
+        n'est faite qu'une fois, par create_database (les connexions ne font que la vérifier, voir
+        check_date_encoding) : la version 'date_encoding' de Data_Version la marque comme effectuée.
+        
+        Args:
+            db: Connexion à la base de données
+            
+        Returns:
+            bool: True si la base a été migrée par cet appel
+        """
+        if cls.get_data_version(db, 'date_encoding') >= DATE_ENCODING_VERSION:
+            return False
+        
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            # Une autre connexion a pu migrer la base pendant l'attente du verrou
+            if cls.get_data_version(db, 'date_encoding') >= DATE_ENCODING_VERSION:
+                db.rollback()
+                return False
+            
+            tables = [row[0] for row in db.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'Returns\\_%' ESCAPE '\\'")]
+            columns = {table: 'date' for table in tables}
+            existing = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            columns.update({table: column for table, column in DATE_COLUMNS.items() if table in existing})
+            
+            rebuilt = [table for table, column in columns.items() if cls._rebuild_with_integer_dates(db, table, column)]
+            
+            db.execute("CREATE TABLE IF NOT EXISTS Data_Version (name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+            db.execute("""
+                INSERT INTO Data_Version (name, version) VALUES ('date_encoding', ?)
+                ON CONFLICT(name) DO UPDATE SET version = excluded.version
+            """, (DATE_ENCODING_VERSION,))
+            if rebuilt:
+                cls.bump_data_version(db)  # Les prix sont relus dans un autre format
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        
+        if rebuilt:
+            print(f"♻️ Dates de {len(rebuilt)} tables converties en numéros de jour.")
+        return True
+
+    @classmethod
+    def _rebuild_with_integer_dates(cls, db: sqlite3.Connection, table: str, column: str) -> bool:
+        """
+        Reconstruit une table avec une colonne de date INTEGER (SQLite ne modifie pas le type d'une colonne).
+        
+        Args:
+            db: Connexion à la base de données (transaction en cours)
+            table: Nom de la table
+            column: Colonne de dates 'YYYY-MM-DD' à convertir
+            
+        Returns:
+            bool: True si la table a été reconstruite (False si sa colonne est déjà INTEGER)
+        """
+        create_sql = db.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()[0]
+        create_sql, nb_replaced = re.subn(rf'\b{column}\s+TEXT\b', f'{column} INTEGER', create_sql, count=1)
+        if not nb_replaced:
+            return False
+        
+        migrated = f"{table}_migration"
+        create_sql = re.sub(r'^CREATE TABLE\s+(IF NOT EXISTS\s+)?["`\[]?\w+["`\]]?', f'CREATE TABLE "{migrated}"', create_sql)
+        indexes = [row[0] for row in db.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,))]
+        
+        names = [row[1] for row in db.execute(f'PRAGMA table_info("{table}")')]
+        converted = f"""CASE WHEN typeof("{column}") = 'text'
+                            THEN CAST(julianday("{column}") - 2440587.5 AS INTEGER) ELSE "{column}" END"""
+        select = ", ".join(converted if name == column else f'"{name}"' for name in names)
+        quoted = ", ".join(f'"{name}"' for name in names)
+        
+        db.execute(create_sql)
+        db.execute(f'INSERT INTO "{migrated}" ({quoted}) SELECT {select} FROM "{table}"')
+        db.execute(f'DROP TABLE "{table}"')
+        db.execute(f'ALTER TABLE "{migrated}" RENAME TO "{table}"')
+        for index_sql in indexes:
+            db.execute(index_sql)
+        return True
+
+    @classmethod
+    def get_data_version(cls, db: sqlite3.Connection, name: str = 'prices') -> int:
+        """
+        Retourne la version d'un ensemble de données (0 si elle n'a jamais été incrémentée).
+        
+        Args:
+            db: Connexion à la base de données
+            name: Nom de l'ensemble de données ('prices' : tables Returns_*)
+            
+        Returns:
+            int: Version des données
+        """
+        try:
+            row = db.execute("SELECT version FROM Data_Version WHERE name = ?", (name,)).fetchone()
+        except sqlite3.OperationalError:
+            return 0  # Base créée avant la table Data_Version
+        return row[0] if row else 0
+
+    @classmethod
+    def bump_data_version(cls, db: sqlite3.Connection, name: str = 'prices') -> None:
+        """
+        Incrémente la version d'un ensemble de données, ce qui invalide les copies dérivées
+        (ex: instantané des prix, voir price_snapshot.py). Le commit est laissé à l'appelant.
+        
+        Args:
+            db: Connexion à la base de données
+            name: Nom de l'ensemble de données modifié
+        """
+        db.execute("CREATE TABLE IF NOT EXISTS Data_Version (name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+        db.execute("""
+            INSERT INTO Data_Version (name, version) VALUES (?, 1)
+            ON CONFLICT(name) DO UPDATE SET version = version + 1
+        """, (name,))
+
     @classmethod
     def reinitialize_portfolio(cls, db: sqlite3.Connection, portfolio_id: int) -> None:
         """
@@ -232,12 +528,13 @@ class Client(BaseModel):
         self.manager_id = manager_id
         self.portfolio_id = portfolio_id
 
-    def save(self, db: sqlite3.Connection) -> int:
+    def save(self, db: sqlite3.Connection, commit: bool = True) -> int:
         """
         Sauvegarde le client dans la base de données.
         
         Args:
             db: Connexion à la base de données
+            commit: Valide la transaction (False : la validation est laissée à l'appelant, voir WriterService)
             
         Returns:
             int: ID du client créé
@@ -248,7 +545,7 @@ class Client(BaseModel):
                                registration_date, investment_amount, manager_id, portfolio_id)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         """, (self.name, self.age, self.country, self.email, self.risk_profile,
-              self.registration_date, self.investment_amount, self.manager_id, self.portfolio_id))
+              to_day(self.registration_date), self.investment_amount, self.manager_id, self.portfolio_id))
         
         client_id = cursor.lastrowid
         
@@ -260,34 +557,52 @@ class Client(BaseModel):
                 VALUES (?, ?)
             """, (self.manager_id, self.portfolio_id))
         
-        db.commit()
+        if commit:
+            db.commit()
         return client_id
 
     @classmethod
-    def get_by_id(cls, client_id: int) -> Optional['Client']:
+    def load_many(cls, db: sqlite3.Connection, client_ids: List[int]) -> Dict[int, 'Client']:
+        """
+        Charge plusieurs clients en une requête par lot d'IDs.
+        
+        Args:
+            db: Connexion à la base de données
+            client_ids: IDs des clients à charger
+            
+        Returns:
+            Dict[int, Client]: Clients trouvés, par ID
+        """
+        cursor = db.cursor()
+        clients = {}
+        for chunk, marks in in_chunks(client_ids):
+            cursor.execute(f"""
+                SELECT id, name, age, country, email, risk_profile, registration_date,
+                       investment_amount, manager_id, portfolio_id
+                FROM Clients
+                WHERE id IN ({marks})
+            """, chunk)
+            for (client_id, name, age, country, email, risk_profile, registration_date,
+                 investment_amount, manager_id, portfolio_id) in cursor.fetchall():
+                client = cls(name, age, country, email, risk_profile, investment_amount,
+                             day_to_str(registration_date), manager_id, portfolio_id)
+                client.id = client_id
+                clients[client_id] = client
+        return clients
+
+    @classmethod
+    def get_by_id(cls, client_id: int, db: Optional[sqlite3.Connection] = None) -> Optional['Client']:
         """
         Récupère un client par son ID.
         
         Args:
             client_id: ID du client à récupérer
+            db: (facultatif) Connexion à la base de données
             
         Returns:
             Optional[Client]: Le client trouvé ou None si non trouvé
         """
-        # with cls.get_db_connection() as db:
-        #     cursor = db.cursor()
-        #     cursor.execute("""
-        #         SELECT name, age, country, email, risk_profile, registration_date,
-        #                investment_amount, manager_id, portfolio_id
-        #         FROM Clients
-        #         WHERE id = ?
-        #     """, (client_id,))
-            
-        #     row = cursor.fetchone()
-        #     if row:
-        #         return cls(*row)
-        #     return None
-        pass
+        return cls.load_many(db or cls.get_db_connection(), [client_id]).get(client_id)
 
 
 class AssetManager(BaseModel):
@@ -303,12 +618,13 @@ class AssetManager(BaseModel):
         self.investment_sector = investment_sector
         self.strategies = strategies or []
 
-    def save(self, db: sqlite3.Connection) -> int:
+    def save(self, db: sqlite3.Connection, commit: bool = True) -> int:
         """
         Sauvegarde le gestionnaire dans la base de données.
         
         Args:
             db: Connexion à la base de données
+            commit: Valide la transaction (False : la validation est laissée à l'appelant, voir WriterService)
             
         Returns:
             int: ID du gestionnaire créé
@@ -328,41 +644,59 @@ class AssetManager(BaseModel):
                 VALUES (?, ?)
             """, (manager_id, strategy))
 
-        db.commit()
+        if commit:
+            db.commit()
         return manager_id
 
     @classmethod
-    def get_by_id(cls, manager_id: int) -> Optional['AssetManager']:
+    def load_many(cls, db: sqlite3.Connection, manager_ids: List[int]) -> Dict[int, 'AssetManager']:
+        """
+        Charge plusieurs gestionnaires et leurs stratégies (une requête par table et par lot d'IDs).
+        
+        Args:
+            db: Connexion à la base de données
+            manager_ids: IDs des gestionnaires à charger
+            
+        Returns:
+            Dict[int, AssetManager]: Gestionnaires trouvés, par ID
+        """
+        cursor = db.cursor()
+        managers = {}
+        for chunk, marks in in_chunks(manager_ids):
+            cursor.execute(f"""
+                SELECT id, name, age, country, email, seniority, investment_sector
+                FROM Managers
+                WHERE id IN ({marks})
+            """, chunk)
+            for manager_id, *row in cursor.fetchall():
+                manager = cls(*row)
+                manager.id = manager_id
+                managers[manager_id] = manager
+
+            cursor.execute(f"""
+                SELECT manager_id, strategy
+                FROM Manager_Strategies
+                WHERE manager_id IN ({marks})
+                ORDER BY manager_id, strategy
+            """, chunk)
+            for manager_id, strategy in cursor.fetchall():
+                if manager_id in managers:
+                    managers[manager_id].strategies.append(strategy)
+        return managers
+
+    @classmethod
+    def get_by_id(cls, manager_id: int, db: Optional[sqlite3.Connection] = None) -> Optional['AssetManager']:
         """
         Récupère un gestionnaire par son ID.
         
         Args:
             manager_id: ID du gestionnaire à récupérer
+            db: (facultatif) Connexion à la base de données
             
         Returns:
             Optional[AssetManager]: Le gestionnaire trouvé ou None si non trouvé
         """
-        # with cls.get_db_connection() as db:
-        #     cursor = db.cursor()
-        #     cursor.execute("""
-        #         SELECT m.name, m.age, m.country, m.email, m.seniority, m.investment_sector
-        #         FROM Managers m
-        #         WHERE m.id = ?
-        #     """, (manager_id,))
-            
-        #     row = cursor.fetchone()
-        #     if row:
-        #         # Récupération des stratégies
-        #         cursor.execute("""
-        #             SELECT strategy
-        #             FROM manager_portfolios
-        #             WHERE manager_id = ?
-        #         """, (manager_id,))
-        #         strategies = [row[0] for row in cursor.fetchall()]
-                
-        #         return cls(*row, strategies=strategies)
-        #     return None
-        pass
+        return cls.load_many(db or cls.get_db_connection(), [manager_id]).get(manager_id)
 
 
 class Portfolio(BaseModel):
@@ -380,12 +714,13 @@ class Portfolio(BaseModel):
         self.cash_value = value
         self.assets = assets or []
 
-    def save(self, db: sqlite3.Connection) -> int:
+    def save(self, db: sqlite3.Connection, commit: bool = True) -> int:
         """
         Sauvegarde le portefeuille dans la base de données.
         
         Args:
             db: Connexion à la base de données
+            commit: Valide la transaction (False : la validation est laissée à l'appelant, voir WriterService)
             
         Returns:
             int: ID du portefeuille créé
@@ -412,72 +747,123 @@ class Portfolio(BaseModel):
                 VALUES (?, ?, ?, ?, ?)
             """, (portfolio_id, product_id, 0, 0.0, 0.0))
 
-        db.commit()
+        if commit:
+            db.commit()
         return portfolio_id 
     
     @classmethod
-    def update_positions(cls, db: sqlite3.Connection, portfolio_id: int, positions: List[Dict[str, Any]], cash: Dict[str, Any]) -> float:
+    @timed('update_positions')
+    def update_positions(cls, db: sqlite3.Connection, portfolio_id: int, positions: PositionBook) -> float:
         """
         Met à jour les positions du portefeuille et sa valeur totale.
         
+        Args:
+            db: Connexion à la base de données
+            portfolio_id: ID du portefeuille
+            positions: Carnet des positions et du cash du portefeuille
+            
+        Returns:
+            float: Valeur totale du portefeuille
         """
-        cursor = db.cursor()
+        total_value = positions.total_value()
+        cls.write_positions(db, cls.position_rows(portfolio_id, positions), [(total_value, positions.cash, portfolio_id)])
+        
+        db.commit()
+        instrumentation.count('commits')
+        return total_value
 
-        for position in positions:
-            cursor.execute("""
-                UPDATE Portfolios_Products
-                SET quantity = ?,
-                    weight = ?,
-                    value = ?
-                WHERE portfolio_id = ? AND product_id = ?
-            """, (position['quantity'], position['weight'], position['value'], portfolio_id, position['product_id']))
-        
-        total_value = sum(position['value'] for position in positions) + cash['value']
-        cursor.execute("""
+    @staticmethod
+    def position_rows(portfolio_id: int, positions: PositionBook) -> List[tuple]:
+        """
+        Convertit un carnet de positions en paramètres de la requête de write_positions.
+        
+        Args:
+            portfolio_id: ID du portefeuille
+            positions: Carnet des positions du portefeuille
+            
+        Returns:
+            List[tuple]: (quantity, weight, value, portfolio_id, product_id) de chaque position
+        """
+        return list(zip(positions.quantities.tolist(), positions.weights.tolist(), positions.values.tolist(),
+                        [portfolio_id] * len(positions), positions.product_ids.tolist()))
+
+    @classmethod
+    def write_positions(cls, db: sqlite3.Connection, position_rows: List[tuple], portfolio_rows: List[tuple]) -> None:
+        """
+        Écrit des positions et des valeurs de portefeuilles, sans valider la transaction.
+        
+        Args:
+            db: Connexion à la base de données
+            position_rows: (quantity, weight, value, portfolio_id, product_id) de chaque position (voir position_rows)
+            portfolio_rows: (value, cash_value, portfolio_id) de chaque portefeuille
+        """
+        cursor = db.cursor()
+        cursor.executemany("""
+            UPDATE Portfolios_Products
+            SET quantity = ?,
+                weight = ?,
+                value = ?
+            WHERE portfolio_id = ? AND product_id = ?
+        """, position_rows)
+        cursor.executemany("""
             UPDATE Portfolios
             SET value = ?, cash_value = ?
             WHERE id = ?
-        """, (total_value, cash['value'], portfolio_id))
+        """, portfolio_rows)
         
-        db.commit()
-        return total_value
         
+
+    @classmethod
+    def load_many(cls, db: sqlite3.Connection, portfolio_ids: List[int]) -> Dict[int, 'Portfolio']:
+        """
+        Charge plusieurs portefeuilles et leurs actifs (une requête par table et par lot d'IDs).
         
+        Args:
+            db: Connexion à la base de données
+            portfolio_ids: IDs des portefeuilles à charger
+            
+        Returns:
+            Dict[int, Portfolio]: Portefeuilles trouvés, par ID (actifs triés par ID de produit)
+        """
+        cursor = db.cursor()
+        portfolios = {}
+        for chunk, marks in in_chunks(portfolio_ids):
+            cursor.execute(f"""
+                SELECT id, manager_id, client_id, strategy, investment_sector, size, value, cash_value
+                FROM Portfolios
+                WHERE id IN ({marks})
+            """, chunk)
+            for portfolio_id, *row, cash_value in cursor.fetchall():
+                portfolio = cls(*row)
+                portfolio.id = portfolio_id
+                portfolio.cash_value = cash_value
+                portfolios[portfolio_id] = portfolio
+
+            cursor.execute(f"""
+                SELECT pp.portfolio_id, p.ticker
+                FROM Portfolios_Products pp
+                JOIN Products p ON pp.product_id = p.id
+                WHERE pp.portfolio_id IN ({marks})
+                ORDER BY pp.portfolio_id, p.id
+            """, chunk)
+            for portfolio_id, ticker in cursor.fetchall():
+                if portfolio_id in portfolios:
+                    portfolios[portfolio_id].assets.append(ticker)
+        return portfolios
 
     @classmethod
-    def get_by_id(cls, portfolio_id: int) -> Optional['Portfolio']:
+    def get_by_id(cls, portfolio_id: int, db: Optional[sqlite3.Connection] = None) -> Optional['Portfolio']:
         """
         Récupère un portefeuille par son ID.
         
         Args:
             portfolio_id: ID du portefeuille à récupérer
+            db: (facultatif) Connexion à la base de données
             
         Returns:
             Optional[Portfolio]: Le portefeuille trouvé ou None si non trouvé
         """
-        # with cls.get_db_connection() as db:
-        #     cursor = db.cursor()
-        #     cursor.execute("""
-        #         SELECT p.manager_id, p.client_id, p.strategy, p.investment_sector,
-        #                p.size, p.value
-        #         FROM Portfolios p
-        #         WHERE p.id = ?
-        #     """, (portfolio_id,))
-            
-        #     row = cursor.fetchone()
-        #     if row:
-        #         # Récupération des actifs
-        #         cursor.execute("""
-        #             SELECT pr.ticker
-        #             FROM portfolios_products pp
-        #             JOIN Products pr ON pp.product_id = pr.id
-        #             WHERE pp.portfolio_id = ?
-        #         """, (portfolio_id,))
-        #         assets = [row[0] for row in cursor.fetchall()]
-                
-        #         return cls(*row, assets=assets)
-        #     return None
-        pass
+        return cls.load_many(db or cls.get_db_connection(), [portfolio_id]).get(portfolio_id)
 
 
 class Product(BaseModel):
@@ -493,6 +879,7 @@ class Product(BaseModel):
         self.company_name = company_name
         self.stock_exchange = stock_exchange
 
+    @timed('product_save')
     def save(self, db: sqlite3.Connection) -> Optional[int]:
         """
         Sauvegarde l'actif dans la base de données.
@@ -523,7 +910,7 @@ class Product(BaseModel):
             # Créer la table Returns_{ticker} si elle n'existe pas
             cursor.execute(f"""
                 CREATE TABLE IF NOT EXISTS Returns_{self.ticker} (
-                    date TEXT PRIMARY KEY,
+                    date INTEGER PRIMARY KEY,
                     price REAL,
                     returns REAL
                 )
@@ -535,10 +922,11 @@ class Product(BaseModel):
                     INSERT OR REPLACE INTO Returns_{self.ticker} (date, price, returns)
                     VALUES (?, ?, ?)
                 """, (
-                    row['date'].strftime('%Y-%m-%d'),
+                    to_day(row['date']),
                     row['price'],
                     row['returns']
                 ))
+            BaseModel.bump_data_version(db)
             
             db.commit()
             return product_id
@@ -565,40 +953,145 @@ class Product(BaseModel):
             return cursor.fetchone() is not None
 
     @classmethod
-    def get_by_ticker(cls, ticker: str) -> Optional['Product']:
+    def load_many(cls, db: sqlite3.Connection, tickers: List[str]) -> Dict[str, 'Product']:
+        """
+        Charge plusieurs produits (sans leurs rendements) en une requête par lot de tickers.
+        
+        Args:
+            db: Connexion à la base de données
+            tickers: Symboles des produits à charger
+            
+        Returns:
+            Dict[str, Product]: Produits trouvés, par ticker
+        """
+        cursor = db.cursor()
+        products = {}
+        for chunk, marks in in_chunks(tickers):
+            cursor.execute(f"""
+                SELECT id, ticker, sector, market_cap, company_name, stock_exchange
+                FROM Products
+                WHERE ticker IN ({marks})
+            """, chunk)
+            for product_id, ticker, sector, market_cap, company_name, stock_exchange in cursor.fetchall():
+                product = cls(ticker, sector, None, market_cap, company_name, stock_exchange)
+                product.id = product_id
+                products[ticker] = product
+        return products
+
+    @classmethod
+    def get_by_ticker(cls, ticker: str, db: Optional[sqlite3.Connection] = None) -> Optional['Product']:
         """
-        Récupère un produit par son symbole.
+        Récupère un produit par son symbole (les rendements restent dans la table Returns_{ticker}).
         
         Args:
             ticker: Symbole du produit à récupérer
+            db: (facultatif) Connexion à la base de données
             
         Returns:
             Optional[Product]: Le produit trouvé ou None si non trouvé
         """
-        #with cls.get_db_connection() as db:
-        #    cursor = db.cursor()
-        #    cursor.execute("""
-        #        SELECT p.ticker, p.sector
-        #        FROM Products p
-        #        WHERE p.ticker = ?
-        #    """, (ticker,))
-            
-        #    row = cursor.fetchone()
-        #    if row:
-        #        # Récupération des rendements
-        #        cursor.execute("""
-        #            SELECT date, return_value
-        #            FROM Returns
-        #            WHERE ticker = ?
-        #        """, (ticker,))
-        #        returns = {row[0]: row[1] for row in cursor.fetchall()}
-                
-        #        return cls(*row, returns=returns)
-        #    return None
-        pass
+        return cls.load_many(db or cls.get_db_connection(), [ticker]).get(ticker)
+
+
+# Indice de référence de chaque secteur d'investissement (ETF sectoriels SPDR)
+SECTOR_BENCHMARKS = {
+    'ms_basic_materials': 'XLB',
+    'ms_communication_services': 'XLC',
+    'ms_consumer_cyclical': 'XLY',
+    'ms_consumer_defensive': 'XLP',
+    'ms_energy': 'XLE',
+    'ms_financial_services': 'XLF',
+    'ms_healthcare': 'XLV',
+    'ms_industrials': 'XLI',
+    'ms_real_estate': 'XLRE',
+    'ms_technology': 'XLK',
+    'ms_utilities': 'XLU',
+}
 
+
+class Benchmark(BaseModel):
+    """Classe représentant un indice de référence, stocké à côté des prix des produits."""
     
+    def __init__(self, name: str, returns: pd.DataFrame):
+        """
+        Initialise un indice de référence.
+        
+        Args:
+            name: Symbole de l'indice (ex: 'XLK')
+            returns: DataFrame avec les colonnes date, price et returns
+        """
+        self.name = name
+        self.returns = returns
     
+    def save(self, db: sqlite3.Connection) -> bool:
+        """
+        Sauvegarde l'historique de l'indice dans la table Benchmarks.
+        
+        Args:
+            db: Connexion à la base de données
+            
+        Returns:
+            bool: True si la sauvegarde a réussi, False sinon
+        """
+        try:
+            cursor = db.cursor()
+            cursor.executemany("""
+                INSERT OR REPLACE INTO Benchmarks (name, date, price, returns)
+                VALUES (?, ?, ?, ?)
+            """, [(self.name, to_day(row['date']), row['price'], row['returns'])
+                  for _, row in self.returns.iterrows()])
+            db.commit()
+            return True
+            
+        except Exception as e:
+            print(f"❌ Erreur lors de la sauvegarde de l'indice {self.name}: {str(e)}")
+            db.rollback()
+            return False
+    
+    @classmethod
+    def exists(cls, db: sqlite3.Connection, name: str) -> bool:
+        """
+        Vérifie si un indice de référence est déjà stocké.
+        
+        Args:
+            db: Connexion à la base de données
+            name: Symbole de l'indice
+            
+        Returns:
+            bool: True si l'indice existe, False sinon
+        """
+        cursor = db.cursor()
+        cursor.execute("SELECT 1 FROM Benchmarks WHERE name = ? LIMIT 1", (name,))
+        return cursor.fetchone() is not None
+    
+    @classmethod
+    def get_aligned_prices(cls, db: sqlite3.Connection, names: List[str], dates: pd.DatetimeIndex) -> pd.DataFrame:
+        """
+        Récupère les prix de plusieurs indices, alignés une seule fois sur un calendrier donné.
+        
+        Pour chaque date, le prix retenu est le dernier prix connu à cette date.
+        
+        Args:
+            db: Connexion à la base de données
+            names: Symboles des indices
+            dates: Dates d'alignement (DatetimeIndex)
+            
+        Returns:
+            pd.DataFrame: Prix (dates × indices), NaN si aucun prix n'est connu
+        """
+        dates = pd.DatetimeIndex(dates)
+        placeholders = ", ".join("?" for _ in names)
+        prices = pd.read_sql_query(f"""
+            SELECT name, date, price
+            FROM Benchmarks
+            WHERE name IN ({placeholders})
+            ORDER BY date
+        """, db, params=list(names))
+        prices['date'] = pd.to_datetime(prices['date'], unit='D')  # Numéros de jour depuis le 01/01/1970
+        
+        prices = prices.pivot(index='date', columns='name', values='price')
+        prices = prices.reindex(prices.index.union(dates)).ffill().reindex(dates)
+        return prices.reindex(columns=list(names))
 
 
 ### Fonctions utilitaires ###
@@ -671,24 +1164,25 @@ class Deal(BaseModel):
         Args:
             portfolio_id: ID du portefeuille concerné
             product_id: ID du produit concerné
-            date: Date d'exécution de la transaction
+            date: Date d'exécution de la transaction ('YYYY-MM-DD', datetime ou numéro de jour)
             action: Type d'action (BUY/SELL)
             quantity: Quantité (positive pour achat, négative pour vente)
             price: Prix d'exécution
         """
         self.portfolio_id = portfolio_id
         self.product_id = product_id
-        self.date = date
+        self.date = to_day(date)
         self.action = action
         self.quantity = quantity
         self.price = price
     
-    def save(self, db: sqlite3.Connection) -> int:
+    def save(self, db: sqlite3.Connection, commit: bool = True) -> int:
         """
         Sauvegarde la transaction dans la base de données.
         
         Args:
             db: Connexion à la base de données
+            commit: Valide la transaction (False : la validation est laissée à l'appelant, voir WriterService)
             
         Returns:
             int: ID de la transaction créée
@@ -707,42 +1201,46 @@ class Deal(BaseModel):
         ))
         
         deal_id = cursor.lastrowid
-        db.commit()
+        if commit:
+            db.commit()
         return deal_id
     
     @classmethod
-    def save_multiple(cls, deals: List['Deal'], db: sqlite3.Connection) -> None:
+    @timed('save_multiple')
+    def save_multiple(cls, deals: Union[DealBuffer, List['Deal']], db: sqlite3.Connection, commit: bool = True) -> None:
         """
         Sauvegarde plusieurs deals dans la base de données.
         
         Args:
-            deals: Liste des deals à sauvegarder
+            deals: Deals à sauvegarder (tampon DealBuffer, ou liste de Deal)
             db: Connexion à la base de données
+            commit: Valide la transaction (False : la validation est laissée à l'appelant, voir UnitOfWork)
         """
+        if not isinstance(deals, DealBuffer):
+            deals = DealBuffer.from_deals(deals)
         cursor = db.cursor()
+        instrumentation.count('deals_saved', len(deals))
         
-        # Vérifier les deals existants pour éviter les doublons
-        for deal in deals:
-            cursor.execute("""
-                SELECT COUNT(*)
+        # Un deal n'est inséré que s'il n'existe pas déjà (les deals sont insérés dans l'ordre)
+        cursor.executemany("""
+            INSERT INTO Deals (portfolio_id, product_id, date, action, quantity, price)
+            SELECT :portfolio_id, :product_id, :date, :action, :quantity, :price
+            WHERE NOT EXISTS (
+                SELECT 1
                 FROM Deals
-                WHERE portfolio_id = ?
-                AND product_id = ?
-                AND date = ?
-                AND action = ?
-                AND quantity = ?
-                AND price = ?
-            """, (deal.portfolio_id, deal.product_id, deal.date, 
-                  deal.action, deal.quantity, deal.price))
-            
-            if cursor.fetchone()[0] == 0:  # Si le deal n'existe pas déjà
-                cursor.execute("""
-                    INSERT INTO Deals (portfolio_id, product_id, date, action, quantity, price)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (deal.portfolio_id, deal.product_id, deal.date, 
-                      deal.action, deal.quantity, deal.price))
+                WHERE portfolio_id = :portfolio_id
+                AND product_id = :product_id
+                AND date = :date
+                AND action = :action
+                AND quantity = :quantity
+                AND price = :price
+            )
+        """, [dict(zip(('portfolio_id', 'product_id', 'date', 'action', 'quantity', 'price'), row))
+              for row in deals.rows()])
         
-        db.commit()
+        if commit:
+            db.commit()
+            instrumentation.count('commits')
     
     @classmethod
     def get_portfolio_deals(cls, portfolio_id: int, db: sqlite3.Connection) -> List[Dict[str, Any]]:
@@ -769,7 +1267,7 @@ class Deal(BaseModel):
         for row in cursor.fetchall():
             deals.append({
                 'id': row[0],
-                'date': row[1],
+                'date': day_to_str(row[1]),
                 'action': row[2],
                 'quantity': row[3],
                 'price': row[4],
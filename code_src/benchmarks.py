@@ -0,0 +1,318 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from base_builder import BaseModel, Client, AssetManager, Portfolio, Product
+from allocators import ALLOCATORS, OptimizationTimeout, allocate_weights, max_sharpe_slsqp
+from risk_models import FactorRiskModel, max_sharpe_weights
+from strategies import Simulation
+from performances import get_portfolio_performance_df, get_portfolio_rankings
+from writer_service import close_shared_writers
+
+
+STRATEGIES = ("Low Risk", "Medium Risk", "High Risk")
+START_DATE = '2022-01-03'
+
+# Seuil de ralentissement par défaut avant de signaler une régression (+25 %)
+DEFAULT_THRESHOLD = 0.25
+
+# Tailles d'univers des mesures des allocateurs et durée maximale d'une optimisation SLSQP
+ALLOCATOR_SIZES = (20, 200, 2000)
+SLSQP_TIMEOUT = 30.0
+
+
+def generate_synthetic_prices(nb_weeks: int, rng: np.random.Generator) -> pd.DataFrame:
+    """
+    Génère un historique de prix hebdomadaire (marche aléatoire géométrique).
+
+    Args:
+        nb_weeks: Nombre de semaines
+        rng: Générateur aléatoire
+
+    Returns:
+        pd.DataFrame: Colonnes date, price et returns, au format de download_asset
+    """
+    dates = pd.date_range('2022-01-01', periods=nb_weeks, freq='7D')
+    prices = 100 * np.cumprod(1 + rng.normal(0.002, rng.uniform(0.02, 0.06), nb_weeks))
+    data = pd.DataFrame({'date': dates, 'price': prices})
+    data['returns'] = data['price'].pct_change()
+    return data
+
+
+def create_synthetic_database(path: str, nb_portfolios: int = 6, nb_products: int = 40, portfolio_size: int = 10,
+                              nb_weeks: int = 157, seed: int = 0) -> List[float]:
+    """
+    Crée une base de données fictive et reproductible pour les tests de performance.
+
+    La base est créée avec les modèles du projet ; FUND_DB_PATH est positionnée sur le fichier créé.
+
+    Args:
+        path: Chemin du fichier de base de données (écrasé s'il existe)
+        nb_portfolios: Nombre de clients / portefeuilles
+        nb_products: Nombre de produits
+        portfolio_size: Nombre de produits par portefeuille
+        nb_weeks: Nombre de semaines d'historique de prix
+        seed: Graine du générateur aléatoire
+
+    Returns:
+        List[float]: Durée de chaque Product.save (ingestion des prix), en secondes
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    os.environ["FUND_DB_PATH"] = path
+    BaseModel.create_database()
+
+    rng = np.random.default_rng(seed)
+    db = BaseModel.get_db_connection()
+
+    # Ingestion des produits
+    tickers = [f"SYN{i:03d}" for i in range(nb_products)]
+    save_durations = []
+    for ticker in tickers:
+        product = Product(ticker=ticker, sector='Technology', returns=generate_synthetic_prices(nb_weeks, rng))
+        start = time.perf_counter()
+        product.save(db)
+        save_durations.append(time.perf_counter() - start)
+
+    # Un manager, un client et un portefeuille par stratégie, à tour de rôle
+    for i in range(nb_portfolios):
+        strategy = STRATEGIES[i % len(STRATEGIES)]
+        manager_id = AssetManager(name=f"Manager {i}", age=40, country="France", email=f"manager.{i}@fund.com",
+                                  seniority="Senior", investment_sector='ms_technology',
+                                  strategies=[strategy]).save(db)
+        investment_amount = float(rng.integers(10000, 1000000))
+        portfolio_id = Portfolio(manager_id=manager_id, client_id=i + 1, strategy=strategy,
+                                 investment_sector='ms_technology', size=portfolio_size, value=investment_amount,
+                                 assets=list(rng.choice(tickers, portfolio_size, replace=False))).save(db)
+        Client(name=f"Client {i}", age=40, country="France", email=f"client.{i}@mail.com", risk_profile=strategy,
+               investment_amount=investment_amount, registration_date=START_DATE,
+               manager_id=manager_id, portfolio_id=portfolio_id).save(db)
+
+    db.close()
+    return save_durations
+
+
+def _time_calls(func: Callable[[], None], repeat: int) -> List[float]:
+    """Exécute func repeat fois et retourne la durée de chaque exécution."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def _summarize(durations: List[float], unit: str) -> Dict[str, float]:
+    """Résume une série de durées (médiane utilisée pour la comparaison)."""
+    return {
+        'unit': unit,
+        'runs': len(durations),
+        'median_s': statistics.median(durations),
+        'min_s': min(durations),
+        'max_s': max(durations),
+    }
+
+
+def run_benchmarks(nb_portfolios: int = 6, repeat: int = 3, seed: int = 0) -> Dict[str, Dict[str, float]]:
+    """
+    Exécute la suite de tests de performance sur une base fictive.
+
+    Args:
+        nb_portfolios: Nombre de portefeuilles de la base fictive (classements)
+        repeat: Nombre de répétitions des mesures de bout en bout
+        seed: Graine du générateur aléatoire
+
+    Returns:
+        Dict[str, Dict[str, float]]: Résultats par test (durée médiane, min, max)
+    """
+    np.random.seed(seed)
+    results = {}
+    previous_db_path = os.environ.get("FUND_DB_PATH")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        save_durations = create_synthetic_database(os.path.join(tmp_dir, "benchmark.db"), nb_portfolios, seed=seed)
+        results['product_save'] = _summarize(save_durations, 'par produit')
+
+        db = BaseModel.get_db_connection()
+        portfolio_id = 1
+        strategy = STRATEGIES[0]
+        end_date = datetime(2024, 12, 31)
+
+        # Exécution de la stratégie, semaine par semaine
+        BaseModel.reinitialize_portfolio(db, portfolio_id)
+        simulation = Simulation(db, portfolio_id, strategy, START_DATE)
+        week_durations = []
+        weeks = simulation.iter_weeks(end_date=end_date)
+        while True:
+            start = time.perf_counter()
+            if next(weeks, None) is None:
+                break
+            week_durations.append(time.perf_counter() - start)
+        results['execute_strategy'] = _summarize(week_durations, 'par semaine')
+
+        # Optimisation seule, sur une fenêtre de rendements fixe
+        returns_df = simulation.get_asset_returns(datetime(2023, 6, 5))
+        results['optimize'] = _summarize(_time_calls(lambda: simulation.optimize(returns_df), 20 * repeat), 'par appel')
+
+        # Simulation complète d'un portefeuille
+        def performance_run():
+            BaseModel.reinitialize_portfolio(db, portfolio_id)
+            get_portfolio_performance_df(portfolio_id, strategy, START_DATE, end_date)
+        results['portfolio_performance_df'] = _summarize(_time_calls(performance_run, repeat), 'par simulation')
+
+        # Classements de tous les portefeuilles, sans cache
+        def rankings_run():
+            db.execute("DELETE FROM Portfolio_Rankings")
+            db.execute("DELETE FROM Manager_Rankings")
+            db.commit()
+            get_portfolio_rankings(db, START_DATE, end_date)
+        results['portfolio_rankings'] = _summarize(_time_calls(rankings_run, repeat), f"{nb_portfolios} portefeuilles")
+
+        db.close()
+        # Service d'écriture des simulations arrêté avant la suppression de la base fictive
+        close_shared_writers(os.path.join(tmp_dir, "benchmark.db"))
+
+    if previous_db_path is None:
+        os.environ.pop("FUND_DB_PATH", None)
+    else:
+        os.environ["FUND_DB_PATH"] = previous_db_path
+
+    return results
+
+
+def benchmark_allocators(sizes=ALLOCATOR_SIZES, nb_weeks: int = 12, repeat: int = 3, seed: int = 0,
+                         slsqp_timeout: float = SLSQP_TIMEOUT) -> Dict[str, Dict[str, float]]:
+    """
+    Mesure la latence par appel de SLSQP, de l'optimisation à facteurs et des allocateurs rapides
+    sur des univers de tailles croissantes.
+
+    Une optimisation SLSQP interrompue par slsqp_timeout n'est pas répétée ; sa durée est celle du délai.
+
+    Args:
+        sizes: Nombres d'actifs des univers
+        nb_weeks: Nombre de semaines de rendements (fenêtre de get_asset_returns)
+        repeat: Nombre d'appels par allocateur et par univers
+        seed: Graine du générateur aléatoire
+        slsqp_timeout: Durée maximale d'une optimisation SLSQP, en secondes
+
+    Returns:
+        Dict[str, Dict[str, float]]: Résultats par allocateur et taille (ex: 'risk_parity_200')
+    """
+    rng = np.random.default_rng(seed)
+    results = {}
+
+    for nb_assets in sizes:
+        # Un facteur de marché commun et un bruit propre à chaque actif
+        market = rng.normal(0.002, 0.03, (nb_weeks, 1))
+        returns = market * rng.uniform(0.5, 1.5, nb_assets) + rng.normal(0, rng.uniform(0.01, 0.05, nb_assets),
+                                                                         (nb_weeks, nb_assets))
+        max_weight = 0.20
+        returns_df = pd.DataFrame(returns, columns=[f"SYN{i:04d}" for i in range(nb_assets)])
+
+        for allocator in ALLOCATORS:
+            durations = _time_calls(lambda: allocate_weights(allocator, returns_df, max_weight), repeat)
+            results[f"{allocator}_{nb_assets}"] = _summarize(durations, 'par appel')
+
+        # Maximisation du ratio de Sharpe avec le modèle à facteurs (11 secteurs)
+        sectors = {ticker: f"Sector {i % 11}" for i, ticker in enumerate(returns_df.columns)}
+        durations = _time_calls(lambda: max_sharpe_weights(FactorRiskModel.from_returns(returns_df, sectors),
+                                                           returns_df.mean().to_numpy(), max_weight=max_weight), repeat)
+        results[f"factor_sharpe_{nb_assets}"] = _summarize(durations, 'par appel')
+
+        durations = []
+        timed_out = False
+        while len(durations) < repeat and not timed_out:
+            start = time.perf_counter()
+            try:
+                max_sharpe_slsqp(returns_df, max_weight=max_weight, timeout=slsqp_timeout)
+            except OptimizationTimeout:
+                timed_out = True
+            durations.append(time.perf_counter() - start)
+        results[f"slsqp_{nb_assets}"] = {**_summarize(durations, 'par appel'), 'timed_out': timed_out}
+
+        latencies = "  ".join(f"{name} {results[f'{name}_{nb_assets}']['median_s'] * 1000:.1f} ms"
+                              for name in ('slsqp', 'factor_sharpe', *ALLOCATORS))
+        print(f"{nb_assets:>5} actifs : {latencies}" + ("  (SLSQP interrompu)" if timed_out else ""))
+
+    return results
+
+
+def compare_with_baseline(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+                          threshold: float = DEFAULT_THRESHOLD) -> List[str]:
+    """
+    Compare des résultats à une référence enregistrée.
+
+    Args:
+        results: Résultats de run_benchmarks
+        baseline: Résultats de référence
+        threshold: Ralentissement relatif toléré (0.25 = +25 %)
+
+    Returns:
+        List[str]: Tests dont la durée médiane dépasse la référence de plus du seuil
+    """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        ratio = result['median_s'] / reference['median_s']
+        status = "❌" if ratio > 1 + threshold else "✅"
+        print(f"{status} {name:<26} {result['median_s'] * 1000:>10.2f} ms  (référence {reference['median_s'] * 1000:.2f} ms, "
+              f"x{ratio:.2f})")
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Point d'entrée en ligne de commande de la suite de tests de performance.
+
+    Returns:
+        int: Code de sortie (1 si une régression dépasse le seuil)
+    """
+    parser = argparse.ArgumentParser(description="Tests de performance de la simulation, de l'optimiseur et des classements")
+    parser.add_argument("--output", default="benchmark_results.json", help="Fichier JSON des résultats")
+    parser.add_argument("--baseline", default=None, help="Fichier JSON de référence à comparer")
+    parser.add_argument("--save-baseline", action="store_true", help="Enregistre les résultats comme nouvelle référence")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Ralentissement toléré (0.25 = +25 %%)")
+    parser.add_argument("--portfolios", type=int, default=6, help="Nombre de portefeuilles de la base fictive")
+    parser.add_argument("--repeat", type=int, default=3, help="Nombre de répétitions")
+    parser.add_argument("--seed", type=int, default=0, help="Graine du générateur aléatoire")
+    parser.add_argument("--allocators", action="store_true",
+                        help="Mesure aussi SLSQP et les allocateurs rapides sur 20, 200 et 2000 actifs")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.portfolios, args.repeat, args.seed)
+    if args.allocators:
+        results.update(benchmark_allocators(repeat=args.repeat, seed=args.seed))
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Résultats enregistrés dans {args.output}")
+
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Référence enregistrée dans {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.threshold)
+        if regressions:
+            print(f"❌ Régression de performance : {', '.join(regressions)}")
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import matplotlib
+from matplotlib.axes import Axes
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib import colormaps
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+# Figures réutilisées d'un portefeuille à l'autre au sein d'un même processus
+_figures: Dict[str, Figure] = {}
+
+
+def get_average_allocation(portfolio_df: pd.DataFrame) -> pd.Series:
+    """
+    Calcule la répartition moyenne (en %) du portefeuille entre ses produits sur toute la période.
+
+    Args:
+        portfolio_df: DataFrame de performance (colonnes cash, portfolio_value et une colonne par produit)
+
+    Returns:
+        pd.Series: Pourcentage moyen de la valeur du portefeuille investi dans chaque produit
+    """
+    # Calculer la moyenne des valeurs des produits (tickers) sur toute la période du portefeuille
+    product_columns = [column for column in portfolio_df.columns if column not in ('cash', 'portfolio_value', 'return')]
+    average_data = portfolio_df[product_columns].mean()
+
+    # Clip pour s'assurer qu'aucune valeur négative n'est présente
+    average_data = average_data.clip(lower=0)
+
+    # Total moyen du portefeuille sur la période
+    total_value = portfolio_df['portfolio_value'].mean()
+    return average_data / total_value * 100
+
+
+def draw_portfolio_value(ax: Axes, portfolio_df: pd.DataFrame) -> None:
+    """
+    Trace l'évolution de la valeur du portefeuille.
+
+    Args:
+        ax: Axes matplotlib sur lesquels tracer
+        portfolio_df: DataFrame de performance indexé par date
+    """
+    ax.plot(portfolio_df.index, portfolio_df['portfolio_value'], label='Valeur du portefeuille', color='b')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Valeur du portefeuille (€)')
+    ax.set_title('Évolution de la valeur du portefeuille')
+    ax.set_xlim(portfolio_df.index.min(), portfolio_df.index.max())
+    ax.legend()
+    ax.grid()
+
+
+def draw_average_allocation(ax: Axes, portfolio_df: pd.DataFrame) -> None:
+    """
+    Trace le diagramme en secteurs de la répartition moyenne du portefeuille.
+
+    Args:
+        ax: Axes matplotlib sur lesquels tracer
+        portfolio_df: DataFrame de performance indexé par date
+    """
+    product_percentage = get_average_allocation(portfolio_df)
+    ax.pie(product_percentage, labels=product_percentage.index, autopct='%1.1f%%', startangle=90,
+           colors=colormaps['Paired'].colors)
+    ax.set_title("Répartition moyenne du portefeuille")
+    ax.axis('equal')  # Assurer un cercle parfait
+
+
+# Graphiques produits pour chaque portefeuille : (nom, fonction de tracé, taille)
+CHARTS = (
+    ('value', draw_portfolio_value, (10, 5)),
+    ('allocation', draw_average_allocation, (8, 8)),
+)
+
+
+def _get_figure(name: str, figsize: Tuple[float, float]) -> Figure:
+    """
+    Retourne la figure réutilisable associée à un graphique, vidée de son contenu.
+
+    Args:
+        name: Nom du graphique
+        figsize: Taille de la figure en pouces
+
+    Returns:
+        Figure: Figure Agg prête à être dessinée
+    """
+    fig = _figures.get(name)
+    if fig is None:
+        fig = _figures[name] = Figure(figsize=figsize)
+        FigureCanvasAgg(fig)
+    else:
+        fig.clear()
+    return fig
+
+
+def render_portfolio_charts(portfolio_df: pd.DataFrame, output_dir: str, prefix: str = 'portfolio',
+                            formats: Sequence[str] = ('png',)) -> List[str]:
+    """
+    Enregistre les graphiques d'un portefeuille dans des fichiers, sans affichage interactif.
+
+    Les figures sont rendues avec le backend Agg, indépendamment du backend de pyplot, et
+    réutilisées d'un appel à l'autre.
+
+    Args:
+        portfolio_df: DataFrame de performance indexé par date
+        output_dir: Dossier de destination (créé si nécessaire)
+        prefix: Préfixe des noms de fichiers
+        formats: Formats d'image à produire (png, svg, ...)
+
+    Returns:
+        List[str]: Chemins des fichiers créés
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+
+    for name, draw, figsize in CHARTS:
+        fig = _get_figure(name, figsize)
+        draw(fig.add_subplot(), portfolio_df)
+
+        for fmt in formats:
+            path = os.path.join(output_dir, f"{prefix}_{name}.{fmt}")
+            fig.savefig(path, format=fmt)
+            paths.append(path)
+
+    return paths
+
+
+def _init_render_worker() -> None:
+    """Initialise un processus de rendu avec le backend non interactif Agg."""
+    matplotlib.use('Agg')
+
+
+def _render_job(job: Tuple[int, pd.DataFrame, str, Sequence[str]]) -> Tuple[int, List[str]]:
+    """
+    Rend les graphiques d'un portefeuille (exécuté dans un processus du pool).
+
+    Args:
+        job: (ID du portefeuille, DataFrame de performance, dossier de destination, formats)
+
+    Returns:
+        Tuple[int, List[str]]: ID du portefeuille et chemins des fichiers créés
+    """
+    portfolio_id, portfolio_df, output_dir, formats = job
+    return portfolio_id, render_portfolio_charts(portfolio_df, output_dir, f"portfolio_{portfolio_id}", formats)
+
+
+def render_fund_charts(performance_dfs: Dict[int, pd.DataFrame], output_dir: str,
+                       formats: Sequence[str] = ('png',), max_workers: Optional[int] = None) -> Dict[int, List[str]]:
+    """
+    Rend les graphiques de tous les portefeuilles du fonds en parallèle.
+
+    Args:
+        performance_dfs: DataFrames de performance par ID de portefeuille
+        output_dir: Dossier de destination (créé si nécessaire)
+        formats: Formats d'image à produire (png, svg, ...)
+        max_workers: Nombre de processus (par défaut: nombre de CPU, 1 pour un rendu séquentiel)
+
+    Returns:
+        Dict[int, List[str]]: Chemins des fichiers créés par ID de portefeuille
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [(portfolio_id, df, output_dir, tuple(formats)) for portfolio_id, df in performance_dfs.items()]
+
+    if max_workers == 1:
+        return dict(_render_job(job) for job in jobs)
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_render_worker) as executor:
+        # Des lots de plusieurs portefeuilles par tâche amortissent la sérialisation
+        chunksize = max(1, len(jobs) // (4 * (max_workers or os.cpu_count() or 1)))
+        return dict(executor.map(_render_job, jobs, chunksize=chunksize))
+
+
+def generate_synthetic_performance_dfs(nb_portfolios: int, nb_weeks: int = 156, nb_products: int = 10,
+                                       seed: int = 0) -> Dict[int, pd.DataFrame]:
+    """
+    Génère des DataFrames de performance fictifs (marches aléatoires) pour les mesures de débit.
+
+    Args:
+        nb_portfolios: Nombre de portefeuilles
+        nb_weeks: Nombre de semaines par portefeuille
+        nb_products: Nombre de produits par portefeuille
+        seed: Graine du générateur aléatoire
+
+    Returns:
+        Dict[int, pd.DataFrame]: DataFrames de performance par ID de portefeuille
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2022-01-03', periods=nb_weeks, freq='W-MON', name='date')
+    tickers = [f"P{i}" for i in range(nb_products)]
+
+    performance_dfs = {}
+    for portfolio_id in range(1, nb_portfolios + 1):
+        values = 10000 * np.cumprod(1 + rng.normal(0.002, 0.03, (nb_weeks, nb_products)), axis=0)
+        df = pd.DataFrame(values, index=dates, columns=tickers)
+        df.insert(0, 'cash', 1000.0)
+        df.insert(1, 'portfolio_value', df[tickers].sum(axis=1) + df['cash'])
+        performance_dfs[portfolio_id] = df
+
+    return performance_dfs
+
+
+def benchmark_chart_rendering(nb_portfolios: int = 50, max_workers: Optional[int] = None,
+                              formats: Sequence[str] = ('png',), seed: int = 0) -> Dict[str, float]:
+    """
+    Mesure le débit de rendu des graphiques (graphiques/seconde), en séquentiel et en parallèle.
+
+    Args:
+        nb_portfolios: Nombre de portefeuilles fictifs à rendre
+        max_workers: Nombre de processus pour le rendu parallèle
+        formats: Formats d'image à produire
+        seed: Graine du générateur aléatoire
+
+    Returns:
+        Dict[str, float]: Nombre de graphiques, durées et débits séquentiel et parallèle
+    """
+    performance_dfs = generate_synthetic_performance_dfs(nb_portfolios, seed=seed)
+    nb_charts = nb_portfolios * len(CHARTS) * len(formats)
+    results = {'nb_charts': nb_charts}
+
+    for mode, workers in (('serial', 1), ('parallel', max_workers)):
+        with tempfile.TemporaryDirectory() as output_dir:
+            start = time.perf_counter()
+            render_fund_charts(performance_dfs, output_dir, formats, max_workers=workers)
+            elapsed = time.perf_counter() - start
+        results[f"{mode}_seconds"] = elapsed
+        results[f"{mode}_charts_per_second"] = nb_charts / elapsed
+
+    return results
+
+
+if __name__ == "__main__":
+    matplotlib.use('Agg')
+    results = benchmark_chart_rendering()
+    print(f"📊 {results['nb_charts']} graphiques rendus")
+    print(f"Séquentiel : {results['serial_charts_per_second']:.1f} graphiques/s")
+    print(f"Parallèle  : {results['parallel_charts_per_second']:.1f} graphiques/s")
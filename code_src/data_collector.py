@@ -11,7 +11,7 @@ import pycountry
 from geopy.geocoders import Nominatim
 geolocator = Nominatim(user_agent="my_fund_manager")
 
-from base_builder import (Product, get_eligible_managers, get_next_id)
+from base_builder import (Product, Benchmark, SECTOR_BENCHMARKS, get_eligible_managers, get_next_id)
 
 from yahooquery import Screener
 
@@ -262,6 +262,13 @@ def create_portfolio(manager, client_data, database):
     # Vérifier et télécharger les données des actifs
     missing_tickers = check_and_download_assets(tickers, database)
     
+    # Télécharger l'indice de référence du secteur pour l'analyse des performances relatives (facultatif)
+    benchmark_name = SECTOR_BENCHMARKS.get(manager["investment_sector"])
+    if benchmark_name:
+        check_and_download_benchmarks([benchmark_name], database)
+    else:
+        print(f"⚠️ Aucun indice de référence pour le secteur {manager['investment_sector']}.")
+    
     size = len(tickers) - len(missing_tickers)
     if missing_tickers:
         print(f"⚠️ {len(missing_tickers)} actifs n'ont pas pu être téléchargés.")
@@ -343,6 +350,63 @@ def download_asset(ticker: str) -> Optional[Product]:
         return None
 
 
+def download_benchmark(name: str) -> Optional[Benchmark]:
+    """
+    Télécharge l'historique hebdomadaire d'un indice de référence depuis Yahoo Finance.
+    
+    Args:
+        name: Symbole de l'indice (ex: 'XLK')
+        
+    Returns:
+        Optional[Benchmark]: L'indice téléchargé ou None en cas d'erreur
+    """
+    try:
+        time.sleep(1)
+        
+        # Même période et même fréquence que les produits
+        data = yf.Ticker(name).history(start=datetime(2022, 1, 1), end=datetime(2024, 12, 31), interval='1wk')
+        
+        if data.empty:
+            print(f"⚠️ Aucune donnée historique disponible pour l'indice {name}")
+            return None
+        
+        data['returns'] = data['Close'].pct_change()
+        data = data.rename(columns={'Close': 'price'})[['price', 'returns']].reset_index()
+        data = data.rename(columns={'Date': 'date'})
+        
+        return Benchmark(name=name, returns=data)
+        
+    except Exception as e:
+        print(f"❌ Erreur lors du téléchargement de l'indice {name}: {str(e)}")
+        return None
+
+
+def check_and_download_benchmarks(names: List[str], db: sqlite3.Connection) -> List[str]:
+    """
+    Vérifie les indices de référence manquants et les télécharge si nécessaire.
+    
+    Args:
+        names: Symboles des indices à vérifier
+        db: Connexion à la base de données
+        
+    Returns:
+        List[str]: Liste des indices qui n'ont pas pu être téléchargés
+    """
+    missing_benchmarks = []
+    
+    for name in names:
+        if Benchmark.exists(db, name):
+            continue
+        print(f"📥 Téléchargement de l'indice de référence {name}...")
+        benchmark = download_benchmark(name)
+        if benchmark is None or not benchmark.save(db):
+            missing_benchmarks.append(name)
+        else:
+            print(f"✅ Indice {name} sauvegardé avec succès.")
+    
+    return missing_benchmarks
+
+
 def check_and_download_assets(tickers: List[str], db: sqlite3.Connection) -> List[str]:
     """
     Vérifie les actifs manquants et les télécharge si nécessaire.
@@ -0,0 +1,156 @@
+import functools
+import json
+import os
+import time
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+
+# Contexte vide partagé, renvoyé quand l'instrumentation est désactivée
+_NULL_TIMER = nullcontext()
+
+
+class _StageTimer:
+    """Chronomètre d'une exécution d'étape, utilisé comme gestionnaire de contexte."""
+
+    __slots__ = ('durations', 'start')
+
+    def __init__(self, durations: List[float]):
+        self.durations = durations
+        self.start = 0.0
+
+    def __enter__(self) -> '_StageTimer':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.durations.append(time.perf_counter() - self.start)
+
+
+class Instrumentation:
+    """
+    Chronomètres et compteurs des étapes critiques d'une exécution.
+
+    Désactivée, l'instrumentation se réduit à un test booléen par appel.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.timings: Dict[str, List[float]] = defaultdict(list)
+        self.counters: Counter = Counter()
+
+    def enable(self) -> None:
+        """Active l'instrumentation."""
+        self.enabled = True
+
+    def disable(self) -> None:
+        """Désactive l'instrumentation."""
+        self.enabled = False
+
+    def reset(self) -> None:
+        """Efface les mesures accumulées."""
+        self.timings.clear()
+        self.counters.clear()
+
+    def timer(self, stage: str):
+        """
+        Retourne un chronomètre pour une exécution d'étape.
+
+        Args:
+            stage: Nom de l'étape (ex: 'optimize')
+
+        Returns:
+            Gestionnaire de contexte qui enregistre la durée de son bloc
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _StageTimer(self.timings[stage])
+
+    def count(self, name: str, n: int = 1) -> None:
+        """
+        Incrémente un compteur.
+
+        Args:
+            name: Nom du compteur
+            n: Incrément
+        """
+        if self.enabled:
+            self.counters[name] += n
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Construit le rapport de l'exécution.
+
+        Returns:
+            Dict[str, Any]: Par étape, nombre d'appels, durée totale et latences p50/p95/p99 (ms),
+            ainsi que les compteurs
+        """
+        stages = {}
+        for stage, durations in sorted(self.timings.items()):
+            if not durations:
+                continue
+            p50, p95, p99 = np.percentile(durations, [50, 95, 99]) * 1000
+            stages[stage] = {
+                'calls': len(durations),
+                'total_s': float(sum(durations)),
+                'mean_ms': float(np.mean(durations) * 1000),
+                'p50_ms': float(p50),
+                'p95_ms': float(p95),
+                'p99_ms': float(p99),
+            }
+        return {'stages': stages, 'counters': dict(self.counters)}
+
+    def to_json(self, path: Optional[str] = None) -> str:
+        """
+        Exporte le rapport au format JSON.
+
+        Args:
+            path: (facultatif) Fichier dans lequel écrire le rapport
+
+        Returns:
+            str: Rapport JSON
+        """
+        report_json = json.dumps(self.report(), indent=2)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(report_json)
+        return report_json
+
+    def print_report(self) -> None:
+        """Affiche le rapport de l'exécution par étape, de la plus coûteuse à la moins coûteuse."""
+        report = self.report()
+        print("\n=== Rapport d'instrumentation ===")
+        print(f"{'Étape':<25}{'Appels':>8}{'Total (s)':>12}{'p50 (ms)':>11}{'p95 (ms)':>11}{'p99 (ms)':>11}")
+        for stage, stats in sorted(report['stages'].items(), key=lambda item: -item[1]['total_s']):
+            print(f"{stage:<25}{stats['calls']:>8}{stats['total_s']:>12.3f}"
+                  f"{stats['p50_ms']:>11.2f}{stats['p95_ms']:>11.2f}{stats['p99_ms']:>11.2f}")
+        for name, value in sorted(report['counters'].items()):
+            print(f"{name:<25}{value:>8}")
+
+
+# Instance partagée par tous les modules, activée par la variable d'environnement FUND_INSTRUMENTATION=1
+instrumentation = Instrumentation(enabled=os.environ.get('FUND_INSTRUMENTATION') == '1')
+
+
+def timed(stage: str) -> Callable:
+    """
+    Décorateur qui chronomètre chaque appel de la fonction sous le nom d'étape donné.
+
+    Args:
+        stage: Nom de l'étape
+
+    Returns:
+        Callable: Décorateur
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not instrumentation.enabled:
+                return func(*args, **kwargs)
+            with instrumentation.timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,5 +1,7 @@
+import os
 import sqlite3
-from datetime import datetime, timedelta
+from contextlib import closing
+from datetime import datetime
 
 
 from data_collector import (
@@ -9,9 +11,14 @@ from data_collector import (
     create_manager,
     create_portfolio
 )
-from base_builder import Client, AssetManager, Portfolio, BaseModel
+from base_builder import Client, AssetManager, Portfolio, BaseModel, Benchmark, SECTOR_BENCHMARKS, get_db_path, day_to_str
 from strategies import Simulation
-from performances import analyze_portfolio_performance, get_portfolio_rankings
+from repository import Repository
+from performances import analyze_portfolio_performance, get_portfolio_rankings, get_fund_performance_dfs, SnapshotCollector
+from charts import render_fund_charts
+from instrumentation import instrumentation
+from sql_tracer import print_query_summary
+from writer_service import get_writer
 import pandas as pd
 
 
@@ -25,6 +32,8 @@ def register_new_client() -> None:
     """
     try:
         db = BaseModel.get_db_connection()
+        # Écritures confiées au service d'écriture du processus (lectures sur la connexion)
+        writer = get_writer()
         sortie = False
 
         # Demande à l'utilisateur son choix
@@ -69,7 +78,7 @@ def register_new_client() -> None:
                 if choice == "Oui":
                     print(assigned_manager)
                     manager = AssetManager(**assigned_manager)
-                    client_data["manager_id"] = manager.save(db)
+                    client_data["manager_id"] = writer.save(manager).result()
                     print(f"✅ Manager {manager.name} recruté avec succès.")
                 else:
                     print("❌ Enregistrement du client annulé.")
@@ -89,12 +98,12 @@ def register_new_client() -> None:
                 
                 # Création du client
                 client = Client(**client_data)
-                client_id = client.save(db)
+                client_id = writer.save(client).result()
                 
                 # Mise à jour du portefeuille avec l'ID du client
                 portfolio_data["client_id"] = client_id
                 portfolio = Portfolio(**portfolio_data)
-                portfolio.save(db)
+                writer.save(portfolio).result()
                 
                 print(f"✅ {client_data['name']} est à présent un(e) client(e) de 'Data Management Project'.")
 
@@ -131,129 +140,86 @@ def analyze_performance():
 
 def analyze_client_performance():
     """Fonction pour analyser les performances d'un client spécifique."""
-    db = BaseModel.get_db_connection()
-    cursor = db.cursor()
+    # Analyse sur un instantané : la base n'est ni modifiée ni verrouillée par la simulation
+    with closing(BaseModel.snapshot_connection()) as db:
+        cursor = db.cursor()
     
-    # Récupérer le dernier client inscrit
-    cursor.execute("""
-        SELECT c.id, c.name, c.registration_date, p.id as portfolio_id, p.strategy
-        FROM Clients c
-        LEFT JOIN Portfolios p ON c.id = p.client_id
-        ORDER BY c.id DESC
-        LIMIT 1
-    """)
-    last_client = cursor.fetchone()
+        repository = Repository(db)
     
-    print(f"\nDernier client inscrit : {last_client[1]} (inscrit le {last_client[2]})")
-    print("Voulez-vous analyser ce client ? (o/n)")
-    choice = input()
+        # Récupérer le dernier client inscrit
+        cursor.execute("SELECT MAX(id) FROM Clients")
+        last_client = repository.get(Client, cursor.fetchone()[0])
     
-    if choice.lower() == 'o':
-        client_id = last_client[0]
-        portfolio_id = last_client[3]
-        strategy = last_client[4]
-        client_registration_date = last_client[2]
-    else:
-        print("Entrez l'ID du client à analyser :")
-        client_id = int(input())
-        
-        cursor.execute("""
-            SELECT c.registration_date, p.id, p.strategy
-            FROM Clients c
-            LEFT JOIN Portfolios p ON c.id = p.client_id
-            WHERE c.id = ?
-        """, (client_id,))
-        result = cursor.fetchone()
-        if not result:
-            print("Client non trouvé.")
-            return
-        
-        client_registration_date = result[0]
-        portfolio_id = result[1]
-        strategy = result[2]
+        print(f"\nDernier client inscrit : {last_client.name} (inscrit le {last_client.registration_date})")
+        print("Voulez-vous analyser ce client ? (o/n)")
+        choice = input()
     
-    # Récupérer le montant initial investi
-    cursor.execute("SELECT investment_amount FROM Clients WHERE id = ?", (client_id,))
-    initial_amount = cursor.fetchone()[0]
+        if choice.lower() == 'o':
+            client = last_client
+        else:
+            print("Entrez l'ID du client à analyser :")
+            client = repository.get(Client, int(input()))
+            if client is None:
+                print("Client non trouvé.")
+                return
     
-    print(f"\nAnalyse du portefeuille {portfolio_id} (Stratégie: {strategy})")
-    print(f"Début de l'analyse à partir du: {client_registration_date}")
-    print(f"Montant initial investi : {initial_amount:,.2f} €")
+        # Portefeuille du client (lu une fois, partagé avec la simulation par le dépôt)
+        portfolio = repository.get(Portfolio, client.portfolio_id)
+        portfolio_id = client.portfolio_id
+        strategy = portfolio.strategy
+        client_registration_date = client.registration_date
+        initial_amount = client.investment_amount
     
-    # Créer une instance de Simulation
-    simulation = Simulation(db, portfolio_id, strategy, client_registration_date)
+        print(f"\nAnalyse du portefeuille {portfolio_id} (Stratégie: {strategy})")
+        print(f"Début de l'analyse à partir du: {client_registration_date}")
+        print(f"Montant initial investi : {initial_amount:,.2f} €")
     
-     # DataFrame pour stocker les performances du portefeuille
-    portfolio_performance_df = pd.DataFrame(columns=["date", "cash", "portfolio_value"])
+        # Créer une instance de Simulation
+        simulation = Simulation(db, portfolio_id, strategy, client_registration_date,
+                                trace_queries=instrumentation.enabled, repository=repository)
     
-    # Variable pour stocker les tickers (produits uniques) rencontrés
-    all_tickers = set()
-
-    # Simuler la gestion active du portefeuille
-    current_date = datetime.strptime(client_registration_date, '%Y-%m-%d')
-    end_date = datetime(2024, 12, 31)
-    
-    while current_date <= end_date:
-        # Trouver le prochain lundi
-        while current_date.weekday() != 0:  # 0 = lundi
-            current_date += timedelta(days=1)
-        
-        # Exécuter la stratégie pour ce lundi
-        positions, cash = simulation.execute_strategy(current_date)
-        
-        # Ajouter les tickers rencontrés à la liste
-        for position in positions:
-            all_tickers.add(position['ticker'])
-        
-        # Créer une ligne pour stocker la valeur de chaque produit et la valeur totale du portefeuille
-        row = {'date': current_date, 'cash': cash['value'], 'portfolio_value': sum(p['value'] for p in positions) + cash['value']}
-        
-        # Ajouter les valeurs des produits (tickers) dynamiquement dans le DataFrame
-        for ticker in all_tickers:
-            ticker_value = sum(p['value'] for p in positions if p['ticker'] == ticker)
-            row[ticker] = ticker_value
-        
-        # Ajouter la ligne au DataFrame
-        new_row = pd.DataFrame([row])
-        portfolio_performance_df = pd.concat([portfolio_performance_df, new_row], ignore_index=True)
-        
-        # Passer à la semaine suivante
-        current_date += timedelta(days=7)
-    
-
-
-    # Réorganiser le DataFrame pour avoir une colonne pour chaque produit et la valeur totale
-    portfolio_performance_df.set_index('date', inplace=True)
+        # Simuler la gestion active du portefeuille
+        end_date = datetime(2024, 12, 31)
+        portfolio_performance_df = SnapshotCollector().collect(simulation.iter_weeks(end_date=end_date)).to_dataframe()
     
-    # Afficher le DataFrame des performances
-    print("\n=== Performance du portefeuille ===")
-    print(portfolio_performance_df)
+        # Afficher le DataFrame des performances
+        print("\n=== Performance du portefeuille ===")
+        print(portfolio_performance_df)
     
     
-    # Afficher le résumé final
-    print("\n=== Résumé de la gestion active ===")
-    print(f"Période : du {datetime.strptime(client_registration_date, '%Y-%m-%d').strftime('%Y-%m-%d')} au {end_date.strftime('%Y-%m-%d')}")
-    print(f"Nombre de semaines : {(end_date - datetime.strptime(client_registration_date, '%Y-%m-%d')).days // 7}")
+        # Afficher le résumé final
+        print("\n=== Résumé de la gestion active ===")
+        print(f"Période : du {datetime.strptime(client_registration_date, '%Y-%m-%d').strftime('%Y-%m-%d')} au {end_date.strftime('%Y-%m-%d')}")
+        print(f"Nombre de semaines : {(end_date - datetime.strptime(client_registration_date, '%Y-%m-%d')).days // 7}")
     
-    # Calculer la performance finale
-    final_positions, cash = simulation.get_portfolio_positions(portfolio_id, end_date)
-    if final_positions:
-        portfolio_value = sum(position['value'] for position in final_positions) + cash['value']
+        # Calculer la performance finale
+        final_positions = simulation.get_portfolio_positions(portfolio_id, end_date)
+        if len(final_positions):
+            portfolio_value = final_positions.total_value()
         
-        # Calculer la performance
-        performance = (portfolio_value - initial_amount) / initial_amount * 100
+            # Calculer la performance
+            performance = (portfolio_value - initial_amount) / initial_amount * 100
         
-        print("\n=== Performance du portefeuille ===")
-        print(f"Valeur initiale : {initial_amount:,.2f} €")
-        print(f"Valeur finale : {portfolio_value:,.2f} €")
-        print(f"Performance : {performance:+.2f}%")
-        print(f"Gain/Perte : {(portfolio_value - initial_amount):+,.2f} €")
+            print("\n=== Performance du portefeuille ===")
+            print(f"Valeur initiale : {initial_amount:,.2f} €")
+            print(f"Valeur finale : {portfolio_value:,.2f} €")
+            print(f"Performance : {performance:+.2f}%")
+            print(f"Gain/Perte : {(portfolio_value - initial_amount):+,.2f} €")
 
-    # Analyse des performances
-    analyze_portfolio_performance(portfolio_performance_df)
+        # Indice de référence du secteur du portefeuille, s'il est disponible
+        benchmark_name = SECTOR_BENCHMARKS.get(portfolio.investment_sector)
+        benchmark_df = None
+        if benchmark_name and Benchmark.exists(db, benchmark_name):
+            benchmark_prices = Benchmark.get_aligned_prices(db, [benchmark_name], portfolio_performance_df.index)
+            benchmark_df = pd.DataFrame({'date': benchmark_prices.index, 'benchmark_value': benchmark_prices[benchmark_name].to_numpy()})
+            print(f"Indice de référence : {benchmark_name}")
     
-    BaseModel.reinitialize_portfolio(db, portfolio_id)
-    db.close()
+        # Analyse des performances
+        analyze_portfolio_performance(portfolio_performance_df, benchmark_df)
+    
+    if simulation.query_summary is not None:
+        print_query_summary(simulation.query_summary)
+    report_instrumentation()
 
 
 def analyze_fund_performance():
@@ -266,7 +232,7 @@ def analyze_fund_performance():
         SELECT MIN(registration_date)
         FROM Clients
     """)
-    start_date = cursor.fetchone()[0]
+    start_date = day_to_str(cursor.fetchone()[0])
     
     print(f"\nAnalyse des performances du fonds depuis le: {start_date}")
     
@@ -293,10 +259,32 @@ def analyze_fund_performance():
     print(f"Meilleure Performance: {best_performance:+.2f}%")
     print(f"Pire Performance: {worst_performance:+.2f}%")
     
-    # Réinitialiser tous les portefeuilles
-    BaseModel.reinitialize_all_portfolios(db)
+    # Export des graphiques de tous les portefeuilles
+    choice = input("\nVoulez-vous enregistrer les graphiques de tous les portefeuilles ? (o/n) ")
+    if choice.lower() == 'o':
+        output_dir = os.path.join(os.path.dirname(get_db_path()), "reports")
+        performance_dfs = get_fund_performance_dfs(db, start_date)
+        chart_paths = render_fund_charts(performance_dfs, output_dir, formats=('png', 'svg'))
+        print(f"✅ Graphiques de {len(chart_paths)} portefeuilles enregistrés dans {output_dir}")
+    
+    # Les portefeuilles sont simulés sur des instantanés : la base n'a pas à être réinitialisée
     db.close()
     
+    report_instrumentation()
+
+
+def report_instrumentation() -> None:
+    """Affiche et exporte en JSON le rapport d'instrumentation de l'analyse, s'il est activé."""
+    if not instrumentation.enabled:
+        return
+    
+    instrumentation.print_report()
+    report_path = os.path.join(os.path.dirname(get_db_path()), "reports", "instrumentation.json")
+    os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    instrumentation.to_json(report_path)
+    print(f"✅ Rapport d'instrumentation enregistré dans {report_path}")
+    instrumentation.reset()
+    
 def main() -> None:
     """
     Fonction principale du programme.
@@ -0,0 +1,151 @@
+import warnings
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Tuple
+
+
+PERIODS_PER_YEAR = 52  # Valeurs hebdomadaires
+
+
+def build_nav_matrix(performance_dfs: Dict[int, pd.DataFrame]) -> Tuple[pd.DatetimeIndex, List[int], np.ndarray]:
+    """
+    Aligne les valeurs de plusieurs portefeuilles sur un calendrier commun.
+
+    Args:
+        performance_dfs: DataFrames de performance par ID de portefeuille (colonne 'portfolio_value')
+
+    Returns:
+        Tuple[pd.DatetimeIndex, List[int], np.ndarray]:
+            - Dates communes (lignes)
+            - IDs des portefeuilles (colonnes)
+            - Matrice des valeurs (dates × portefeuilles), NaN hors de la période d'un portefeuille
+    """
+    nav_df = pd.concat({portfolio_id: df['portfolio_value'] for portfolio_id, df in performance_dfs.items()},
+                       axis=1).sort_index()
+    return pd.DatetimeIndex(nav_df.index), list(nav_df.columns), nav_df.to_numpy(dtype=float)
+
+
+def compute_returns(nav: np.ndarray) -> np.ndarray:
+    """
+    Calcule les rendements périodiques d'une matrice de valeurs.
+
+    Args:
+        nav: Valeurs (dates × portefeuilles)
+
+    Returns:
+        np.ndarray: Rendements (dates - 1 × portefeuilles)
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return nav[1:] / nav[:-1] - 1
+
+
+def compute_performance_metrics(nav: np.ndarray, periods_per_year: int = PERIODS_PER_YEAR) -> Dict[str, np.ndarray]:
+    """
+    Calcule les statistiques de performance de tous les portefeuilles en une passe vectorisée.
+
+    Les NaN (portefeuille pas encore ouvert ou déjà clos) sont ignorés colonne par colonne.
+
+    Args:
+        nav: Valeurs des portefeuilles (dates × portefeuilles), ou un vecteur pour un seul portefeuille
+        periods_per_year: Nombre de périodes par an pour l'annualisation
+
+    Returns:
+        Dict[str, np.ndarray]: Une valeur par portefeuille pour chaque statistique :
+            sharpe_ratio, volatility, cumulative_return, max_drawdown, sortino_ratio
+    """
+    nav = np.asarray(nav, dtype=float)
+    if nav.ndim == 1:
+        nav = nav[:, None]
+
+    returns = compute_returns(nav)
+    annualization = np.sqrt(periods_per_year)
+
+    # Les colonnes vides ou constantes donnent des NaN/inf sans avertissement
+    with np.errstate(divide='ignore', invalid='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+
+        # Moyenne et écart-type (ddof=1, comme pandas)
+        mean_return = np.nanmean(returns, axis=0)
+        std_return = np.nanstd(returns, axis=0, ddof=1)
+
+        # Rendement cumulé entre la première et la dernière valeur connue
+        valid = ~np.isnan(nav)
+        first_idx = valid.argmax(axis=0)
+        last_idx = nav.shape[0] - 1 - valid[::-1].argmax(axis=0)
+        columns = np.arange(nav.shape[1])
+        cumulative_return = nav[last_idx, columns] / nav[first_idx, columns] - 1
+
+        # Maximum Drawdown
+        running_max = np.fmax.accumulate(nav, axis=0)
+        max_drawdown = np.nanmin((nav - running_max) / running_max, axis=0)
+
+        # Sortino Ratio : écart-type des seuls rendements négatifs
+        downside = np.where(returns < 0, returns, np.nan)
+        downside_std = np.nanstd(downside, axis=0, ddof=1)
+
+        return {
+            'sharpe_ratio': mean_return / std_return * annualization,
+            'volatility': std_return * annualization,
+            'cumulative_return': cumulative_return,
+            'max_drawdown': max_drawdown,
+            'sortino_ratio': mean_return / downside_std * annualization,
+        }
+
+
+def compute_relative_metrics(portfolio_returns: np.ndarray, benchmark_returns: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Calcule alpha, beta et tracking error de tous les portefeuilles face à leur indice en une passe.
+
+    Les deux matrices doivent être alignées (mêmes dates, une colonne d'indice par portefeuille).
+    Seules les périodes où les deux rendements sont connus sont utilisées.
+
+    Args:
+        portfolio_returns: Rendements des portefeuilles (dates × portefeuilles)
+        benchmark_returns: Rendements des indices de référence (dates × portefeuilles)
+
+    Returns:
+        Dict[str, np.ndarray]: Une valeur par portefeuille pour alpha (par période), beta et tracking_error
+    """
+    portfolio_returns = np.asarray(portfolio_returns, dtype=float)
+    benchmark_returns = np.asarray(benchmark_returns, dtype=float)
+    if portfolio_returns.ndim == 1:
+        portfolio_returns = portfolio_returns[:, None]
+        benchmark_returns = benchmark_returns[:, None]
+
+    # Masque commun : les deux séries doivent être renseignées
+    valid = ~(np.isnan(portfolio_returns) | np.isnan(benchmark_returns))
+    nb_obs = valid.sum(axis=0)
+    p = np.where(valid, portfolio_returns, 0.0)
+    b = np.where(valid, benchmark_returns, 0.0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_p = p.sum(axis=0) / nb_obs
+        mean_b = b.sum(axis=0) / nb_obs
+        dev_p = np.where(valid, p - mean_p, 0.0)
+        dev_b = np.where(valid, b - mean_b, 0.0)
+
+        covariance = (dev_p * dev_b).sum(axis=0) / (nb_obs - 1)
+        benchmark_variance = (dev_b ** 2).sum(axis=0) / (nb_obs - 1)
+        beta = covariance / benchmark_variance
+        alpha = mean_p - beta * mean_b
+
+        # Écart-type (ddof=0) des écarts de rendement
+        active = np.where(valid, p - b, 0.0)
+        mean_active = active.sum(axis=0) / nb_obs
+        tracking_error = np.sqrt((np.where(valid, active - mean_active, 0.0) ** 2).sum(axis=0) / nb_obs)
+
+    return {'alpha': alpha, 'beta': beta, 'tracking_error': tracking_error}
+
+
+def metrics_to_dataframe(metrics: Dict[str, np.ndarray], portfolio_ids: List[int]) -> pd.DataFrame:
+    """
+    Met en forme les statistiques calculées par compute_performance_metrics.
+
+    Args:
+        metrics: Statistiques par portefeuille
+        portfolio_ids: IDs des portefeuilles, dans l'ordre des colonnes de la matrice des valeurs
+
+    Returns:
+        pd.DataFrame: Une ligne par portefeuille, une colonne par statistique
+    """
+    return pd.DataFrame(metrics, index=pd.Index(portfolio_ids, name='portfolio_id'))
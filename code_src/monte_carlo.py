@@ -0,0 +1,305 @@
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from allocators import project_capped_simplex
+from metrics import compute_performance_metrics
+from strategies import DEFAULT_PARAMS, StrategyStats, get_strategy
+
+
+# Paramètres des stratégies, identiques à ceux de Simulation
+VOL_TARGET = DEFAULT_PARAMS['vol_target']
+MAX_DEALS_PER_MONTH = DEFAULT_PARAMS['max_deals_per_month']
+MAX_WEIGHT = DEFAULT_PARAMS['max_weight']
+LOOKBACK_WEEKS = DEFAULT_PARAMS['lookback_weeks']
+RISK_FREE_RATE = DEFAULT_PARAMS['risk_free_rate']
+ANNUALIZATION = 252          # Facteur d'annualisation utilisé par Simulation.optimize
+
+
+def load_universe_returns(db: sqlite3.Connection, portfolio_id: int) -> Tuple[List[str], np.ndarray]:
+    """
+    Charge l'historique des rendements hebdomadaires des produits d'un portefeuille.
+
+    Args:
+        db: Connexion à la base de données
+        portfolio_id: ID du portefeuille
+
+    Returns:
+        Tuple[List[str], np.ndarray]: Tickers et rendements (semaines × produits)
+    """
+    cursor = db.cursor()
+    cursor.execute("""
+        SELECT p.ticker
+        FROM Portfolios_Products pp
+        JOIN Products p ON pp.product_id = p.id
+        WHERE pp.portfolio_id = ?
+        ORDER BY p.id
+    """, (portfolio_id,))
+    tickers = [row[0] for row in cursor.fetchall()]
+
+    returns = {
+        ticker: pd.read_sql_query(f"SELECT date, returns FROM Returns_{ticker} ORDER BY date", db,
+                                  index_col='date')['returns']
+        for ticker in tickers
+    }
+    returns_df = pd.DataFrame(returns).sort_index().iloc[1:].fillna(0.0)
+    return tickers, returns_df.to_numpy(dtype=float)
+
+
+def generate_paths(returns: np.ndarray, nb_paths: int, nb_weeks: int, rng: np.random.Generator,
+                   method: str = 'bootstrap', block_size: int = 4) -> np.ndarray:
+    """
+    Génère des trajectoires de rendements hebdomadaires.
+
+    Args:
+        returns: Rendements historiques (semaines × produits)
+        nb_paths: Nombre de trajectoires
+        nb_weeks: Nombre de semaines par trajectoire
+        rng: Générateur aléatoire
+        method: 'bootstrap' (tirage de blocs de semaines historiques) ou 'normal' (loi normale multivariée)
+        block_size: Taille des blocs du bootstrap, qui préserve l'autocorrélation de court terme
+
+    Returns:
+        np.ndarray: Rendements simulés (trajectoires × semaines × produits)
+    """
+    nb_history, nb_products = returns.shape
+
+    if method == 'normal':
+        return rng.multivariate_normal(returns.mean(axis=0), np.cov(returns, rowvar=False),
+                                       size=(nb_paths, nb_weeks))
+
+    if method != 'bootstrap':
+        raise ValueError(f"Méthode de simulation inconnue : {method}")
+
+    # Bootstrap par blocs : indices de départ aléatoires, puis semaines consécutives
+    nb_blocks = -(-nb_weeks // block_size)
+    starts = rng.integers(0, nb_history - block_size + 1, size=(nb_paths, nb_blocks))
+    indices = (starts[:, :, None] + np.arange(block_size)).reshape(nb_paths, -1)[:, :nb_weeks]
+    return returns[indices]
+
+
+def batched_target_weights(window: np.ndarray, max_weight: float, risk_free_rate: float = RISK_FREE_RATE) -> np.ndarray:
+    """
+    Calcule les poids cibles de toutes les trajectoires en une passe.
+
+    Approximation fermée de l'optimisation de Sharpe de Simulation.optimize : poids proportionnels
+    à Σ⁻¹(μ - rf), ramenés aux contraintes long-only et plafonnées.
+
+    Args:
+        window: Fenêtre de rendements (trajectoires × semaines × produits)
+        max_weight: Poids maximal par produit
+        risk_free_rate: Taux sans risque annuel
+
+    Returns:
+        np.ndarray: Poids cibles (trajectoires × produits)
+    """
+    nb_weeks, nb_products = window.shape[1:]
+    mean = window.mean(axis=1)
+    centered = window - mean[:, None, :]
+    cov = np.einsum('pln,plm->pnm', centered, centered) / (nb_weeks - 1)
+
+    # Régularisation : la fenêtre de 12 semaines rend la covariance singulière au-delà de 12 produits
+    ridge = 1e-4 * np.trace(cov, axis1=1, axis2=2)[:, None, None] / nb_products + 1e-12
+    cov = cov + ridge * np.eye(nb_products)
+
+    raw = np.linalg.solve(cov, (mean - risk_free_rate / ANNUALIZATION)[:, :, None])[:, :, 0]
+    return project_capped_simplex(raw, max_weight)
+
+
+def simulate_strategy(paths: np.ndarray, history: np.ndarray, strategy: str, initial_value: float,
+                      start_date: str = '2022-01-03') -> np.ndarray:
+    """
+    Applique la logique de rééquilibrage d'une stratégie à toutes les trajectoires à la fois.
+
+    Chaque lundi, la stratégie enregistrée calcule les poids cibles de toutes les trajectoires à partir
+    de la fenêtre des LOOKBACK_WEEKS dernières semaines, les écarts sont exécutés selon ses règles
+    (sens autorisés, plafond mensuel de deals), puis les rendements de la semaine sont appliqués.
+
+    Args:
+        paths: Rendements simulés (trajectoires × semaines × produits)
+        history: Rendements historiques précédant la simulation (au moins LOOKBACK_WEEKS semaines)
+        strategy: 'Low Risk', 'Medium Risk' ou 'High Risk'
+        initial_value: Valeur initiale du portefeuille
+        start_date: Premier lundi de la simulation (pour le plafond mensuel de deals)
+
+    Returns:
+        np.ndarray: Valeurs du portefeuille (trajectoires × semaines + 1)
+    """
+    nb_paths, nb_weeks, nb_products = paths.shape
+    max_weight = MAX_WEIGHT
+
+    # Fenêtres glissantes : historique réel suivi de la trajectoire simulée
+    prefix = np.broadcast_to(history[-LOOKBACK_WEEKS:], (nb_paths, LOOKBACK_WEEKS, nb_products))
+    all_returns = np.concatenate([prefix, paths], axis=1)
+
+    weights = np.zeros((nb_paths, nb_products))
+    cash = np.ones(nb_paths)
+    nav = np.empty((nb_paths, nb_weeks + 1))
+    nav[:, 0] = initial_value
+
+    months = pd.date_range(start_date, periods=nb_weeks, freq='7D').month.to_numpy()
+    deals_left = np.full(nb_paths, MAX_DEALS_PER_MONTH)
+
+    # Même stratégie que Simulation (voir STRATEGY_REGISTRY), appliquée à toutes les trajectoires
+    strategy_plugin = get_strategy(strategy, DEFAULT_PARAMS)
+    constraints = strategy_plugin.constraints
+
+    for week in range(nb_weeks):
+        window = all_returns[:, week:week + LOOKBACK_WEEKS]
+        if week > 0 and months[week] != months[week - 1]:
+            deals_left[:] = MAX_DEALS_PER_MONTH
+
+        stats = StrategyStats(window, weights, deals_left if constraints.max_deals_per_month is not None else None,
+                              lambda: batched_target_weights(window, max_weight))
+        target = strategy_plugin.target_weights(stats)
+        if target is None:
+            target = weights
+
+        # Règles d'exécution de la stratégie, comme apply_trades : sens autorisés puis plafond de deals
+        diff = target - weights
+        allowed = ((diff > 1e-12) & constraints.allow_buys) | ((diff < -1e-12) & constraints.allow_sells)
+        if constraints.max_deals_per_month is not None:
+            allowed &= np.cumsum(allowed, axis=1) <= deals_left[:, None]
+            deals_left -= allowed.sum(axis=1)
+        target = np.where(allowed, target, weights)
+
+        # Les achats sont limités au cash disponible après les ventes
+        diff = target - weights
+        buys = np.clip(diff, 0.0, None)
+        sells = np.clip(-diff, 0.0, None)
+        available = cash + sells.sum(axis=1)
+        total_buys = buys.sum(axis=1)
+        buy_scale = np.where(total_buys > available, available / np.where(total_buys > 0, total_buys, 1.0), 1.0)
+        weights = weights - sells + buys * buy_scale[:, None]
+        cash = 1.0 - weights.sum(axis=1)
+
+        # Rendements de la semaine
+        growth = weights * (1 + paths[:, week])
+        total = cash + growth.sum(axis=1)
+        nav[:, week + 1] = nav[:, week] * total
+        weights = growth / total[:, None]
+        cash = cash / total
+
+    return nav
+
+
+def summarize_outcomes(nav: np.ndarray, percentiles=(5, 25, 50, 75, 95)) -> Dict[str, Dict[str, float]]:
+    """
+    Résume les distributions de valeur finale, de drawdown maximal et de ratio de Sharpe.
+
+    Args:
+        nav: Valeurs du portefeuille (trajectoires × semaines + 1)
+        percentiles: Percentiles à reporter
+
+    Returns:
+        Dict[str, Dict[str, float]]: Moyenne et percentiles de chaque statistique
+    """
+    metrics = compute_performance_metrics(nav.T)
+    outcomes = {
+        'final_value': nav[:, -1],
+        'max_drawdown': metrics['max_drawdown'],
+        'sharpe_ratio': metrics['sharpe_ratio'],
+    }
+
+    summary = {}
+    for name, values in outcomes.items():
+        values = values[np.isfinite(values)]
+        summary[name] = {'mean': float(values.mean())}
+        summary[name].update({f"p{p}": float(v) for p, v in zip(percentiles, np.percentile(values, percentiles))})
+    return summary
+
+
+def _simulate_chunk(job: Tuple[np.ndarray, str, float, int, int, str, Any]) -> np.ndarray:
+    """Génère et simule un lot de trajectoires (exécuté dans un processus du pool)."""
+    history, strategy, initial_value, nb_paths, nb_weeks, method, seed = job
+    rng = np.random.default_rng(seed)
+    paths = generate_paths(history, nb_paths, nb_weeks, rng, method)
+    return simulate_strategy(paths, history, strategy, initial_value)
+
+
+def run_monte_carlo(db: sqlite3.Connection, portfolio_id: int, nb_paths: int = 10000, nb_weeks: int = 156,
+                    method: str = 'bootstrap', seed: int = 0, chunk_size: int = 2000,
+                    max_workers: Optional[int] = 1) -> Dict[str, Any]:
+    """
+    Simule la distribution des résultats d'un portefeuille sur de nombreuses trajectoires de marché.
+
+    Args:
+        db: Connexion à la base de données
+        portfolio_id: ID du portefeuille
+        nb_paths: Nombre de trajectoires
+        nb_weeks: Nombre de semaines par trajectoire
+        method: 'bootstrap' ou 'normal' (voir generate_paths)
+        seed: Graine du générateur aléatoire
+        chunk_size: Nombre de trajectoires simulées ensemble (limite la mémoire)
+        max_workers: Nombre de processus (1 : dans le processus courant, None : nombre de CPU)
+
+    Returns:
+        Dict[str, Any]: Paramètres de la simulation, durée et distributions des résultats
+    """
+    cursor = db.cursor()
+    cursor.execute("""
+        SELECT p.strategy, c.investment_amount
+        FROM Portfolios p
+        JOIN Clients c ON p.client_id = c.id
+        WHERE p.id = ?
+    """, (portfolio_id,))
+    row = cursor.fetchone()
+    if row is None:
+        raise ValueError(f"Portefeuille {portfolio_id} non trouvé")
+    strategy, initial_value = row
+
+    tickers, history = load_universe_returns(db, portfolio_id)
+
+    # Un lot par chunk_size trajectoires, chacun avec sa propre graine dérivée
+    chunk_sizes = [min(chunk_size, nb_paths - start) for start in range(0, nb_paths, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+    jobs = [(history, strategy, initial_value, size, nb_weeks, method, chunk_seed)
+            for size, chunk_seed in zip(chunk_sizes, seeds)]
+
+    start = time.perf_counter()
+    if max_workers == 1:
+        navs = [_simulate_chunk(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            navs = list(executor.map(_simulate_chunk, jobs))
+    nav = np.concatenate(navs)
+    elapsed = time.perf_counter() - start
+
+    return {
+        'portfolio_id': portfolio_id,
+        'strategy': strategy,
+        'tickers': tickers,
+        'nb_paths': nb_paths,
+        'nb_weeks': nb_weeks,
+        'method': method,
+        'seconds': elapsed,
+        'outcomes': summarize_outcomes(nav),
+    }
+
+
+def print_monte_carlo_report(report: Dict[str, Any]) -> None:
+    """
+    Affiche les distributions de résultats d'une simulation de Monte Carlo.
+
+    Args:
+        report: Résultat de run_monte_carlo
+    """
+    print(f"\n=== Monte Carlo : portefeuille {report['portfolio_id']} ({report['strategy']}) ===")
+    print(f"{report['nb_paths']} trajectoires × {report['nb_weeks']} semaines ({report['method']}) "
+          f"en {report['seconds']:.1f} s")
+    for name, stats in report['outcomes'].items():
+        values = "  ".join(f"{key}={value:,.2f}" for key, value in stats.items())
+        print(f"{name:<14} {values}")
+
+
+if __name__ == "__main__":
+    from base_builder import BaseModel
+
+    db = BaseModel.get_db_connection()
+    print_monte_carlo_report(run_monte_carlo(db, portfolio_id=1, max_workers=os.cpu_count()))
+    db.close()
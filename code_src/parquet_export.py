@@ -0,0 +1,188 @@
+import os
+import shutil
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from base_builder import get_db_path
+from backtest import load_price_history
+
+
+# Jeux de données exportés et leurs colonnes de partitionnement (dossiers colonne=valeur)
+PARQUET_DATASETS = {
+    'deals': ['portfolio_id', 'year'],
+    'prices': ['year'],
+    'portfolios_products': ['portfolio_id'],
+}
+
+
+def default_parquet_path() -> str:
+    """
+    Retourne le dossier de l'export Parquet, à côté de la base de données.
+
+    Returns:
+        str: Chemin du dossier parquet_export
+    """
+    return os.path.join(os.path.dirname(get_db_path()), 'parquet_export')
+
+
+def _years(days: pd.Series) -> np.ndarray:
+    """Année de chaque numéro de jour (colonne de partitionnement 'year')."""
+    return pd.to_datetime(days.to_numpy(dtype=np.int64), unit='D').year.to_numpy(dtype=np.int64)
+
+
+def _read_deals(db: sqlite3.Connection) -> pd.DataFrame:
+    """Lit tous les deals en une requête, avec le ticker de chaque produit."""
+    deals = pd.read_sql_query("""
+        SELECT d.id, d.portfolio_id, d.product_id, p.ticker, d.date, d.action, d.quantity, d.price
+        FROM Deals d
+        JOIN Products p ON d.product_id = p.id
+        ORDER BY d.portfolio_id, d.date, d.id
+    """, db)
+    deals['year'] = _years(deals['date'])
+    return deals
+
+
+def _read_prices(db: sqlite3.Connection) -> pd.DataFrame:
+    """Lit les prix et rendements de tous les produits, au format long (une ligne par produit et date)."""
+    products = pd.read_sql_query("SELECT id AS product_id, ticker FROM Products ORDER BY id", db)
+    history = load_price_history(db, products['ticker'].tolist())
+    product_ids = dict(zip(products['ticker'], products['product_id']))
+
+    lengths = [len(history.dates[ticker]) for ticker in history.dates]
+    prices = pd.DataFrame({
+        'product_id': np.repeat([product_ids[ticker] for ticker in history.dates], lengths).astype(np.int64),
+        'ticker': np.repeat(list(history.dates), lengths),
+        'date': np.concatenate(list(history.dates.values())) if lengths else np.empty(0, dtype=np.int32),
+        'price': np.concatenate(list(history.prices.values())) if lengths else np.empty(0),
+        'returns': np.concatenate(list(history.returns.values())) if lengths else np.empty(0),
+    })
+    prices['year'] = _years(prices['date'])
+    return prices
+
+
+def _read_portfolios_products(db: sqlite3.Connection) -> pd.DataFrame:
+    """Lit la composition de tous les portefeuilles."""
+    return pd.read_sql_query("""
+        SELECT pp.portfolio_id, pp.product_id, p.ticker, pp.quantity, pp.weight, pp.value
+        FROM Portfolios_Products pp
+        JOIN Products p ON pp.product_id = p.id
+        ORDER BY pp.portfolio_id, pp.product_id
+    """, db)
+
+
+def export_parquet(db: sqlite3.Connection, path: Optional[str] = None,
+                   datasets: Iterable[str] = tuple(PARQUET_DATASETS)) -> Dict[str, int]:
+    """
+    Exporte les deals, les prix et la composition des portefeuilles en fichiers Parquet partitionnés.
+
+    Chaque table est lue en une seule requête (sans construire de dictionnaire par ligne) puis écrite
+    avec pyarrow dans un dossier par jeu de données, partitionné selon PARQUET_DATASETS
+    (ex: deals/portfolio_id=3/year=2023/). Les dates restent des numéros de jour, comme dans la base.
+    Un export remplace le précédent.
+
+    Args:
+        db: Connexion à la base de données
+        path: Dossier de l'export (par défaut: default_parquet_path())
+        datasets: Jeux de données à exporter (voir PARQUET_DATASETS)
+
+    Returns:
+        Dict[str, int]: Nombre de lignes exportées par jeu de données
+    """
+    if path is None:
+        path = default_parquet_path()
+    readers = {'deals': _read_deals, 'prices': _read_prices, 'portfolios_products': _read_portfolios_products}
+
+    counts = {}
+    for name in datasets:
+        if name not in PARQUET_DATASETS:
+            raise ValueError(f"Jeu de données inconnu : {name}")
+        start = time.perf_counter()
+        df = readers[name](db)
+
+        dataset_path = os.path.join(path, name)
+        if os.path.exists(dataset_path):
+            shutil.rmtree(dataset_path)
+        df.to_parquet(dataset_path, engine='pyarrow', partition_cols=PARQUET_DATASETS[name], index=False)
+
+        counts[name] = len(df)
+        print(f"✅ {name} : {len(df)} lignes exportées en {time.perf_counter() - start:.2f} s ({dataset_path})")
+    return counts
+
+
+def load_parquet(name: str, path: Optional[str] = None, portfolio_ids: Optional[Iterable[int]] = None,
+                 years: Optional[Iterable[int]] = None, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Charge un jeu de données exporté dans un DataFrame.
+
+    Les filtres portant sur les colonnes de partitionnement, seuls les fichiers concernés sont lus.
+
+    Args:
+        name: Jeu de données ('deals', 'prices' ou 'portfolios_products')
+        path: Dossier de l'export (par défaut: default_parquet_path())
+        portfolio_ids: (facultatif) Portefeuilles à charger (deals, portfolios_products)
+        years: (facultatif) Années à charger (deals, prices)
+        columns: (facultatif) Colonnes à charger
+
+    Returns:
+        pd.DataFrame: Lignes du jeu de données, colonnes de partitionnement converties en entiers et
+        dates en datetime64
+    """
+    if name not in PARQUET_DATASETS:
+        raise ValueError(f"Jeu de données inconnu : {name}")
+    if path is None:
+        path = default_parquet_path()
+    partition_cols = PARQUET_DATASETS[name]
+
+    filters = []
+    for column, values in (('portfolio_id', portfolio_ids), ('year', years)):
+        if values is not None:
+            if column not in partition_cols:
+                raise ValueError(f"Le jeu de données {name} n'est pas partitionné par {column}")
+            filters.append((column, 'in', [int(value) for value in values]))
+
+    df = pd.read_parquet(os.path.join(path, name), engine='pyarrow', columns=columns, filters=filters or None)
+
+    # Les colonnes de partitionnement sont relues comme catégories
+    for column in partition_cols:
+        if column in df.columns:
+            df[column] = df[column].astype(np.int64)
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'].to_numpy(dtype=np.int64), unit='D')
+    return df
+
+
+def load_price_panel(path: Optional[str] = None, tickers: Optional[List[str]] = None,
+                     years: Optional[Iterable[int]] = None) -> Tuple[np.ndarray, List[str], np.ndarray]:
+    """
+    Charge les rendements exportés sous forme de matrice dates × produits.
+
+    Args:
+        path: Dossier de l'export (par défaut: default_parquet_path())
+        tickers: (facultatif) Produits à charger, dans l'ordre des colonnes (par défaut: tous)
+        years: (facultatif) Années à charger
+
+    Returns:
+        Tuple[np.ndarray, List[str], np.ndarray]:
+            - Dates triées (datetime64)
+            - Tickers, dans l'ordre des colonnes
+            - Rendements (dates × produits, NaN si absent)
+    """
+    prices = load_parquet('prices', path, years=years, columns=['ticker', 'date', 'returns'])
+    if tickers is not None:
+        prices = prices[prices['ticker'].isin(tickers)]
+    panel = prices.pivot(index='date', columns='ticker', values='returns').sort_index()
+    if tickers is not None:
+        panel = panel.reindex(columns=tickers)
+    return panel.index.to_numpy(), list(panel.columns), panel.to_numpy(dtype=float)
+
+
+if __name__ == "__main__":
+    from base_builder import BaseModel
+
+    db = BaseModel.get_db_connection()
+    export_parquet(db)
+    db.close()
@@ -1,95 +1,174 @@
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-from datetime import datetime, timedelta
-from strategies import Simulation
-from base_builder import BaseModel
+from datetime import datetime
+from strategies import DEFAULT_PARAMS, STRATEGY_ALLOCATORS, STRATEGY_VERSION, Simulation, WeeklySnapshot
+from base_builder import BaseModel, Benchmark, Client, Portfolio, SECTOR_BENCHMARKS, to_day
+from repository import Repository
+from metrics import (build_nav_matrix, compute_performance_metrics, compute_relative_metrics,
+                     compute_returns, metrics_to_dataframe)
+from charts import render_portfolio_charts, draw_portfolio_value, draw_average_allocation
+from typing import Dict, Iterable, List, Optional
 import sqlite3
+import hashlib
+import json
+import csv
 
-def analyze_portfolio_performance(portfolio_df, benchmark_df=None):
+def analyze_portfolio_performance(portfolio_df, benchmark_df=None, show: bool = True, output_dir: Optional[str] = None):
     """
     Analyse la performance d'un portefeuille à partir d'un DataFrame contenant les valeurs hebdomadaires.
     
     Args:
         portfolio_df: DataFrame contenant les valeurs du portefeuille avec la colonne 'portfolio_value'
         benchmark_df: (facultatif) DataFrame contenant les valeurs de l'indice de référence, avec la colonne 'benchmark_value'
+        show: Affiche les graphiques dans des fenêtres interactives
+        output_dir: (facultatif) Dossier où enregistrer les graphiques, sans affichage
+    
+    Returns:
+        Dict[str, float]: Statistiques de performance du portefeuille
     """
     portfolio_df.sort_values('date', inplace=True)
     
-    # Calcul des rendements hebdomadaires
-    portfolio_df['return'] = portfolio_df['portfolio_value'].pct_change()
-    
     # Calcul des statistiques de performance
-    sharpe_ratio = portfolio_df['return'].mean() / portfolio_df['return'].std() * (52 ** 0.5)  # Annualisé
-    volatility = portfolio_df['return'].std() * (52 ** 0.5)  # Annualisée
-    cumulative_return = (portfolio_df['portfolio_value'].iloc[-1] / portfolio_df['portfolio_value'].iloc[0]) - 1
+    metrics = {name: float(values[0]) for name, values in
+               compute_performance_metrics(portfolio_df['portfolio_value'].to_numpy()).items()}
     
     print("\n=== Analyse des performances ===")
-    print(f"Ratio de Sharpe: {sharpe_ratio:.2f}")
-    print(f"Volatilité annualisée: {volatility:.2%}")
-    print(f"Rendement cumulé: {cumulative_return:.2%}")
+    print(f"Ratio de Sharpe: {metrics['sharpe_ratio']:.2f}")
+    print(f"Volatilité annualisée: {metrics['volatility']:.2%}")
+    print(f"Rendement cumulé: {metrics['cumulative_return']:.2%}")
+    
+    print(f"Maximum Drawdown: {metrics['max_drawdown']:.2%}")
+    print(f"Sortino Ratio: {metrics['sortino_ratio']:.2f}")
     
-    # Si un benchmark est fourni, calcul des autres statistiques
+    # Si un benchmark est fourni, calcul des statistiques relatives
     if benchmark_df is not None:
-        benchmark_df['date'] = pd.to_datetime(benchmark_df['date'])
-        benchmark_df.sort_values('date', inplace=True)
-        benchmark_df['return'] = benchmark_df['benchmark_value'].pct_change()
-
-        # Alpha et Beta par rapport au benchmark
-        covariance = np.cov(portfolio_df['return'].dropna(), benchmark_df['return'].dropna())[0, 1]
-        benchmark_volatility = benchmark_df['return'].std()
-        beta = covariance / benchmark_volatility**2
-        alpha = portfolio_df['return'].mean() - beta * benchmark_df['return'].mean()
+        # Aligner l'indice sur les dates du portefeuille (dernier prix connu à chaque date)
+        benchmark_values = benchmark_df.assign(date=pd.to_datetime(benchmark_df['date'])).set_index('date')['benchmark_value'].sort_index()
+        benchmark_values = benchmark_values.reindex(benchmark_values.index.union(portfolio_df.index)).ffill().reindex(portfolio_df.index)
         
-        print(f"Alpha: {alpha:.2%}")
-        print(f"Beta: {beta:.2f}")
-    
-    # Maximum Drawdown
-    running_max = portfolio_df['portfolio_value'].cummax()
-    drawdown = (portfolio_df['portfolio_value'] - running_max) / running_max
-    max_drawdown = drawdown.min()
-    print(f"Maximum Drawdown: {max_drawdown:.2%}")
+        relative_metrics = compute_relative_metrics(
+            compute_returns(portfolio_df['portfolio_value'].to_numpy(dtype=float)),
+            compute_returns(benchmark_values.to_numpy(dtype=float))
+        )
+        metrics.update({name: float(values[0]) for name, values in relative_metrics.items()})
+        
+        print(f"Alpha: {metrics['alpha']:.2%}")
+        print(f"Beta: {metrics['beta']:.2f}")
+        print(f"Tracking Error: {metrics['tracking_error']:.2%}")
     
-    # Sortino Ratio
-    downside_returns = portfolio_df['return'][portfolio_df['return'] < 0]
-    sortino_ratio = portfolio_df['return'].mean() / downside_returns.std() * (52 ** 0.5)
-    print(f"Sortino Ratio: {sortino_ratio:.2f}")
+    # Enregistrement des graphiques dans des fichiers
+    if output_dir is not None:
+        render_portfolio_charts(portfolio_df, output_dir)
     
-    # Tracking Error
-    if benchmark_df is not None:
-        tracking_error = np.std(portfolio_df['return'] - benchmark_df['return'])
-        print(f"Tracking Error: {tracking_error:.2%}")
-    
-    # Tracé de la valeur du portefeuille
-    plt.figure(figsize=(10, 5))
-    plt.plot(portfolio_df.index, portfolio_df['portfolio_value'], label='Valeur du portefeuille', color='b')
-    plt.xlabel('Date')
-    plt.ylabel('Valeur du portefeuille (€)')
-    plt.title('Évolution de la valeur du portefeuille')
-    plt.xlim(portfolio_df.index.min(), portfolio_df.index.max()) # Définir les limites de l'axe des x en fonction des dates présentes dans le DataFrame
-    plt.legend()
-    plt.grid()
-    plt.show()
+    if show:
+        # Tracé de la valeur du portefeuille
+        fig, ax = plt.subplots(figsize=(10, 5))
+        draw_portfolio_value(ax, portfolio_df)
+        plt.show()
 
-    # Calculer la moyenne des valeurs des produits (tickers) sur toute la période du portefeuille
-    average_data = portfolio_df.drop(['cash', 'portfolio_value'], axis=1).mean()
+        # Affichage du diagramme en secteurs pour la répartition moyenne
+        fig, ax = plt.subplots(figsize=(8, 8))
+        draw_average_allocation(ax, portfolio_df)
+        plt.show()
+    
+    return metrics
+    
 
-    # Clip pour s'assurer qu'aucune valeur négative n'est présente
-    average_data = average_data.clip(lower=0)
+class SnapshotCollector:
+    """
+    Collecteur colonnaire des instantanés hebdomadaires d'une simulation.
+    
+    Les valeurs sont accumulées colonne par colonne puis assemblées en un seul bloc
+    lors de la construction du DataFrame final.
+    """
+    
+    def __init__(self):
+        self.dates: List[datetime] = []
+        self.cash: List[float] = []
+        self.portfolio_value: List[float] = []
+        self.values: Dict[str, List[float]] = {}
+    
+    def add(self, snapshot: WeeklySnapshot) -> None:
+        """
+        Ajoute un instantané au collecteur.
+        
+        Args:
+            snapshot: Instantané hebdomadaire de la simulation
+        """
+        nb_rows = len(self.dates)
+        
+        for ticker, value in snapshot.values.items():
+            column = self.values.get(ticker)
+            if column is None:
+                # Un ticker rencontré tardivement n'a pas de valeur pour les semaines précédentes
+                column = self.values[ticker] = [np.nan] * nb_rows
+            column.append(value)
+        
+        for ticker, column in self.values.items():
+            if len(column) == nb_rows:
+                column.append(np.nan)
+        
+        self.dates.append(snapshot.date)
+        self.cash.append(snapshot.cash)
+        self.portfolio_value.append(snapshot.portfolio_value)
+    
+    def collect(self, snapshots: Iterable[WeeklySnapshot]) -> 'SnapshotCollector':
+        """
+        Consomme une séquence d'instantanés.
+        
+        Args:
+            snapshots: Instantanés à collecter (par exemple Simulation.iter_weeks())
+            
+        Returns:
+            SnapshotCollector: Le collecteur lui-même
+        """
+        for snapshot in snapshots:
+            self.add(snapshot)
+        return self
+    
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Construit le DataFrame des performances en une seule allocation.
+        
+        Returns:
+            pd.DataFrame: Index 'date', colonnes cash, portfolio_value et une colonne par produit
+        """
+        columns = ['cash', 'portfolio_value'] + list(self.values)
+        data = np.empty((len(self.dates), len(columns)))
+        data[:, 0] = self.cash
+        data[:, 1] = self.portfolio_value
+        for i, column in enumerate(self.values.values(), start=2):
+            data[:, i] = column
+        
+        return pd.DataFrame(data, index=pd.Index(self.dates, name='date'), columns=columns)
 
-    # Calculer la répartition en pourcentage pour chaque produit
-    total_value = portfolio_df['portfolio_value'].mean()  # Total moyen du portefeuille sur la période
-    product_percentage = average_data / total_value * 100
 
-    # Affichage du diagramme en secteurs pour la répartition moyenne
-    plt.figure(figsize=(8, 8))
-    plt.pie(product_percentage, labels=product_percentage.index, autopct='%1.1f%%', startangle=90, colors=plt.cm.Paired.colors)
-    plt.title("Répartition moyenne du portefeuille")
-    plt.axis('equal')  # Assurer un cercle parfait
-    plt.show()
+def write_snapshots_csv(snapshots: Iterable[WeeklySnapshot], path: str, tickers: List[str]) -> int:
+    """
+    Écrit les instantanés hebdomadaires dans un fichier CSV au fur et à mesure de la simulation.
     
+    Args:
+        snapshots: Instantanés à écrire (par exemple Simulation.iter_weeks())
+        path: Chemin du fichier CSV
+        tickers: Tickers du portefeuille (colonnes du fichier)
+        
+    Returns:
+        int: Nombre de semaines écrites
+    """
+    nb_weeks = 0
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['date', 'cash', 'portfolio_value'] + tickers)
+        for snapshot in snapshots:
+            writer.writerow([snapshot.date.strftime('%Y-%m-%d'), snapshot.cash, snapshot.portfolio_value]
+                            + [snapshot.values.get(ticker, '') for ticker in tickers])
+            nb_weeks += 1
+    return nb_weeks
+
 
-def get_portfolio_performance_df(portfolio_id: int, strategy: str, start_date: str, end_date: datetime = None) -> pd.DataFrame:
+def get_portfolio_performance_df(portfolio_id: int, strategy: str, start_date: str, end_date: datetime = None,
+                                 repository: Optional[Repository] = None) -> pd.DataFrame:
     """
     Génère un DataFrame contenant l'historique des positions et valeurs du portefeuille.
     
@@ -98,151 +177,295 @@ def get_portfolio_performance_df(portfolio_id: int, strategy: str, start_date: s
         strategy (str): Stratégie utilisée pour le portefeuille
         start_date (str): Date de début de l'analyse (format: 'YYYY-MM-DD')
         end_date (datetime, optional): Date de fin de l'analyse. Par défaut: 31/12/2024
+        repository (Repository, optional): Dépôt partagé (et sa connexion). Par défaut: nouvelle connexion
     
     Returns:
         pd.DataFrame: DataFrame contenant l'historique des positions avec:
             - Index: dates
             - Colonnes: cash, portfolio_value, et une colonne par produit (ticker)
     """
-    if end_date is None:
-        end_date = datetime(2024, 12, 31)
-    
     # Créer une instance de Simulation
-    db = BaseModel.get_db_connection()
-    simulation = Simulation(db, portfolio_id, strategy, start_date)
+    db = BaseModel.get_db_connection() if repository is None else repository.db
+    simulation = Simulation(db, portfolio_id, strategy, start_date, repository=repository)
     
-    # DataFrame pour stocker les performances du portefeuille
-    portfolio_performance_df = pd.DataFrame(columns=["date", "cash", "portfolio_value"])
+    # Simuler la gestion active du portefeuille
+    collector = SnapshotCollector().collect(simulation.iter_weeks(start_date, end_date))
     
-    # Variable pour stocker les tickers (produits uniques) rencontrés
-    all_tickers = set()
+    return collector.to_dataframe()
 
-    # Simuler la gestion active du portefeuille
-    current_date = datetime.strptime(start_date, '%Y-%m-%d')
+
+def get_fund_performance_dfs(db: sqlite3.Connection, start_date: str, end_date: datetime = None,
+                             snapshot: bool = True) -> Dict[int, pd.DataFrame]:
+    """
+    Simule tous les portefeuilles du fonds et retourne leurs DataFrames de performance.
     
-    while current_date <= end_date:
-        # Trouver le prochain lundi
-        while current_date.weekday() != 0:  # 0 = lundi
-            current_date += timedelta(days=1)
-        
-        # Exécuter la stratégie pour ce lundi
-        positions, cash = simulation.execute_strategy(current_date)
-        
-        # Ajouter les tickers rencontrés à la liste
-        for position in positions:
-            all_tickers.add(position['ticker'])
-        
-        # Créer une ligne pour stocker la valeur de chaque produit et la valeur totale du portefeuille
-        row = {
-            'date': current_date,
-            'cash': cash['value'],
-            'portfolio_value': sum(p['value'] for p in positions) + cash['value']
-        }
-        
-        # Ajouter les valeurs des produits (tickers) dynamiquement dans le DataFrame
-        for ticker in all_tickers:
-            ticker_value = sum(p['value'] for p in positions if p['ticker'] == ticker)
-            row[ticker] = ticker_value
+    Les simulations sont exécutées sur un instantané de la base (voir BaseModel.snapshot_connection),
+    ou, sans instantané, sur la base elle-même, chaque portefeuille étant réinitialisé après sa simulation.
+    Les portefeuilles et leurs produits sont chargés ensemble par un dépôt partagé entre les simulations.
+    
+    Args:
+        db: Connexion à la base de données
+        start_date: Date de début de l'analyse
+        end_date: Date de fin de l'analyse (optionnel)
+        snapshot: Simule sur un instantané en mémoire plutôt que sur la base
+    
+    Returns:
+        Dict[int, pd.DataFrame]: DataFrames de performance par ID de portefeuille
+    """
+    simulation_db = BaseModel.snapshot_connection(db) if snapshot else db
+    
+    try:
+        cursor = simulation_db.cursor()
+        cursor.execute("SELECT id FROM Portfolios")
         
-        # Ajouter la ligne au DataFrame
-        new_row = pd.DataFrame([row])
-        portfolio_performance_df = pd.concat([portfolio_performance_df, new_row], ignore_index=True)
+        repository = Repository(simulation_db)
+        portfolios = repository.get_many(Portfolio, [row[0] for row in cursor.fetchall()])
+        repository.products_of(portfolios)
         
-        # Passer à la semaine suivante
-        current_date += timedelta(days=7)
+        performance_dfs = {}
+        for portfolio_id, portfolio in portfolios.items():
+            try:
+                performance_dfs[portfolio_id] = get_portfolio_performance_df(portfolio_id, portfolio.strategy, start_date,
+                                                                             end_date, repository)
+            except Exception as e:
+                print(f"⚠️ Erreur lors de la simulation du portefeuille {portfolio_id}: {str(e)}")
+            finally:
+                if not snapshot:
+                    BaseModel.reinitialize_portfolio(db, portfolio_id)
+                    repository.invalidate(Portfolio, [portfolio_id])
+    finally:
+        if snapshot:
+            simulation_db.close()
+    
+    return performance_dfs
+
+
+def get_fund_relative_performance(db: sqlite3.Connection, performance_dfs: Dict[int, pd.DataFrame]) -> pd.DataFrame:
+    """
+    Calcule les statistiques absolues et relatives (alpha, beta, tracking error) de tous les portefeuilles.
+    
+    Chaque portefeuille est comparé à l'indice de référence de son secteur d'investissement. Les
+    indices sont alignés une seule fois sur le calendrier commun des portefeuilles, puis toutes les
+    statistiques sont calculées en une passe vectorisée.
+    
+    Args:
+        db: Connexion à la base de données
+        performance_dfs: DataFrames de performance par ID de portefeuille
+    
+    Returns:
+        pd.DataFrame: Une ligne par portefeuille avec son indice de référence et ses statistiques
+    """
+    dates, portfolio_ids, nav = build_nav_matrix(performance_dfs)
+    
+    cursor = db.cursor()
+    cursor.execute("SELECT id, investment_sector FROM Portfolios")
+    sectors = dict(cursor.fetchall())
+    benchmark_names = [SECTOR_BENCHMARKS.get(sectors.get(portfolio_id)) for portfolio_id in portfolio_ids]
+    
+    # Prix des indices alignés sur les dates, une colonne par portefeuille (NaN sans indice)
+    unique_names = sorted({name for name in benchmark_names if name})
+    benchmark_prices = Benchmark.get_aligned_prices(db, unique_names, dates)
+    benchmark_nav = benchmark_prices.reindex(columns=benchmark_names).to_numpy(dtype=float)
+    
+    metrics = compute_performance_metrics(nav)
+    metrics.update(compute_relative_metrics(compute_returns(nav), compute_returns(benchmark_nav)))
+    
+    relative_performance = metrics_to_dataframe(metrics, portfolio_ids)
+    relative_performance.insert(0, 'benchmark', benchmark_names)
+    return relative_performance
+
+
+def get_portfolio_inputs_version(db: sqlite3.Connection, portfolio_id: int, start_date: str, end_date: datetime,
+                                 repository: Optional[Repository] = None) -> str:
+    """
+    Calcule la version des entrées de simulation d'un portefeuille.
+    
+    La version change dès qu'une donnée utilisée par la simulation est modifiée : stratégie,
+    montant investi, produits du portefeuille, historique de prix (y compris un prix corrigé),
+    période d'analyse, paramètres et allocateur de la stratégie ou version de sa logique
+    (STRATEGY_VERSION).
+    
+    Args:
+        db: Connexion à la base de données
+        portfolio_id: ID du portefeuille
+        start_date: Date de début de l'analyse (format: 'YYYY-MM-DD')
+        end_date: Date de fin de l'analyse
+        repository: (facultatif) Dépôt où lire le portefeuille, son client et ses produits
+    
+    Returns:
+        str: Empreinte SHA-1 des entrées du portefeuille
+    """
+    cursor = db.cursor()
+    repository = Repository(db) if repository is None else repository
+    
+    portfolio = repository.get(Portfolio, portfolio_id)
+    client = repository.get(Client, portfolio.client_id) if portfolio else None
+    portfolio_inputs = []
+    if client is not None:
+        portfolio_inputs = [portfolio.strategy, portfolio.size, portfolio.manager_id, client.investment_amount,
+                            to_day(client.registration_date)]
+    inputs = [portfolio_inputs, start_date, end_date.strftime('%Y-%m-%d')]
     
-    # Définir la date comme index
-    portfolio_performance_df.set_index('date', inplace=True)
+    # Logique de la stratégie : version, paramètres effectifs (ceux des simulations de classement) et allocateur
+    allocator = DEFAULT_PARAMS['allocator'] or (STRATEGY_ALLOCATORS.get(portfolio.strategy) if portfolio else None)
+    inputs.append([STRATEGY_VERSION, sorted(DEFAULT_PARAMS.items()), allocator])
     
-    return portfolio_performance_df
+    # L'historique de prix est résumé par son nombre de lignes, sa dernière date et la somme de ses
+    # prix et rendements (un prix historique corrigé change l'empreinte)
+    for product in repository.products_of([portfolio_id]).get(portfolio_id, []):
+        cursor.execute(f"SELECT COUNT(*), MAX(date), TOTAL(price), TOTAL(returns) FROM Returns_{product.ticker}")
+        inputs.append([product.id, product.ticker, *cursor.fetchone()])
+    
+    return hashlib.sha1(json.dumps(inputs, default=str).encode()).hexdigest()
 
 
-def get_portfolio_rankings(db: sqlite3.Connection, start_date: str, end_date: datetime = None) -> tuple[pd.DataFrame, pd.DataFrame]:
+def get_portfolio_rankings(db: sqlite3.Connection, start_date: str, end_date: datetime = None,
+                           snapshot: bool = True) -> tuple[pd.DataFrame, pd.DataFrame]:
     """
     Calcule les classements des portefeuilles et des managers par performance.
     
+    Les résultats sont conservés dans les tables Portfolio_Rankings et Manager_Rankings, avec la
+    version des entrées de chaque portefeuille. Seuls les portefeuilles nouveaux ou dont les
+    entrées ont changé sont re-simulés, sur un instantané de la base (voir
+    BaseModel.snapshot_connection) ou, sans instantané, sur la base elle-même puis réinitialisés.
+    Les classements sont écrits dans la base, un portefeuille à la fois.
+    
     Args:
         db: Connexion à la base de données
         start_date: Date de début de l'analyse
         end_date: Date de fin de l'analyse (optionnel)
+        snapshot: Simule sur un instantané en mémoire plutôt que sur la base
     
     Returns:
         tuple[pd.DataFrame, pd.DataFrame]: 
             - DataFrame des classements des portefeuilles
             - DataFrame des classements des managers
     """
+    if end_date is None:
+        end_date = datetime(2024, 12, 31)
+    
     cursor = db.cursor()
+    simulation_db = BaseModel.snapshot_connection(db) if snapshot else db
     
-    # Récupérer tous les portefeuilles avec leurs informations
-    cursor.execute("""
-        SELECT p.id, p.strategy, c.name as client_name, m.name as manager_name,
-               c.investment_amount as initial_value
-        FROM Portfolios p
-        JOIN Clients c ON p.client_id = c.id
-        JOIN Managers m ON p.manager_id = m.id
-    """)
-    portfolios = cursor.fetchall()
+    try:
+        # Récupérer tous les portefeuilles avec leurs informations
+        cursor.execute("""
+            SELECT p.id, p.strategy, c.name as client_name, m.id as manager_id, m.name as manager_name,
+                   c.investment_amount as initial_value
+            FROM Portfolios p
+            JOIN Clients c ON p.client_id = c.id
+            JOIN Managers m ON p.manager_id = m.id
+        """)
+        portfolios = cursor.fetchall()
+    
+        # Portefeuilles, clients et produits chargés ensemble, partagés entre versions et simulations
+        repository = Repository(simulation_db)
+        loaded_portfolios = repository.get_many(Portfolio, [portfolio[0] for portfolio in portfolios])
+        repository.get_many(Client, [portfolio.client_id for portfolio in loaded_portfolios.values()])
+        repository.products_of(loaded_portfolios)
+    
+        # Récupérer les versions déjà classées
+        cursor.execute("SELECT portfolio_id, inputs_version, manager_id FROM Portfolio_Rankings")
+        cached_rows = cursor.fetchall()
+        cached_versions = {row[0]: row[1] for row in cached_rows}
     
-    # Créer les DataFrames pour stocker les performances
-    portfolio_performances = []
-    manager_performances = {}
+        # Supprimer les classements des portefeuilles qui n'existent plus
+        portfolio_ids = {portfolio[0] for portfolio in portfolios}
+        updated_managers = set()
+        for portfolio_id, _, manager_id in cached_rows:
+            if portfolio_id not in portfolio_ids:
+                cursor.execute("DELETE FROM Portfolio_Rankings WHERE portfolio_id = ?", (portfolio_id,))
+                updated_managers.add(manager_id)
+        db.commit()
     
-    # Calculer la performance pour chaque portefeuille
-    for portfolio in portfolios:
-        portfolio_id, strategy, client_name, manager_name, initial_value = portfolio
+        nb_cached = 0
+    
+        # Calculer la performance des seuls portefeuilles nouveaux ou modifiés
+        for portfolio in portfolios:
+            portfolio_id, strategy, client_name, manager_id, manager_name, initial_value = portfolio
         
-        try:
-            # Obtenir le DataFrame des performances
-            performance_df = get_portfolio_performance_df(
-                portfolio_id=portfolio_id,
-                strategy=strategy,
-                start_date=start_date,
-                end_date=end_date
-            )
-            
-            # Calculer la performance
-            final_value = performance_df['portfolio_value'].iloc[-1]
-            performance = (final_value - initial_value) / initial_value * 100
-            
-            # Ajouter au classement des portefeuilles
-            portfolio_performances.append({
-                'Portfolio ID': portfolio_id,
-                'Client': client_name,
-                'Manager': manager_name,
-                'Strategy': strategy,
-                'Initial Value': initial_value,
-                'Final Value': final_value,
-                'Performance (%)': performance
-            })
+            inputs_version = get_portfolio_inputs_version(simulation_db, portfolio_id, start_date, end_date, repository)
+            if cached_versions.get(portfolio_id) == inputs_version:
+                nb_cached += 1
+                continue
+        
+            try:
+                # Obtenir le DataFrame des performances
+                performance_df = get_portfolio_performance_df(
+                    portfolio_id=portfolio_id,
+                    strategy=strategy,
+                    start_date=start_date,
+                    end_date=end_date,
+                    repository=repository
+                )
             
-            # Ajouter au classement des managers
-            if manager_name not in manager_performances:
-                manager_performances[manager_name] = {
-                    'Manager': manager_name,
-                    'Number of Portfolios': 0,
-                    'Average Performance (%)': 0,
-                    'Total AUM': 0
-                }
+                # Calculer la performance
+                final_value = performance_df['portfolio_value'].iloc[-1]
+                performance = (final_value - initial_value) / initial_value * 100
             
-            manager_performances[manager_name]['Number of Portfolios'] += 1
-            manager_performances[manager_name]['Average Performance (%)'] += performance
-            manager_performances[manager_name]['Total AUM'] += final_value
+                # Mettre à jour le classement du portefeuille
+                cursor.execute("""
+                    INSERT OR REPLACE INTO Portfolio_Rankings (portfolio_id, inputs_version, manager_id, client_name,
+                                                               manager_name, strategy, initial_value, final_value, performance)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (portfolio_id, inputs_version, manager_id, client_name, manager_name, strategy,
+                      initial_value, float(final_value), float(performance)))
             
-        except Exception as e:
-            print(f"⚠️ Erreur lors du calcul de la performance du portefeuille {portfolio_id}: {str(e)}")
-            continue
+            except Exception as e:
+                print(f"⚠️ Erreur lors du calcul de la performance du portefeuille {portfolio_id}: {str(e)}")
+                cursor.execute("DELETE FROM Portfolio_Rankings WHERE portfolio_id = ?", (portfolio_id,))
+                continue
+            finally:
+                if snapshot:
+                    # Classement validé aussitôt : la base n'est pas verrouillée pendant les simulations
+                    db.commit()
+                else:
+                    # La simulation modifie les positions : remettre le portefeuille à son état initial
+                    BaseModel.reinitialize_portfolio(db, portfolio_id)
+                    repository.invalidate(Portfolio, [portfolio_id])
+                updated_managers.add(manager_id)
+    finally:
+        if snapshot:
+            simulation_db.close()
     
-    # Créer le DataFrame des classements des portefeuilles
-    portfolio_rankings = pd.DataFrame(portfolio_performances)
-    portfolio_rankings = portfolio_rankings.sort_values('Performance (%)', ascending=False)
+    print(f"♻️ {nb_cached} portefeuille(s) repris du cache, {len(portfolios) - nb_cached} recalculé(s).")
+    
+    # Mettre à jour le classement des managers concernés (ou absents de la table)
+    cursor.execute("""
+        SELECT DISTINCT pr.manager_id
+        FROM Portfolio_Rankings pr
+        LEFT JOIN Manager_Rankings mr ON pr.manager_id = mr.manager_id
+        WHERE mr.manager_id IS NULL
+    """)
+    updated_managers.update(row[0] for row in cursor.fetchall())
+    
+    for manager_id in updated_managers:
+        cursor.execute("DELETE FROM Manager_Rankings WHERE manager_id = ?", (manager_id,))
+        cursor.execute("""
+            INSERT INTO Manager_Rankings (manager_id, manager_name, nb_portfolios, average_performance, total_aum)
+            SELECT manager_id, manager_name, COUNT(*), AVG(performance), SUM(final_value)
+            FROM Portfolio_Rankings
+            WHERE manager_id = ?
+            GROUP BY manager_id, manager_name
+        """, (manager_id,))
     
-    # Calculer les moyennes pour les managers
-    for manager in manager_performances.values():
-        manager['Average Performance (%)'] /= manager['Number of Portfolios']
+    db.commit()
+    
+    # Créer le DataFrame des classements des portefeuilles
+    portfolio_rankings = pd.read_sql_query("""
+        SELECT portfolio_id AS "Portfolio ID", client_name AS "Client", manager_name AS "Manager",
+               strategy AS "Strategy", initial_value AS "Initial Value", final_value AS "Final Value",
+               performance AS "Performance (%)"
+        FROM Portfolio_Rankings
+        ORDER BY performance DESC
+    """, db)
     
     # Créer le DataFrame des classements des managers
-    manager_rankings = pd.DataFrame(list(manager_performances.values()))
-    manager_rankings = manager_rankings.sort_values('Average Performance (%)', ascending=False)
+    manager_rankings = pd.read_sql_query("""
+        SELECT manager_name AS "Manager", nb_portfolios AS "Number of Portfolios",
+               average_performance AS "Average Performance (%)", total_aum AS "Total AUM"
+        FROM Manager_Rankings
+        ORDER BY average_performance DESC
+    """, db)
     
     return portfolio_rankings, manager_rankings
-    
@@ -0,0 +1,234 @@
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+
+# Colonnes d'un deal (le sens BUY/SELL se déduit du signe de la quantité)
+DEAL_DTYPE = np.dtype([
+    ('portfolio_id', np.int64),
+    ('product_id', np.int64),
+    ('date', np.int32),         # Numéro de jour (voir base_builder.to_day)
+    ('quantity', np.int64),
+    ('price', np.float64),
+])
+
+
+class PositionBook:
+    """
+    Positions d'un portefeuille en colonnes (un tableau NumPy par champ) et son cash.
+
+    Le carnet est alloué une fois par simulation puis mis à jour sur place chaque semaine :
+    les prix, valeurs, quantités et poids ne sont plus des dictionnaires reconstruits par position.
+    """
+
+    __slots__ = ('tickers', 'product_ids', 'quantities', 'weights', 'prices', 'values', 'cash', 'rows')
+
+    def __init__(self, tickers: Sequence[str], product_ids: Sequence[int], cash: float = 0.0):
+        """
+        Initialise un carnet de positions vides.
+
+        Args:
+            tickers: Ticker de chaque position
+            product_ids: ID du produit de chaque position
+            cash: Cash du portefeuille
+        """
+        size = len(tickers)
+        self.tickers = list(tickers)
+        self.product_ids = np.asarray(product_ids, dtype=np.int64)
+        self.quantities = np.zeros(size, dtype=np.int64)
+        self.weights = np.zeros(size)
+        self.prices = np.zeros(size)
+        self.values = np.zeros(size)
+        self.cash = cash
+        self.rows = None  # Lignes du carnet d'origine (voir select)
+
+    def __len__(self) -> int:
+        return len(self.tickers)
+
+    def revalue(self) -> None:
+        """Recalcule la valeur de chaque position à partir de sa quantité et de son prix."""
+        np.multiply(self.quantities, self.prices, out=self.values)
+
+    def total_value(self) -> float:
+        """
+        Valeur totale du portefeuille (positions + cash).
+
+        Returns:
+            float: Somme des valeurs, dans l'ordre des positions, et du cash
+        """
+        return sum(self.values.tolist()) + self.cash
+
+    def market_weights(self) -> np.ndarray:
+        """
+        Poids de chaque position aux prix du jour (les poids enregistrés ne suivent pas les prix).
+
+        Returns:
+            np.ndarray: Valeur de chaque position rapportée à la valeur totale (zéros si elle est nulle)
+        """
+        total = self.total_value()
+        if not total:
+            return np.zeros(len(self))
+        return self.values / total
+
+    def values_by_ticker(self) -> Dict[str, float]:
+        """
+        Valeur de chaque produit.
+
+        Returns:
+            Dict[str, float]: Valeur cumulée des positions de chaque ticker
+        """
+        values = {}
+        for ticker, value in zip(self.tickers, self.values.tolist()):
+            values[ticker] = values.get(ticker, 0) + value
+        return values
+
+    def select(self, mask: np.ndarray) -> 'PositionBook':
+        """
+        Restreint le carnet aux positions sélectionnées (ex: produits dont un prix est connu).
+
+        Args:
+            mask: Positions à conserver
+
+        Returns:
+            PositionBook: Le carnet lui-même si toutes les positions sont conservées, sinon une copie
+            restreinte dont rows donne les lignes d'origine (voir merge)
+        """
+        if mask.all():
+            return self
+        rows = np.flatnonzero(mask)
+        book = PositionBook([self.tickers[row] for row in rows], self.product_ids[rows], self.cash)
+        for name in ('quantities', 'weights', 'prices', 'values'):
+            getattr(book, name)[:] = getattr(self, name)[rows]
+        book.rows = rows
+        return book
+
+    def merge(self, book: 'PositionBook') -> None:
+        """
+        Reporte dans le carnet les positions et le cash d'un carnet restreint (voir select).
+
+        Args:
+            book: Carnet issu de select (ou le carnet lui-même)
+        """
+        if book is self:
+            return
+        for name in ('quantities', 'weights', 'prices', 'values'):
+            getattr(self, name)[book.rows] = getattr(book, name)
+        self.cash = book.cash
+
+
+class DealBuffer:
+    """
+    Tampon de deals en tableau structuré (DEAL_DTYPE), réutilisé d'une semaine à l'autre.
+
+    La capacité double lorsqu'elle est atteinte : une fois dimensionné, l'ajout d'un deal n'alloue rien.
+    """
+
+    __slots__ = ('records', 'size')
+
+    def __init__(self, capacity: int = 16):
+        """
+        Initialise un tampon vide.
+
+        Args:
+            capacity: Nombre de deals alloués initialement
+        """
+        self.records = np.zeros(max(capacity, 1), dtype=DEAL_DTYPE)
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _reserve(self, size: int) -> None:
+        """Agrandit le tableau pour contenir au moins size deals."""
+        if size > len(self.records):
+            records = np.zeros(max(size, 2 * len(self.records)), dtype=DEAL_DTYPE)
+            records[:self.size] = self.records[:self.size]
+            self.records = records
+
+    def append(self, product_id: int, quantity: int, price: float, date: int = 0, portfolio_id: int = 0) -> None:
+        """
+        Ajoute un deal.
+
+        Args:
+            product_id: ID du produit
+            quantity: Quantité (positive pour un achat, négative pour une vente)
+            price: Prix d'exécution
+            date: Numéro de jour d'exécution (voir stamp)
+            portfolio_id: ID du portefeuille (voir stamp)
+        """
+        self._reserve(self.size + 1)
+        self.records[self.size] = (portfolio_id, product_id, date, quantity, price)
+        self.size += 1
+
+    def extend(self, deals: 'DealBuffer') -> None:
+        """
+        Ajoute les deals d'un autre tampon.
+
+        Args:
+            deals: Deals à ajouter
+        """
+        self._reserve(self.size + len(deals))
+        self.records[self.size:self.size + len(deals)] = deals.view()
+        self.size += len(deals)
+
+    def stamp(self, portfolio_id: int, date: int) -> None:
+        """
+        Affecte le portefeuille et la date d'exécution à tous les deals du tampon.
+
+        Args:
+            portfolio_id: ID du portefeuille
+            date: Numéro de jour d'exécution
+        """
+        deals = self.view()
+        deals['portfolio_id'] = portfolio_id
+        deals['date'] = date
+
+    def clear(self) -> None:
+        """Vide le tampon sans libérer sa mémoire."""
+        self.size = 0
+
+    def view(self) -> np.ndarray:
+        """
+        Retourne les deals du tampon.
+
+        Returns:
+            np.ndarray: Vue (sans copie) des deals, au format DEAL_DTYPE
+        """
+        return self.records[:self.size]
+
+    def actions(self) -> np.ndarray:
+        """
+        Retourne le sens de chaque deal.
+
+        Returns:
+            np.ndarray: 'BUY' pour une quantité positive, 'SELL' sinon
+        """
+        return np.where(self.view()['quantity'] > 0, 'BUY', 'SELL')
+
+    def rows(self) -> List[Tuple[int, int, int, str, int, float]]:
+        """
+        Retourne les deals au format des colonnes de la table Deals.
+
+        Returns:
+            List[Tuple]: (portfolio_id, product_id, date, action, quantity, price) de chaque deal
+        """
+        deals = self.view()
+        return list(zip(deals['portfolio_id'].tolist(), deals['product_id'].tolist(), deals['date'].tolist(),
+                        self.actions().tolist(), deals['quantity'].tolist(), deals['price'].tolist()))
+
+    @classmethod
+    def from_deals(cls, deals: Iterable[Any]) -> 'DealBuffer':
+        """
+        Construit un tampon à partir d'objets deals (attributs portfolio_id, product_id, date, quantity, price).
+
+        Args:
+            deals: Deals à copier (ex: objets Deal)
+
+        Returns:
+            DealBuffer: Tampon contenant les deals
+        """
+        deals = list(deals)
+        buffer = cls(len(deals))
+        for deal in deals:
+            buffer.append(deal.product_id, deal.quantity, deal.price, deal.date, deal.portfolio_id)
+        return buffer
@@ -0,0 +1,214 @@
+import json
+import os
+import sqlite3
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from base_builder import BaseModel, get_db_path
+from backtest import PriceHistory, load_price_history
+
+
+# Colonnes de l'instantané, un fichier .npy chacune
+SNAPSHOT_COLUMNS = ('dates', 'prices', 'returns')
+SNAPSHOT_INDEX = 'index.json'
+
+
+def default_snapshot_path() -> str:
+    """
+    Retourne le dossier de l'instantané des prix, à côté de la base de données.
+
+    Returns:
+        str: Chemin du dossier price_snapshot
+    """
+    return os.path.join(os.path.dirname(get_db_path()), 'price_snapshot')
+
+
+class PriceSnapshot:
+    """
+    Instantané en colonnes des prix et rendements de tous les produits.
+
+    Les séries de tous les produits sont concaténées dans trois tableaux .npy (dates, prix,
+    rendements), ouverts en mémoire partagée (mmap) : l'ouverture est quasi instantanée, les pages
+    ne sont lues qu'à l'usage et le cache du système est partagé entre processus. La série d'un
+    produit est une vue sans copie, délimitée par les offsets de l'index.
+    """
+
+    def __init__(self, path: str, data_version: int, tickers: List[str], offsets: np.ndarray,
+                 dates: np.ndarray, prices: np.ndarray, returns: np.ndarray):
+        """
+        Initialise l'instantané.
+
+        Args:
+            path: Dossier de l'instantané
+            data_version: Version des prix de la base au moment de l'export
+            tickers: Tickers des produits, dans l'ordre des séries
+            offsets: Début de la série de chaque produit (len(tickers) + 1 valeurs)
+            dates: Numéros de jour concaténés (voir base_builder.to_day)
+            prices: Prix concaténés
+            returns: Rendements concaténés (NaN pour la première date de chaque produit)
+        """
+        self.path = path
+        self.data_version = data_version
+        self.tickers = tickers
+        self.offsets = offsets
+        self.dates = dates
+        self.prices = prices
+        self.returns = returns
+        self.positions = {ticker: i for i, ticker in enumerate(tickers)}
+
+    def series(self, ticker: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Retourne les dates, prix et rendements d'un produit (vues sans copie).
+
+        Args:
+            ticker: Ticker du produit
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: Dates, prix et rendements
+        """
+        if ticker not in self.positions:
+            raise KeyError(f"Produit {ticker} absent de l'instantané")
+        i = self.positions[ticker]
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.dates[start:end], self.prices[start:end], self.returns[start:end]
+
+    def history(self, tickers: List[str]) -> PriceHistory:
+        """
+        Construit l'historique de prix de plusieurs produits, au format de load_price_history.
+
+        Args:
+            tickers: Tickers des produits
+
+        Returns:
+            PriceHistory: Dates, prix et rendements par ticker (vues sans copie)
+        """
+        dates, prices, returns = {}, {}, {}
+        for ticker in dict.fromkeys(tickers):
+            dates[ticker], prices[ticker], returns[ticker] = self.series(ticker)
+        return PriceHistory(dates, prices, returns)
+
+
+def export_price_snapshot(db: sqlite3.Connection, path: Optional[str] = None) -> PriceSnapshot:
+    """
+    Exporte les prix et rendements de tous les produits dans un instantané.
+
+    Les tableaux sont écrits avant l'index, qui porte la version des prix : un export interrompu
+    laisse un instantané considéré comme périmé.
+
+    Args:
+        db: Connexion à la base de données
+        path: Dossier de l'instantané (par défaut: default_snapshot_path())
+
+    Returns:
+        PriceSnapshot: Instantané exporté, ouvert en mémoire partagée
+    """
+    if path is None:
+        path = default_snapshot_path()
+    os.makedirs(path, exist_ok=True)
+
+    start = time.perf_counter()
+    data_version = BaseModel.get_data_version(db)
+    tickers = [row[0] for row in db.execute("SELECT ticker FROM Products ORDER BY id").fetchall()]
+    history = load_price_history(db, tickers)
+    tickers = list(history.dates)
+
+    lengths = [len(history.dates[ticker]) for ticker in tickers]
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    columns = {
+        'dates': np.concatenate([history.dates[ticker] for ticker in tickers]).astype(np.int32)
+        if tickers else np.empty(0, dtype=np.int32),
+        'prices': np.concatenate([history.prices[ticker] for ticker in tickers]) if tickers else np.empty(0),
+        'returns': np.concatenate([history.returns[ticker] for ticker in tickers]) if tickers else np.empty(0),
+    }
+
+    # Invalider l'index existant avant de remplacer les colonnes
+    index_path = os.path.join(path, SNAPSHOT_INDEX)
+    if os.path.exists(index_path):
+        os.remove(index_path)
+    for name in SNAPSHOT_COLUMNS:
+        temporary_path = os.path.join(path, f"{name}.tmp.npy")
+        np.save(temporary_path, columns[name])
+        os.replace(temporary_path, os.path.join(path, f"{name}.npy"))
+
+    index = {'data_version': data_version, 'tickers': tickers, 'offsets': offsets.tolist()}
+    temporary_path = os.path.join(path, f"{SNAPSHOT_INDEX}.tmp")
+    with open(temporary_path, 'w') as f:
+        json.dump(index, f)
+    os.replace(temporary_path, index_path)
+
+    print(f"✅ Instantané des prix exporté : {len(tickers)} produits, {int(offsets[-1])} lignes "
+          f"en {time.perf_counter() - start:.2f} s ({path})")
+    return open_price_snapshot(path)
+
+
+def open_price_snapshot(path: Optional[str] = None, data_version: Optional[int] = None) -> Optional[PriceSnapshot]:
+    """
+    Ouvre un instantané des prix en mémoire partagée, sans lire la base.
+
+    Args:
+        path: Dossier de l'instantané (par défaut: default_snapshot_path())
+        data_version: (facultatif) Version attendue des prix ; un instantané d'une autre version est ignoré
+
+    Returns:
+        Optional[PriceSnapshot]: Instantané, ou None s'il est absent, incomplet ou périmé
+    """
+    if path is None:
+        path = default_snapshot_path()
+    index_path = os.path.join(path, SNAPSHOT_INDEX)
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path) as f:
+        index = json.load(f)
+    if data_version is not None and index['data_version'] != data_version:
+        return None
+
+    try:
+        columns = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in SNAPSHOT_COLUMNS}
+    except (OSError, ValueError):
+        return None
+    offsets = np.asarray(index['offsets'], dtype=np.int64)
+    if any(len(column) != offsets[-1] for column in columns.values()):
+        return None
+    return PriceSnapshot(path, index['data_version'], index['tickers'], offsets, **columns)
+
+
+def ensure_price_snapshot(db: sqlite3.Connection, path: Optional[str] = None) -> PriceSnapshot:
+    """
+    Ouvre l'instantané des prix s'il est à jour, sinon le (ré)exporte.
+
+    Args:
+        db: Connexion à la base de données
+        path: Dossier de l'instantané (par défaut: default_snapshot_path())
+
+    Returns:
+        PriceSnapshot: Instantané à jour
+    """
+    snapshot = open_price_snapshot(path, BaseModel.get_data_version(db))
+    if snapshot is not None:
+        return snapshot
+    return export_price_snapshot(db, path)
+
+
+def snapshot_price_history(path: str, tickers: List[str]) -> PriceHistory:
+    """
+    Construit l'historique de prix de plusieurs produits depuis un instantané (processus de calcul).
+
+    Args:
+        path: Dossier d'un instantané à jour (voir ensure_price_snapshot)
+        tickers: Tickers des produits
+
+    Returns:
+        PriceHistory: Dates, prix et rendements par ticker
+    """
+    snapshot = open_price_snapshot(path)
+    if snapshot is None:
+        raise FileNotFoundError(f"Instantané des prix absent ou incomplet : {path}")
+    return snapshot.history(tickers)
+
+
+if __name__ == "__main__":
+    db = BaseModel.get_db_connection()
+    export_price_snapshot(db)
+    db.close()
@@ -0,0 +1,133 @@
+import sqlite3
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Type
+
+from base_builder import AssetManager, Client, Portfolio, Product
+from instrumentation import instrumentation
+
+
+# Nombre maximal d'objets conservés par défaut dans la carte d'identité
+DEFAULT_MAX_ENTRIES = 10000
+
+# Modèles gérés par le dépôt (chacun fournit load_many(db, keys))
+MODELS = (Client, AssetManager, Portfolio, Product)
+
+
+class Repository:
+    """
+    Dépôt des entités du fonds avec carte d'identité (identity map) bornée.
+
+    Chaque entité (client, gestionnaire, portefeuille, produit) n'est chargée qu'une fois par dépôt :
+    les lectures suivantes de la même clé retournent le même objet, sans requête. Les clés manquantes
+    d'un get_many sont chargées ensemble, en une requête par table (load_many des modèles), ce qui
+    remplace les lectures une à une (motif N+1). Au-delà de max_entries objets, les moins récemment
+    utilisés sont oubliés.
+
+    Les écritures ne passent pas par le dépôt : après une modification de la base (ex:
+    reinitialize_portfolio), les objets concernés doivent être invalidés (voir invalidate).
+    """
+
+    def __init__(self, db: sqlite3.Connection, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        Initialise un dépôt vide.
+
+        Args:
+            db: Connexion à la base de données
+            max_entries: Nombre maximal d'objets conservés, tous modèles confondus
+        """
+        self.db = db
+        self.max_entries = max_entries
+        self.entries: 'OrderedDict[tuple, Any]' = OrderedDict()  # (modèle, clé) -> objet, du plus ancien au plus récent
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, model: Type, key: Hashable) -> Optional[Any]:
+        """
+        Retourne une entité par sa clé (ID, ou ticker pour Product).
+
+        Args:
+            model: Classe de l'entité (Client, AssetManager, Portfolio ou Product)
+            key: Clé de l'entité
+
+        Returns:
+            Optional[Any]: L'entité, ou None si elle n'existe pas
+        """
+        return self.get_many(model, [key]).get(key)
+
+    def get_many(self, model: Type, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        """
+        Retourne plusieurs entités, en chargeant celles qui ne sont pas en mémoire en une seule fois.
+
+        Args:
+            model: Classe des entités (Client, AssetManager, Portfolio ou Product)
+            keys: Clés des entités
+
+        Returns:
+            Dict[Hashable, Any]: Entités trouvées, par clé, dans l'ordre des clés demandées
+        """
+        if model not in MODELS:
+            raise ValueError(f"Modèle non géré par le dépôt : {model.__name__}")
+
+        keys = list(dict.fromkeys(keys))
+        found, missing = {}, []
+        for key in keys:
+            entry = self.entries.get((model, key))
+            if entry is None:
+                missing.append(key)
+            else:
+                self.entries.move_to_end((model, key))
+                found[key] = entry
+
+        self.hits += len(found)
+        self.misses += len(missing)
+        instrumentation.count('repository_hits', len(found))
+        instrumentation.count('repository_misses', len(missing))
+
+        if missing:
+            loaded = model.load_many(self.db, missing)
+            for key, entry in loaded.items():
+                self.entries[(model, key)] = entry
+            found.update(loaded)
+            self._evict()
+
+        return {key: found[key] for key in keys if key in found}
+
+    def products_of(self, portfolio_ids: Iterable[int]) -> Dict[int, List[Product]]:
+        """
+        Retourne les produits de plusieurs portefeuilles (deux chargements groupés au plus).
+
+        Args:
+            portfolio_ids: IDs des portefeuilles
+
+        Returns:
+            Dict[int, List[Product]]: Produits de chaque portefeuille trouvé, dans l'ordre de ses actifs
+        """
+        portfolios = self.get_many(Portfolio, portfolio_ids)
+        products = self.get_many(Product, [ticker for portfolio in portfolios.values() for ticker in portfolio.assets])
+        return {portfolio_id: [products[ticker] for ticker in portfolio.assets if ticker in products]
+                for portfolio_id, portfolio in portfolios.items()}
+
+    def invalidate(self, model: Type, keys: Optional[Iterable[Hashable]] = None) -> None:
+        """
+        Oublie des entités modifiées dans la base : elles seront relues au prochain accès.
+
+        Args:
+            model: Classe des entités
+            keys: Clés des entités (par défaut: toutes les entités du modèle)
+        """
+        if keys is None:
+            keys = [key for entry_model, key in self.entries if entry_model is model]
+        for key in keys:
+            self.entries.pop((model, key), None)
+
+    def clear(self) -> None:
+        """Vide la carte d'identité."""
+        self.entries.clear()
+
+    def _evict(self) -> None:
+        """Oublie les entités les moins récemment utilisées au-delà de max_entries."""
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
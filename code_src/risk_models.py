@@ -0,0 +1,232 @@
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+
+# Plancher relatif des variances spécifiques, pour les actifs expliqués entièrement par leurs facteurs
+SPECIFIC_VARIANCE_FLOOR = 1e-4
+
+
+def sector_factor_name(sector: str) -> str:
+    """
+    Nom du facteur d'un secteur de produit, au format des secteurs d'investissement.
+
+    Ex: 'Real Estate' -> 'ms_real_estate'
+
+    Args:
+        sector: Secteur du produit (colonne sector de Products)
+
+    Returns:
+        str: Nom du facteur sectoriel
+    """
+    return 'ms_' + sector.strip().lower().replace(' ', '_')
+
+
+class FactorRiskModel:
+    """
+    Modèle de risque à facteurs : un facteur de marché et un facteur par secteur ms_*.
+
+    Chaque actif a une exposition unitaire au marché et à son secteur : r_i = f_marché + f_secteur(i) + ε_i.
+    La covariance Σ = B F Bᵀ + D (rang faible + diagonale) n'est jamais construite : les produits Σw
+    et wᵀΣw se calculent en O(n·k) et la mémoire est en O(n + k²), pour n actifs et k facteurs.
+
+    Les facteurs sectoriels ne servent que si un portefeuille couvre plusieurs secteurs. Or
+    create_portfolio choisit tous les produits d'un portefeuille dans le secteur de son manager : le
+    rendement de l'unique facteur sectoriel (moyenne du secteur moins celle du marché) est alors nul,
+    et le modèle se réduit en pratique au facteur de marché et aux variances spécifiques.
+    """
+
+    def __init__(self, factor_names: List[str], sector_codes: np.ndarray, factor_cov: np.ndarray,
+                 specific_var: np.ndarray):
+        """
+        Initialise le modèle.
+
+        Args:
+            factor_names: Noms des facteurs ('market' puis les secteurs)
+            sector_codes: Indice du secteur de chaque actif (0 pour le premier secteur)
+            factor_cov: Covariance des rendements des facteurs (k × k)
+            specific_var: Variance spécifique de chaque actif
+        """
+        self.factor_names = factor_names
+        self.sector_codes = sector_codes
+        self.factor_cov = factor_cov
+        self.specific_var = specific_var
+
+    @classmethod
+    def from_returns(cls, returns_df: pd.DataFrame, sectors: Dict[str, str]) -> 'FactorRiskModel':
+        """
+        Estime le modèle sur une fenêtre de rendements.
+
+        Le rendement du marché est la moyenne des rendements des actifs, celui d'un secteur la moyenne
+        de ses actifs diminuée de celle du marché ; les variances spécifiques sont celles des résidus.
+        Avec un seul secteur (cas des portefeuilles de create_portfolio), le facteur sectoriel est nul.
+
+        Args:
+            returns_df: Rendements historiques (une colonne par actif, NaN remplacés par la moyenne de l'actif)
+            sectors: Secteur de chaque actif (ticker -> secteur de Products)
+
+        Returns:
+            FactorRiskModel: Modèle estimé
+        """
+        returns = returns_df.to_numpy(dtype=float)
+        with np.errstate(invalid='ignore'):
+            means = np.nan_to_num(np.nanmean(returns, axis=0))
+        returns = np.where(np.isnan(returns), means, returns)
+        nb_weeks, nb_assets = returns.shape
+
+        sector_names = sorted({sector_factor_name(sectors[ticker]) for ticker in returns_df.columns})
+        sector_index = {name: i for i, name in enumerate(sector_names)}
+        sector_codes = np.array([sector_index[sector_factor_name(sectors[ticker])] for ticker in returns_df.columns],
+                                dtype=int)
+        nb_sectors = len(sector_names)
+        sector_sizes = np.bincount(sector_codes, minlength=nb_sectors)
+
+        # Rendements des facteurs (semaines × facteurs)
+        market = returns.mean(axis=1)
+        sector_returns = returns @ np.eye(nb_sectors)[sector_codes] / sector_sizes - market[:, None]
+        factor_returns = np.column_stack([market, sector_returns])
+
+        # Résidus et variances spécifiques
+        residuals = returns - market[:, None] - sector_returns[:, sector_codes]
+        ddof = 1 if nb_weeks > 1 else 0
+        specific_var = residuals.var(axis=0, ddof=ddof)
+        floor = SPECIFIC_VARIANCE_FLOOR * returns.var(axis=0, ddof=ddof).mean() + 1e-12
+        specific_var = np.maximum(specific_var, floor)
+
+        factor_cov = np.atleast_2d(np.cov(factor_returns, rowvar=False, ddof=ddof))
+        return cls(['market'] + sector_names, sector_codes, factor_cov, specific_var)
+
+    def exposures(self, weights: np.ndarray) -> np.ndarray:
+        """
+        Expositions d'un portefeuille aux facteurs (Bᵀw).
+
+        Args:
+            weights: Poids des actifs
+
+        Returns:
+            np.ndarray: Exposition au marché puis à chaque secteur
+        """
+        return np.concatenate([[weights.sum()],
+                               np.bincount(self.sector_codes, weights, minlength=len(self.factor_names) - 1)])
+
+    def cov_dot(self, weights: np.ndarray) -> np.ndarray:
+        """
+        Calcule Σw sans construire Σ.
+
+        Args:
+            weights: Poids des actifs
+
+        Returns:
+            np.ndarray: Σw
+        """
+        factor_risk = self.factor_cov @ self.exposures(weights)
+        return factor_risk[0] + factor_risk[1:][self.sector_codes] + self.specific_var * weights
+
+    def variance(self, weights: np.ndarray) -> float:
+        """
+        Variance d'un portefeuille (wᵀΣw).
+
+        Args:
+            weights: Poids des actifs
+
+        Returns:
+            float: Variance périodique
+        """
+        exposures = self.exposures(weights)
+        return float(exposures @ self.factor_cov @ exposures + np.sum(self.specific_var * weights * weights))
+
+    def covariance(self) -> np.ndarray:
+        """
+        Construit la covariance complète (n × n), pour les petits univers et les contrôles.
+
+        Returns:
+            np.ndarray: Σ = B F Bᵀ + D
+        """
+        nb_assets = len(self.sector_codes)
+        loadings = np.zeros((nb_assets, len(self.factor_names)))
+        loadings[:, 0] = 1.0
+        loadings[np.arange(nb_assets), 1 + self.sector_codes] = 1.0
+        return loadings @ self.factor_cov @ loadings.T + np.diag(self.specific_var)
+
+
+def project_capped_simplex_exact(weights: np.ndarray, max_weight: float, nb_steps: int = 100) -> np.ndarray:
+    """
+    Projection euclidienne sur {0 <= w_i <= max_weight, Σw = 1}, par dichotomie sur le décalage τ
+    de w = clip(v - τ, 0, max_weight).
+
+    Si n × max_weight < 1, tous les poids valent max_weight (somme inférieure à 1).
+
+    Args:
+        weights: Poids à projeter
+        max_weight: Poids maximal par actif
+        nb_steps: Nombre d'itérations de la dichotomie
+
+    Returns:
+        np.ndarray: Poids projetés
+    """
+    if len(weights) * max_weight <= 1:
+        return np.full(len(weights), max_weight)
+    low, high = weights.min() - max_weight, weights.max()
+    for _ in range(nb_steps):
+        shift = (low + high) / 2
+        if np.clip(weights - shift, 0.0, max_weight).sum() > 1:
+            low = shift
+        else:
+            high = shift
+    return np.clip(weights - (low + high) / 2, 0.0, max_weight)
+
+
+def max_sharpe_weights(model: FactorRiskModel, mean_returns: np.ndarray, risk_free_rate: float = 0.02,
+                       max_weight: float = 0.20, annualization: int = 252, tol: float = 1e-9,
+                       max_iter: int = 500) -> np.ndarray:
+    """
+    Maximise le ratio de Sharpe sous contraintes long-only et plafonnées, dans l'espace des facteurs.
+
+    Montée de gradient projetée : le gradient du ratio de Sharpe ne demande qu'un produit Σw, calculé
+    par le modèle à facteurs en O(n·k), et chaque itéré est projeté exactement sur les contraintes.
+    Le pas est réduit tant que le ratio n'augmente pas.
+
+    Args:
+        model: Modèle de risque à facteurs
+        mean_returns: Rendements moyens périodiques des actifs
+        risk_free_rate: Taux sans risque annuel
+        max_weight: Poids maximal par actif
+        annualization: Facteur d'annualisation (252, comme Simulation.optimize)
+        tol: Variation minimale du ratio de Sharpe entre deux itérations
+        max_iter: Nombre maximal d'itérations
+
+    Returns:
+        np.ndarray: Poids optimaux
+    """
+    mean_returns = np.nan_to_num(np.asarray(mean_returns, dtype=float))
+
+    def sharpe_and_gradient(weights: np.ndarray):
+        cov_weights = model.cov_dot(weights)
+        volatility = np.sqrt(max(weights @ cov_weights, 1e-18) * annualization)
+        excess = mean_returns @ weights * annualization - risk_free_rate
+        sharpe = excess / volatility
+        gradient = (mean_returns * annualization - sharpe * annualization * cov_weights / volatility) / volatility
+        return sharpe, gradient
+
+    weights = project_capped_simplex_exact(np.full(len(mean_returns), 1 / len(mean_returns)), max_weight)
+    sharpe, gradient = sharpe_and_gradient(weights)
+    step = 1.0 / max(np.abs(gradient).max(), 1e-12) * max_weight
+
+    for _ in range(max_iter):
+        while True:
+            candidate = project_capped_simplex_exact(weights + step * gradient, max_weight)
+            candidate_sharpe, candidate_gradient = sharpe_and_gradient(candidate)
+            if candidate_sharpe >= sharpe or step < 1e-12:
+                break
+            step /= 2
+        if candidate_sharpe < sharpe:
+            break
+
+        improvement = candidate_sharpe - sharpe
+        weights, sharpe, gradient = candidate, candidate_sharpe, candidate_gradient
+        if improvement <= tol * max(abs(sharpe), 1.0):
+            break
+        step *= 2  # Le pas accepté est retenté plus grand à l'itération suivante
+
+    return weights
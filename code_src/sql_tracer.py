@@ -0,0 +1,176 @@
+import re
+import sqlite3
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+
+# Motifs de normalisation des requêtes
+_RETURNS_TABLE = re.compile(r'\bReturns_[A-Za-z0-9_]+')
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b')
+_IN_LIST = re.compile(r'IN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+# Nombre maximal de variantes distinctes mémorisées par forme (la mémoire du traceur reste bornée)
+MAX_VARIANTS = 1000
+
+
+def normalize_query(statement: str) -> str:
+    """
+    Ramène une requête SQL à sa forme générique.
+
+    Les littéraux sont remplacés par '?' et les tables Returns_<ticker> par Returns_{ticker},
+    de sorte que la même requête exécutée pour différents tickers ou paramètres ait une seule forme.
+
+    Args:
+        statement: Requête SQL exécutée (paramètres déjà substitués)
+
+    Returns:
+        str: Forme normalisée de la requête
+    """
+    shape = _RETURNS_TABLE.sub('Returns_{ticker}', statement)
+    shape = _STRING_LITERAL.sub('?', shape)
+    shape = _NUMBER_LITERAL.sub('?', shape)
+    shape = _IN_LIST.sub('IN (...)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+class QueryTracer:
+    """
+    Traceur de requêtes SQL d'une connexion, basé sur sqlite3.Connection.set_trace_callback.
+
+    Les requêtes sont comptées par forme normalisée. La durée d'une requête est l'intervalle entre
+    son démarrage et celui de la requête suivante : elle inclut la lecture de ses résultats (fetch)
+    et le traitement Python qui les consomme. L'appelant marque la fin d'une série de requêtes avec
+    checkpoint, pour que le calcul qui suit (ex: optimisation) ne soit pas attribué à la dernière.
+
+    Seule une empreinte de chaque variante (requête avec ses paramètres) est conservée, et au plus
+    MAX_VARIANTS par forme : le nombre de variantes distinctes d'une forme est plafonné à cette valeur.
+    """
+
+    def __init__(self, n_plus_one_threshold: int = 10):
+        """
+        Initialise le traceur.
+
+        Args:
+            n_plus_one_threshold: Nombre d'exécutions d'une même forme à partir duquel un motif N+1 est signalé
+        """
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.db: Optional[sqlite3.Connection] = None
+        self.reset()
+
+    def reset(self) -> None:
+        """Efface les requêtes enregistrées."""
+        self.counts: Dict[str, int] = defaultdict(int)
+        self.durations: Dict[str, float] = defaultdict(float)
+        self.variants: Dict[str, set] = defaultdict(set)  # Empreintes des variantes (au plus MAX_VARIANTS)
+        self.tables: Dict[str, set] = defaultdict(set)
+        self._current_shape: Optional[str] = None
+        self._current_start = 0.0
+
+    def attach(self, db: sqlite3.Connection) -> 'QueryTracer':
+        """
+        Commence à tracer les requêtes d'une connexion.
+
+        Args:
+            db: Connexion à tracer
+
+        Returns:
+            QueryTracer: Le traceur lui-même
+        """
+        self.db = db
+        db.set_trace_callback(self._on_statement)
+        return self
+
+    def detach(self) -> None:
+        """Arrête de tracer la connexion."""
+        self._close_current()
+        if self.db is not None:
+            self.db.set_trace_callback(None)
+            self.db = None
+
+    def __enter__(self) -> 'QueryTracer':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.detach()
+
+    def checkpoint(self) -> None:
+        """Termine la requête en cours : le traitement qui suit ne lui est pas attribué."""
+        self._close_current()
+
+    def _close_current(self, now: Optional[float] = None) -> None:
+        if self._current_shape is not None:
+            now = time.perf_counter() if now is None else now
+            self.durations[self._current_shape] += now - self._current_start
+            self._current_shape = None
+
+    def _on_statement(self, statement: str) -> None:
+        now = time.perf_counter()
+        self._close_current(now)
+
+        shape = normalize_query(statement)
+        self.counts[shape] += 1
+        variants = self.variants[shape]
+        if len(variants) < MAX_VARIANTS:
+            variants.add(hash(statement))
+        self.tables[shape].update(_RETURNS_TABLE.findall(statement))
+
+        self._current_shape = shape
+        self._current_start = now
+
+    def get_n_plus_one(self) -> List[Dict[str, Any]]:
+        """
+        Détecte les motifs N+1 : une même forme de requête répétée avec des tables ou paramètres différents.
+
+        Returns:
+            List[Dict[str, Any]]: Formes suspectes, de la plus fréquente à la moins fréquente
+        """
+        suspects = []
+        for shape, count in self.counts.items():
+            if count < self.n_plus_one_threshold or len(self.variants[shape]) < 2:
+                continue
+            suspects.append({
+                'query': shape,
+                'count': count,
+                'distinct_tables': len(self.tables[shape]),
+                'distinct_variants': len(self.variants[shape]),
+            })
+        return sorted(suspects, key=lambda suspect: -suspect['count'])
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Résume les requêtes tracées.
+
+        Returns:
+            Dict[str, Any]: Nombre total de requêtes, durée totale, statistiques par forme et motifs N+1
+        """
+        self._close_current()
+        queries = [
+            {'query': shape, 'count': count, 'total_ms': self.durations[shape] * 1000}
+            for shape, count in sorted(self.counts.items(), key=lambda item: -item[1])
+        ]
+        return {
+            'total_queries': sum(self.counts.values()),
+            'total_ms': sum(self.durations.values()) * 1000,
+            'queries': queries,
+            'n_plus_one': self.get_n_plus_one(),
+        }
+
+
+def print_query_summary(summary: Dict[str, Any], limit: int = 10) -> None:
+    """
+    Affiche le résumé d'un traceur de requêtes.
+
+    Args:
+        summary: Résumé produit par QueryTracer.summary()
+        limit: Nombre maximal de formes affichées
+    """
+    print(f"\n=== Requêtes SQL : {summary['total_queries']} ({summary['total_ms']:.1f} ms) ===")
+    for query in summary['queries'][:limit]:
+        print(f"{query['count']:>7} × {query['total_ms']:>9.1f} ms  {query['query'][:100]}")
+
+    for suspect in summary['n_plus_one']:
+        print(f"⚠️ N+1 : {suspect['count']} exécutions, {suspect['distinct_tables']} tables Returns_*, "
+              f"{suspect['distinct_variants']} variantes : {suspect['query'][:80]}")
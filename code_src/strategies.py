@@ -1,17 +1,304 @@
-from typing import Dict, List, Any
+from typing import Callable, Dict, Any, Iterator, NamedTuple, Optional, Type, Union
 import sqlite3
 from datetime import datetime
 import pandas as pd
 import numpy as np
-from base_builder import  Deal
-from scipy.optimize import minimize
-from base_builder import Portfolio
+from base_builder import Portfolio, Product, from_day, to_day
+from allocators import allocate_weights, max_sharpe_slsqp
+from risk_models import FactorRiskModel, max_sharpe_weights
+from instrumentation import instrumentation, timed
+from sql_tracer import QueryTracer
+from trading_calendar import TradingCalendar, load_price_dates, rebalance_days
+from position_book import DealBuffer, PositionBook
+from unit_of_work import UnitOfWork
+from writer_service import writer_for
+from repository import Repository
+
+
+# Paramètres par défaut des stratégies
+DEFAULT_PARAMS = {
+    'vol_target': 0.10,         # Volatilité cible de la stratégie Low Risk
+    'max_deals_per_month': 2,   # Nombre maximal de deals par mois de la stratégie Medium Risk
+    'max_weight': 0.20,         # Poids maximal par actif lors de l'optimisation
+    'lookback_weeks': 12,       # Nombre de rendements hebdomadaires utilisés par get_asset_returns
+    'risk_free_rate': 0.02,     # Taux sans risque annuel de l'optimisation
+    'allocator': None,          # Allocateur ('max_sharpe' ou voir ALLOCATORS), par défaut celui de STRATEGY_ALLOCATORS
+    'fallback_allocator': None, # Allocateur rapide utilisé si SLSQP échoue ou dépasse optimize_timeout
+    'optimize_timeout': None,   # Durée maximale d'une optimisation SLSQP, en secondes
+    'risk_model': 'sample',     # Covariance de max_sharpe : 'sample' (empirique, SLSQP) ou 'factor' (marché + secteurs)
+    'drift_threshold': None,    # Rééquilibrage paresseux : écart de poids maximal toléré depuis le dernier rééquilibrage
+    'vol_signal_threshold': 0.25,  # Variation relative de volatilité qui force un rééquilibrage paresseux
+}
+
+# Version de la logique des stratégies, à incrémenter quand les deals produits changent à paramètres
+# égaux : les classements en cache sont alors recalculés (voir get_portfolio_inputs_version)
+STRATEGY_VERSION = 2
+
+# Allocateur de chaque profil de risque : 'max_sharpe' (SLSQP, Simulation.optimize) ou un allocateur rapide
+STRATEGY_ALLOCATORS = {
+    'Low Risk': 'max_sharpe',
+    'Medium Risk': 'max_sharpe',
+    'High Risk': 'max_sharpe',
+}
+
+
+class TradeConstraints(NamedTuple):
+    """Règles d'exécution des deals d'une stratégie, appliquées par apply_trades."""
+    
+    allow_buys: bool = True
+    allow_sells: bool = True
+    check_cash: bool = True                     # Un achat doit être couvert par le cash disponible
+    check_holdings: bool = True                 # Vente refusée si elle dépasse la quantité détenue (pas de vente à découvert)
+    max_deals_per_month: Optional[int] = None   # Plafond mensuel de deals (None : pas de plafond)
+
+
+class StrategyStats(NamedTuple):
+    """
+    Données d'une semaine transmises aux stratégies.
+    
+    Les tableaux peuvent avoir des dimensions de lot en tête (ex: trajectoires de Monte Carlo) :
+    les stratégies calculent leurs poids cibles pour tout le lot à la fois.
+    """
+    
+    returns: np.ndarray                         # Fenêtre de rendements (... × semaines × actifs)
+    weights: np.ndarray                         # Poids actuels (... × actifs)
+    deals_left: Optional[Union[int, np.ndarray]]  # Deals encore autorisés ce mois-ci (None : pas de plafond)
+    optimal_weights: Callable[[], np.ndarray]   # Poids de l'allocateur (... × actifs), calculés à la demande
+
+
+def portfolio_volatility(returns: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """
+    Volatilité annualisée d'un portefeuille sur une fenêtre de rendements.
+    
+    Args:
+        returns: Fenêtre de rendements (... × semaines × actifs)
+        weights: Poids des actifs (... × actifs)
+        
+    Returns:
+        np.ndarray: Volatilité annualisée (...), NaN si la fenêtre est trop courte
+    """
+    # Somme dans l'ordre des positions, comme le calcul historique avec pandas
+    portfolio_returns = np.zeros(returns.shape[:-1])
+    for i in range(weights.shape[-1]):
+        portfolio_returns = portfolio_returns + returns[..., i] * weights[..., None, i]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.nanstd(portfolio_returns, axis=-1, ddof=1) * np.sqrt(252)
+
+
+# Stratégies disponibles, par profil de risque (voir register_strategy)
+STRATEGY_REGISTRY: Dict[str, Type['Strategy']] = {}
+
+
+def register_strategy(name: str) -> Callable[[Type['Strategy']], Type['Strategy']]:
+    """
+    Décorateur qui enregistre une stratégie sous le nom d'un profil de risque.
+    
+    Args:
+        name: Nom de la stratégie (ex: 'Low Risk')
+        
+    Returns:
+        Callable: Décorateur de classe
+    """
+    def decorator(cls: Type['Strategy']) -> Type['Strategy']:
+        cls.name = name
+        STRATEGY_REGISTRY[name] = cls
+        return cls
+    return decorator
+
+
+def get_strategy(name: str, params: Optional[Dict[str, Any]] = None) -> 'Strategy':
+    """
+    Instancie une stratégie enregistrée.
+    
+    Args:
+        name: Nom de la stratégie
+        params: Paramètres de la stratégie remplaçant ceux de DEFAULT_PARAMS
+        
+    Returns:
+        Strategy: Stratégie
+    """
+    if name not in STRATEGY_REGISTRY:
+        raise ValueError(f"Stratégie inconnue : {name}")
+    return STRATEGY_REGISTRY[name]({**DEFAULT_PARAMS, **(params or {})})
+
+
+class Strategy:
+    """
+    Stratégie d'investissement : poids cibles d'une semaine et règles d'exécution des deals.
+    
+    Les sous-classes enregistrées avec register_strategy sont utilisées par Simulation (et donc
+    BacktestSimulation) comme par le moteur de Monte Carlo, qui partagent ainsi la même logique.
+    """
+    
+    name: str = None
+    
+    def __init__(self, params: Dict[str, Any]):
+        self.params = params
+    
+    @property
+    def constraints(self) -> TradeConstraints:
+        """Règles d'exécution des deals de la stratégie."""
+        return TradeConstraints()
+    
+    def target_weights(self, stats: StrategyStats) -> Optional[np.ndarray]:
+        """
+        Calcule les poids cibles de la semaine.
+        
+        Args:
+            stats: Fenêtre de rendements, poids actuels et poids de l'allocateur
+            
+        Returns:
+            Optional[np.ndarray]: Poids cibles (... × actifs), ou None si aucun deal n'est possible
+        """
+        raise NotImplementedError
+    
+    def rebalance_signal(self, stats: StrategyStats) -> bool:
+        """
+        Signal propre à la stratégie qui force un rééquilibrage en mode paresseux (drift_threshold).
+        
+        Args:
+            stats: Fenêtre de rendements et poids actuels (optimal_weights n'est pas calculé)
+            
+        Returns:
+            bool: True si la stratégie doit être exécutée malgré une faible dérive des poids
+        """
+        return False
+
+
+@register_strategy("Low Risk")
+class LowRiskStrategy(Strategy):
+    """
+    Volatilité cible : au-dessus de vol_target, les actifs risqués sont réduits proportionnellement ;
+    en dessous, le portefeuille se rapproche des poids de l'allocateur.
+    """
+    
+    def target_weights(self, stats: StrategyStats) -> Optional[np.ndarray]:
+        vol_target = self.params['vol_target']
+        weights = stats.weights
+        
+        # Volatilité annualisée du portefeuille et de chaque actif
+        current_volatility = portfolio_volatility(stats.returns, weights)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            asset_volatilities = np.nanstd(stats.returns, axis=-2, ddof=1) * np.sqrt(252)
+        
+        reduce = current_volatility > vol_target
+        increase = current_volatility < vol_target
+        if not np.any(reduce) and not np.any(increase):
+            return None
+        
+        targets = weights
+        if np.any(increase):
+            targets = np.where(np.asarray(increase)[..., None], np.round(stats.optimal_weights(), 2), targets)
+        if np.any(reduce):
+            # Réduction des seuls actifs dont la volatilité dépasse la cible (ventes uniquement)
+            scale = np.where(reduce, vol_target / np.where(reduce, current_volatility, 1.0), 1.0)
+            reduced = np.minimum(np.round(weights * np.asarray(scale)[..., None], 2), weights)
+            reduced = np.where(asset_volatilities > vol_target, reduced, weights)
+            targets = np.where(np.asarray(reduce)[..., None], reduced, targets)
+        return targets
+    
+    def rebalance_signal(self, stats: StrategyStats) -> bool:
+        # Volatilité au-dessus de la cible : les actifs risqués doivent être réduits
+        return bool(np.any(portfolio_volatility(stats.returns, stats.weights) > self.params['vol_target']))
+
+
+@register_strategy("Medium Risk")
+class MediumRiskStrategy(Strategy):
+    """Faible rotation : poids de l'allocateur, au plus max_deals_per_month deals par mois."""
+    
+    @property
+    def constraints(self) -> TradeConstraints:
+        # Ventes désactivées (la condition de vente historique n'était jamais satisfaite)
+        return TradeConstraints(allow_sells=False, max_deals_per_month=self.params['max_deals_per_month'])
+    
+    def target_weights(self, stats: StrategyStats) -> Optional[np.ndarray]:
+        if stats.deals_left is not None and np.all(np.asarray(stats.deals_left) <= 0):
+            return None
+        return np.round(stats.optimal_weights(), 2)
+
+
+@register_strategy("High Risk")
+class HighRiskStrategy(Strategy):
+    """Rééquilibrage hebdomadaire vers les poids de l'allocateur."""
+    
+    @property
+    def constraints(self) -> TradeConstraints:
+        # Ventes désactivées (la condition de vente historique n'était jamais satisfaite)
+        return TradeConstraints(allow_sells=False)
+    
+    def target_weights(self, stats: StrategyStats) -> Optional[np.ndarray]:
+        return np.round(stats.optimal_weights(), 2)
+
+
+def apply_trades(positions: PositionBook, targets: np.ndarray, constraints: TradeConstraints,
+                 portfolio_value: float, deals: DealBuffer, deals_left: Optional[int] = None) -> int:
+    """
+    Transforme des écarts de poids en deals et met à jour les positions et le cash.
+    
+    Les quantités et les deals candidats sont calculés pour toutes les positions à la fois ; seuls
+    les candidats sont ensuite parcourus, dans l'ordre des positions, car le cash disponible et le
+    plafond de deals dépendent des deals précédents.
+    
+    Args:
+        positions: Carnet des positions et du cash du portefeuille (modifié en place)
+        targets: Poids cibles, dans l'ordre des positions
+        constraints: Règles d'exécution de la stratégie
+        portfolio_value: Valeur du portefeuille servant de base aux poids
+        deals: Tampon auquel les deals effectués sont ajoutés
+        deals_left: Nombre de deals encore autorisés (None : pas de plafond)
+        
+    Returns:
+        int: Nombre de deals effectués
+    """
+    if not len(positions):
+        return 0
+    prices = positions.prices
+    weight_diffs = targets - positions.weights
+    quantities = (weight_diffs * portfolio_value / prices).astype(int)
+    
+    candidates = ((quantities > 0) & constraints.allow_buys) | ((quantities < 0) & constraints.allow_sells)
+    
+    nb_deals = 0
+    for i in np.flatnonzero(candidates).tolist():
+        if deals_left is not None and nb_deals >= deals_left:
+            break
+        quantity = int(quantities[i])
+        price = float(prices[i])
+        amount = quantity * price
+        if quantity > 0 and constraints.check_cash and amount > positions.cash:
+            continue
+        if quantity < 0 and constraints.check_holdings and -quantity > positions.quantities[i]:
+            continue
+        
+        deals.append(positions.product_ids[i], quantity, price)
+        nb_deals += 1
+        positions.quantities[i] += quantity
+        positions.weights[i] += amount/portfolio_value
+        positions.values[i] += amount
+        positions.cash -= amount
+    
+    return nb_deals
+
+
+class WeeklySnapshot(NamedTuple):
+    """État compact du portefeuille à l'issue d'une semaine de simulation."""
+    
+    date: datetime
+    cash: float
+    values: Dict[str, float]  # Valeur de chaque produit (ticker -> valeur)
+    
+    @property
+    def portfolio_value(self) -> float:
+        """Valeur totale du portefeuille (produits + cash)."""
+        return sum(self.values.values()) + self.cash
 
 
 class Simulation:
     """Classe pour simuler la gestion active d'un portefeuille."""
     
-    def __init__(self, db: sqlite3.Connection, portfolio_id: int, strategy: str, registration_date: str):
+    def __init__(self, db: sqlite3.Connection, portfolio_id: int, strategy: str, registration_date: Union[str, int],
+                 trace_queries: bool = False, params: Optional[Dict[str, Any]] = None,
+                 unit_of_work: Optional[UnitOfWork] = None, repository: Optional[Repository] = None):
         """
         Initialise la simulation.
         
@@ -19,50 +306,149 @@ class Simulation:
             db: Connexion à la base de données
             portfolio_id: ID du portefeuille à simuler
             strategy: Stratégie d'investissement à utiliser
-            registration_date: Date d'enregistrement du client
+            registration_date: Date d'enregistrement du client ('YYYY-MM-DD' ou numéro de jour)
+            trace_queries: Trace les requêtes SQL de chaque exécution de iter_weeks (voir query_summary)
+            params: Paramètres de la stratégie remplaçant ceux de DEFAULT_PARAMS
+            unit_of_work: (facultatif) Unité de travail regroupant les écritures, éventuellement partagée
+                          entre simulations (par défaut: écritures confiées au service d'écriture partagé
+                          de la base, et attendues en fin de simulation)
+            repository: (facultatif) Dépôt des entités, éventuellement partagé entre simulations
+                        (par défaut: dépôt propre à la simulation)
         """
         self.db = db
         self.cursor = db.cursor()
         self.portfolio_id = portfolio_id
         self.strategy = strategy
-        self.registration_date = datetime.strptime(registration_date, '%Y-%m-%d')
-        
-        # Récupérer les informations du portefeuille
-        self.cursor.execute("""
-            SELECT p.value, p.size
-            FROM Portfolios p
-            WHERE p.id = ?
-        """, (portfolio_id,))
-        portfolio_info = self.cursor.fetchone()
-        if portfolio_info:
-            self.portfolio_value = portfolio_info[0]
-            self.portfolio_size = portfolio_info[1]
-        else:
+        self.registration_date = from_day(to_day(registration_date))
+        self.params = {**DEFAULT_PARAMS, **(params or {})}
+        self.strategy_plugin = get_strategy(strategy, self.params)
+        
+        # Récupérer le portefeuille et ses produits (carte d'identité du dépôt)
+        self.repository = Repository(db) if repository is None else repository
+        self.portfolio = self.repository.get(Portfolio, portfolio_id)
+        if self.portfolio is None:
             raise ValueError(f"Portefeuille {portfolio_id} non trouvé")
+        self.portfolio_value = self.portfolio.value
+        self.portfolio_size = self.portfolio.size
         
-        self.cursor.execute("""
-            UPDATE Portfolios_Products
-            SET quantity = ?,
-                weight = ?,
-                value = ?
-            WHERE portfolio_id = ?
-        """, (0,0, 0, portfolio_id))
+        # Positions remises à zéro par l'unité de travail (par défaut: service d'écriture partagé de la base,
+        # écritures directes sur un instantané en mémoire)
+        self.unit_of_work = UnitOfWork(db, writer=writer_for(db)) if unit_of_work is None else unit_of_work
+        self.unit_of_work.reset_positions(portfolio_id)
     
         
 
+        # Tickers du portefeuille, dans l'ordre des produits
+        self.products = self.repository.products_of([portfolio_id])[portfolio_id]
+        self.tickers = [product.ticker for product in self.products]
+        self.sectors = None  # Secteur de chaque produit, chargé au premier besoin (voir get_sectors)
+
         # Compteur de deals par mois
         self.deals_count = 0
         self.current_month = None
+        
+        # Rééquilibrage paresseux : poids et volatilité au dernier rééquilibrage, lundis sans rééquilibrage
+        self.rebalance_weights = None
+        self.rebalance_volatility = None
+        self.skipped_rebalances = []
+        
+        # Calendrier de rééquilibrage et lignes de prix as-of (voir iter_weeks)
+        self.calendar = None
+        
+        # Carnet des positions (chargé une fois depuis la base) et tampon des deals de la semaine
+        self.book = None
+        self.deal_buffer = DealBuffer()
+        
+        # Traceur de requêtes SQL (optionnel) et résumé de la dernière exécution
+        self.query_tracer = QueryTracer() if trace_queries else None
+        self.query_summary = None
     
-    def execute_strategy(self, current_date: datetime) -> List[Dict[str, Any]]:
+    def iter_weeks(self, start_date: Optional[Union[str, datetime]] = None,
+                   end_date: Optional[datetime] = None) -> Iterator[WeeklySnapshot]:
+        """
+        Simule la gestion active du portefeuille semaine par semaine.
+        
+        La stratégie est exécutée chaque lundi entre start_date et end_date, selon un calendrier
+        précalculé (voir trading_calendar.TradingCalendar). Le générateur peut être interrompu à
+        tout moment par le consommateur.
+        
+        Args:
+            start_date: Date de début (par défaut: date d'enregistrement du client)
+            end_date: Date de fin (par défaut: 31/12/2024)
+            
+        Yields:
+            WeeklySnapshot: Date, cash et valeur de chaque produit après exécution de la stratégie
+            
+        Si la simulation trace ses requêtes, leur résumé est disponible dans query_summary à la fin.
+        """
+        if start_date is None:
+            current_date = self.registration_date
+        elif isinstance(start_date, str):
+            current_date = datetime.strptime(start_date, '%Y-%m-%d')
+        else:
+            current_date = start_date
+        if end_date is None:
+            end_date = datetime(2024, 12, 31)
+        
+        if self.query_tracer is not None:
+            self.query_tracer.reset()
+            self.query_tracer.attach(self.db)
+        
+        # Lundis de la période et ligne de prix as-of de chaque produit, calculés une fois
+        self.calendar = self._trading_calendar(rebalance_days(current_date, end_date))
+        
+        try:
+            for current_date in self.calendar.dates():
+                # Exécuter la stratégie pour ce lundi
+                positions = self.execute_strategy(current_date)
+                self.unit_of_work.end_week()
+                if self.query_tracer is not None:
+                    self.query_tracer.checkpoint()
+                
+                yield WeeklySnapshot(current_date, positions.cash, positions.values_by_ticker())
+        finally:
+            # Écritures en attente validées, y compris si le consommateur s'arrête avant la fin
+            self.unit_of_work.end_run()
+            
+            # Valeur et cash courants suivis par la simulation (carnet) : l'objet partagé par le dépôt
+            # n'est pas modifié, il est oublié pour être relu depuis la ligne enregistrée
+            if self.repository is not None:
+                self.repository.invalidate(Portfolio, [self.portfolio_id])
+            
+            # Résumé des requêtes, y compris si le consommateur s'arrête avant la fin
+            if self.query_tracer is not None:
+                self.query_summary = self.query_tracer.summary()
+                self.query_tracer.detach()
+    
+    def _trading_calendar(self, days: np.ndarray) -> TradingCalendar:
+        """
+        Construit le calendrier de rééquilibrage à partir des dates des prix des produits.
+        
+        Args:
+            days: Numéros de jour des lundis de rééquilibrage
+            
+        Returns:
+            TradingCalendar: Calendrier et lignes de prix as-of
+        """
+        return TradingCalendar(load_price_dates(self.db, self.tickers), days)
+    
+    def _asof_row(self, ticker: str, date: datetime) -> int:
+        """Indice de la dernière ligne de prix connue à la date donnée (-1 si aucune), voir TradingCalendar."""
+        if self.calendar is None:
+            # Stratégie exécutée hors de iter_weeks : calendrier sans lundis, recherches ponctuelles
+            self.calendar = self._trading_calendar(np.empty(0, dtype=np.int32))
+        return self.calendar.asof_row(ticker, date)
+    
+    @timed('execute_strategy')
+    def execute_strategy(self, current_date: datetime) -> PositionBook:
         """
         Exécute la stratégie d'investissement pour une date donnée.
         
         Args:
-            current_date: Date d'analyse (vendredi)
+            current_date: Date d'analyse (lundi)
             
         Returns:
-            List[Dict[str, Any]]: Liste des deals à exécuter
+            PositionBook: Positions et cash du portefeuille après les deals de la semaine
         """
         # Mettre à jour l'historique des rendements
         current_returns = self.get_asset_returns(current_date)
@@ -74,350 +460,289 @@ class Simulation:
             self.current_month = current_month
 
         # Récupérer les positions actuelles
-        positions, cash = self.get_portfolio_positions(self.portfolio_id, current_date)
-
-
-        # Calculer les décisions d'investissement selon la stratégie
-        deals,cash,positions = self._calculate_deals(positions, cash, current_returns)
+        positions = self.get_portfolio_positions(self.portfolio_id, current_date)
+        if self.query_tracer is not None:
+            # Lectures terminées : le calcul des deals n'est pas attribué à la dernière requête
+            self.query_tracer.checkpoint()
+
+
+        # Calculer les décisions d'investissement selon la stratégie (sauf si les poids ont peu dérivé)
+        deals = self.deal_buffer
+        deals.clear()
+        if self._rebalance_due(positions, current_returns):
+            self._calculate_deals(positions, current_returns, deals)
+            self._record_rebalance(positions, current_returns)
+        else:
+            self.skipped_rebalances.append(current_date)
+            instrumentation.count('skipped_rebalances')
 
         # Enregistrer les deals dans la base de données
-        if deals:
-            self._save_deals_positions(deals, positions, cash, current_date)
+        if len(deals):
+            self._save_deals_positions(deals, positions, current_date)
             
 
-        return positions, cash
+        return positions
     
+    @timed('get_asset_returns')
     def get_asset_returns(self, date: datetime) -> pd.DataFrame:
-        """Get returns for each asset as a DataFrame with the last 12 returns"""
-        # Récupérer tous les tickers du portefeuille
-        self.cursor.execute("""
-            SELECT DISTINCT p.ticker
-            FROM Portfolios_Products pp
-            JOIN Products p ON pp.product_id = p.id
-            WHERE pp.portfolio_id = ?
-        """, (self.portfolio_id,))
-        
-        tickers = [row[0] for row in self.cursor.fetchall()]
+        """Get returns for each asset as a DataFrame with the last `lookback_weeks` returns"""
+        lookback_weeks = self.params['lookback_weeks']
+
+        # Tickers du portefeuille (chargés une fois, voir __init__)
+        tickers = self.tickers
+        instrumentation.count('returns_queries', len(tickers))
         
         # Créer un dictionnaire pour stocker les rendements par ticker
         returns_dict = {}
         
-        # Récupérer les rendements pour chaque ticker
+        # Récupérer les rendements pour chaque ticker, entre les dates connues de la fenêtre
         for ticker in tickers:
+            end = self._asof_row(ticker, date)
+            if end < 0:
+                continue
+            price_dates = self.calendar.price_dates[ticker]
             self.cursor.execute(f"""
-                SELECT date, returns
+                SELECT returns
                 FROM Returns_{ticker}
-                WHERE date <= ?
-                ORDER BY date DESC
-                LIMIT 12
-            """, (date.strftime("%Y-%m-%d"),))
-            
-            results = self.cursor.fetchall()
-            if results:
-                # Créer une liste de rendements dans l'ordre chronologique
-                returns_list = [row[1] for row in reversed(results)]
-                returns_dict[ticker] = returns_list
+                WHERE date BETWEEN ? AND ?
+                ORDER BY date
+            """, (int(price_dates[max(0, end - lookback_weeks + 1)]), int(price_dates[end])))
             
-            if len(returns_list) <=12:
-                for i in range(12-len(returns_list)):
-                    returns_dict[ticker].append(0.0)
+            # Rendements dans l'ordre chronologique, complétés par des zéros
+            returns_list = [row[0] for row in self.cursor.fetchall()]
+            returns_dict[ticker] = returns_list + [0.0] * (lookback_weeks - len(returns_list))
 
         # Créer la DataFrame
         returns_df = pd.DataFrame(returns_dict)
         
         return returns_df
     
-    def get_portfolio_positions(self, portfolio_id, current_date):
-        """
-        Récupère les positions actuelles du portefeuille depuis la table Portfolios_Products.
+    @timed('get_portfolio_positions')
+    def get_portfolio_positions(self, portfolio_id: int, current_date: datetime) -> PositionBook:
         """
-        cursor = self.db.cursor()
+        Valorise les positions actuelles du portefeuille au dernier prix connu.
         
-        # Récupérer les positions depuis Portfolios_Products
-        cursor.execute("""
-            SELECT p.ticker, pp.quantity, pp.weight, p.id as product_id
-            FROM Portfolios_Products pp
-            JOIN Products p ON pp.product_id = p.id
-            WHERE pp.portfolio_id = ?
-        """, (portfolio_id,))
+        Le carnet des positions part des positions remises à zéro et du cash du portefeuille, puis
+        est suivi en mémoire (les écritures sont différées par l'unité de travail). Seuls les
+        produits dont un prix est connu à la date donnée sont retournés.
         
-        positions = []
-        total_value = 0
-
-        for row in cursor.fetchall():
-
-            ticker, quantity, weight, product_id = row
-            
-            # Récupérer le dernier prix connu
-            cursor.execute(f"""
-                SELECT price
-                FROM Returns_{ticker}
-                WHERE date <= ?
-                ORDER BY date DESC
-                LIMIT 1
-            """, (current_date.strftime('%Y-%m-%d'),))
-            
-            price = cursor.fetchone()
-            if price is None:
-                continue
-            
-            position_value = quantity * price[0]
-            total_value += position_value
+        Args:
+            portfolio_id: ID du portefeuille
+            current_date: Date d'analyse
             
-
-            positions.append({
-                'ticker': ticker,
-                'quantity': quantity,
-                'weight': weight,
-                'price': price[0],
-                'value': position_value,
-                'product_id': product_id
-            })
-
-        cursor.execute("""
-                SELECT cash_value
-                FROM Portfolios
-                WHERE id = ?
-            """, (self.portfolio_id,))
-        cash_value = cursor.fetchone()[0]
+        Returns:
+            PositionBook: Positions valorisées au dernier prix connu et cash du portefeuille
+        """
+        cursor = self.db.cursor()
         
-        cash = {
-            'ticker': 'CASH',
-            'weight': cash_value/self.portfolio_value,
-            'price': 1,
-            'value': cash_value} 
+        if self.book is None:
+            # Positions remises à zéro à l'initialisation (voir UnitOfWork.reset_positions), produits et cash du dépôt
+            self.book = PositionBook(self.tickers, [product.id for product in self.products], self.portfolio.cash_value)
+            self.priced = np.ones(len(self.book), dtype=bool)
         
-
-        return positions, cash
+        book = self.book
+        for i, ticker in enumerate(book.tickers):
+            # Récupérer le dernier prix connu (ligne as-of du calendrier)
+            end = self._asof_row(ticker, current_date)
+            price = None
+            if end >= 0:
+                cursor.execute(f"""
+                    SELECT price
+                    FROM Returns_{ticker}
+                    WHERE date = ?
+                """, (int(self.calendar.price_dates[ticker][end]),))
+                price = cursor.fetchone()
+            self.priced[i] = price is not None
+            if price is not None:
+                book.prices[i] = price[0]
+        book.revalue()
+
+        return book.select(self.priced)
 
 
     
-    def _calculate_deals(self, positions: List[Dict[str, Any]], cash: Dict[str, Any], current_returns: pd.DataFrame) -> List[Dict[str, Any]]:
+    @timed('calculate_deals')
+    def _calculate_deals(self, positions: PositionBook, current_returns: pd.DataFrame, deals: DealBuffer) -> int:
         """
         Calcule les deals à effectuer selon la stratégie.
         
+        Les poids cibles sont donnés par la stratégie enregistrée (voir STRATEGY_REGISTRY), puis
+        transformés en deals par apply_trades selon ses règles d'exécution.
+        
         Args:
-            positions: Positions actuelles du portefeuille
-            current_date: Date d'analyse
+            positions: Positions actuelles du portefeuille (mises à jour en place)
+            current_returns: Fenêtre de rendements des actifs
+            deals: Tampon auquel les deals sont ajoutés
             
         Returns:
-            List[Dict[str, Any]]: Liste des deals à effectuer
+            int: Nombre de deals effectués
         """
-        deals = []
-
-        if self.strategy == "Low Risk":
-
-            # Calculer la volatilité actuelle du portefeuille
-            portfolio_returns = pd.Series(0.0, index=current_returns.index)
-            for position in positions:
-                if position['ticker'] in current_returns.columns:
-                    portfolio_returns += current_returns[position['ticker']] * position['weight']
-            
-            current_volatility = portfolio_returns.std() * np.sqrt(252)  # Volatilité annualisée
-            
-            
-            # Si la volatilité est supérieure à 10%, réduire les positions risquées
-            if current_volatility > 0.10:
-
-                # Trier les actifs par volatilité décroissante
-                asset_volatilities = current_returns.std() * np.sqrt(252)
-                risky_assets = asset_volatilities[asset_volatilities > 0.10].index
-                
-                # Réduire les positions des actifs les plus risqués
-                for position in positions:
-                    if position['ticker'] in risky_assets:
-                        # Calculer la réduction nécessaire
-                        target_weight = round(position['weight'] * (0.10 / current_volatility), 2)
-                        weight_diff = target_weight - position['weight']
-                        
-                        
-                    quantity = int(weight_diff * self.portfolio_value / position['price'])
-                    if quantity < 0:
-                        deals.append({
-                            'product_id': position['product_id'],
-                            'action': 'SELL',
-                            'quantity': quantity,
-                            'price': position['price']
-                        })
-                        position['quantity'] += quantity
-                        position['weight'] += quantity * position['price']/self.portfolio_value
-                        position['value'] += quantity * position['price']
-                        cash['value']-= quantity * position['price']
-                        cash['weight']= cash['value']/self.portfolio_value
-
-            
-            # Si la volatilité est inférieure à 10%, augmenter les positions des actifs moins risqués
-            elif current_volatility < 0.10:
-
-                # Obtenir les poids optimaux
-                target_weights = self.optimize(current_returns)
-                
-                # Augmenter les positions des actifs les moins risqués
-                for position in positions:
-
-                    current_weight = position['weight']
-                    target_weight = round(target_weights.get(position['ticker'], 0), 2)
-                    weight_diff = target_weight - current_weight
-
-
-                
-                    quantity = int((weight_diff) * self.portfolio_value / position['price'])
-
-                    if quantity !=0:
-                         
-                        action = 'BUY' if weight_diff > 0 else 'SELL'
-                        
-                        if (action == 'BUY' and quantity * position['price'] <= cash['value']) or (action == 'SELL' and quantity * position['price'] <= position['value']):
-            
-                            self.deals_count += 1
-                            deals.append({
-                            'product_id': position['product_id'],
-                            'action': action,
-                            'quantity': quantity,
-                            'price': position['price']
-                            })
-                            position['quantity'] += quantity
-                            position['weight'] += quantity * position['price']/self.portfolio_value
-                            position['value'] += quantity * position['price']
-                            cash['value']-= quantity * position['price']
-                            cash['weight']= cash['value']/self.portfolio_value
-                    
-        elif self.strategy == "Medium Risk": #Low Turnover
-            # Vérifier le nombre de deals du mois
-            if self.deals_count >= 2:  # Maximum 2 deals par mois
-
-                return [], cash, positions
-            
-            else:
-          
-                # Obtenir les poids optimaux
-                target_weights = self.optimize(current_returns)
-
-                # Calculer les ajustements nécessaires
-                for position in positions:
-                    current_weight = position['weight']
-                    target_weight = round(target_weights.get(position['ticker'], 0), 2)
-
-                    
-                    # Calculer la quantité à acheter/vendre
-                    weight_diff = target_weight - current_weight
-                    quantity = int((weight_diff) * self.portfolio_value / position['price'])
-                
-                    if quantity !=0 and self.deals_count <2:
-                         
-                        action = 'BUY' if weight_diff > 0 else 'SELL'
-                        
-                        if (action == 'BUY' and quantity * position['price'] <= cash['value']) or (action == 'SELL' and quantity * position['price'] >= position['value']):
-                            self.deals_count += 1
-                            deals.append({
-                            'product_id': position['product_id'],
-                            'action': action,
-                            'quantity': quantity,
-                            'price': position['price']
-                            })
-                            position['quantity'] += quantity
-                            position['weight'] += quantity * position['price']/self.portfolio_value
-                            position['value'] += quantity * position['price']
-                            cash['value']-= quantity * position['price']
-                            cash['weight']= cash['value']/self.portfolio_value
-                        
-                
+        constraints = self.strategy_plugin.constraints
+        deals_left = None
+        if constraints.max_deals_per_month is not None:
+            deals_left = constraints.max_deals_per_month - self.deals_count
+        
+        stats = self._strategy_stats(positions, current_returns, deals_left)
+        targets = self.strategy_plugin.target_weights(stats)
+        if targets is None:
+            return 0
+        
+        nb_deals = apply_trades(positions, targets, constraints, self.portfolio_value, deals, deals_left)
+        self.deals_count += nb_deals
+        
+        return nb_deals
     
-        elif self.strategy == "High Risk":
+    def _strategy_stats(self, positions: PositionBook, current_returns: pd.DataFrame,
+                        deals_left: Optional[int] = None) -> StrategyStats:
+        """
+        Prépare les données de la semaine transmises à la stratégie.
+        
+        Args:
+            positions: Positions actuelles du portefeuille
+            current_returns: Fenêtre de rendements des actifs
+            deals_left: Nombre de deals encore autorisés ce mois-ci (None : pas de plafond)
             
+        Returns:
+            StrategyStats: Fenêtre de rendements et poids dans l'ordre des positions, poids de l'allocateur à la demande
+        """
+        optimize_params = {'risk_free_rate': self.params['risk_free_rate'], 'max_weight': self.params['max_weight']}
         
-            # Obtenir les poids optimaux
-            target_weights = self.optimize(current_returns, max_weight=0.2)
-
-            # Calculer les ajustements nécessaires
-            for position in positions:
-                current_weight = position['weight']
-                target_weight = round(target_weights.get(position['ticker'], 0), 2)
-
-                
-
-                # Calculer la quantité à acheter/vendre
-                weight_diff = target_weight - current_weight
-
-                quantity = int((weight_diff) * self.portfolio_value / position['price'])
-                
-    
-                if quantity !=0:
-                        
-                    action = 'BUY' if weight_diff > 0 else 'SELL'
-                    
-                    if (action == 'BUY' and quantity * position['price'] <= cash['value']) or (action == 'SELL' and quantity * position['price'] >= position['value']):
-                        self.deals_count += 1
-                        deals.append({
-                        'product_id': position['product_id'],
-                        'action': action,
-                        'quantity': quantity,
-                        'price': position['price']
-                        })
-                        position['quantity'] += quantity
-                        position['weight'] += quantity * position['price']/self.portfolio_value
-                        position['value'] += quantity * position['price']
-                        cash['value']-= quantity * position['price']
-                        cash['weight']= cash['value']/self.portfolio_value
-                    
-
-        return deals, cash, positions
-    
-
+        # Fenêtre de rendements dans l'ordre des positions (zéros pour un actif sans rendements)
+        missing = np.zeros(len(current_returns))
+        returns = np.column_stack([current_returns[ticker].to_numpy(dtype=float)
+                                   if ticker in current_returns.columns else missing
+                                   for ticker in positions.tickers]) if len(positions) else np.zeros((len(current_returns), 0))
+        
+        def optimal_weights() -> np.ndarray:
+            target_weights = self.allocate(current_returns, **optimize_params)
+            return np.array([target_weights.get(ticker, 0) for ticker in positions.tickers], dtype=float)
+        
+        return StrategyStats(returns, positions.weights.copy(), deals_left, optimal_weights)
     
-    def optimize(self, returns_df: pd.DataFrame, risk_free_rate: float = 0.02, max_weight: float = 0.20) -> Dict[str, float]:
+    def _rebalance_due(self, positions: PositionBook, current_returns: pd.DataFrame) -> bool:
         """
-        Optimize portfolio weights to maximize Sharpe ratio
+        Indique si la stratégie doit être exécutée cette semaine.
+        
+        Sans drift_threshold, la stratégie est exécutée chaque lundi. Sinon, elle ne l'est que si
+        les poids ont dérivé de plus de drift_threshold depuis le dernier rééquilibrage sous l'effet
+        des prix, si la volatilité du portefeuille a varié de plus de vol_signal_threshold (en relatif),
+        ou si la stratégie le demande (voir Strategy.rebalance_signal). Ces contrôles n'appellent pas
+        l'optimiseur.
         
         Args:
-            returns_df: DataFrame with historical returns (one column per asset)
-            risk_free_rate: Annual risk-free rate (default: 2%)
-            max_weight: Maximum weight per asset (default: 20%)
+            positions: Positions actuelles et cash du portefeuille
+            current_returns: Fenêtre de rendements des actifs
             
         Returns:
-            Dictionary mapping asset tickers to their optimal weights
+            bool: True s'il faut rééquilibrer
         """
-        # Calculer la matrice de covariance
-        cov_matrix = returns_df.cov()
+        drift_threshold = self.params['drift_threshold']
+        if drift_threshold is None or self.rebalance_weights is None:
+            return True
         
-        # Calculer les rendements moyens
-        mean_returns = returns_df.mean()
+        market_weights = positions.market_weights()
+        weights = dict(zip(positions.product_ids.tolist(), market_weights.tolist()))
+        drift = max((abs(weights.get(product_id, 0.0) - self.rebalance_weights.get(product_id, 0.0))
+                     for product_id in weights.keys() | self.rebalance_weights.keys()), default=0.0)
+        if drift > drift_threshold:
+            return True
         
-        # Fonction objective : maximiser le ratio de Sharpe
-        def objective(weights):
-            portfolio_return = np.sum(mean_returns * weights) * 252  # Annualisé
-            portfolio_volatility = np.sqrt(np.dot(weights.T, np.dot(cov_matrix, weights))) * np.sqrt(252)
-            sharpe_ratio = (portfolio_return - risk_free_rate) / portfolio_volatility
-            return -sharpe_ratio  # On minimise le négatif pour maximiser le ratio
+        stats = self._strategy_stats(positions, current_returns)
+        volatility = float(portfolio_volatility(stats.returns, market_weights))
+        reference = self.rebalance_volatility
+        if not (np.isfinite(volatility) and np.isfinite(reference) and reference > 0):
+            return True
+        if abs(volatility / reference - 1) > self.params['vol_signal_threshold']:
+            return True
         
-        # Contraintes
-        n_assets = len(returns_df.columns)
-        constraints = [
-            {'type': 'eq', 'fun': lambda x: np.sum(x) - 1},  # Somme des poids = 1
-            {'type': 'ineq', 'fun': lambda x: x}  # Poids >= 0
-        ]
-        bounds = tuple((0, max_weight) for _ in range(n_assets))  # Maximum max_weight par actif
+        return self.strategy_plugin.rebalance_signal(stats)
+    
+    def _record_rebalance(self, positions: PositionBook, current_returns: pd.DataFrame) -> None:
+        """Mémorise les poids et la volatilité après un rééquilibrage (mode paresseux uniquement)."""
+        if self.params['drift_threshold'] is None:
+            return
+        market_weights = positions.market_weights()
+        self.rebalance_weights = dict(zip(positions.product_ids.tolist(), market_weights.tolist()))
+        returns = self._strategy_stats(positions, current_returns).returns
+        self.rebalance_volatility = float(portfolio_volatility(returns, market_weights))
+    
+    @timed('allocate')
+    def allocate(self, returns_df: pd.DataFrame, risk_free_rate: float = 0.02, max_weight: float = 0.20) -> Dict[str, float]:
+        """
+        Calcule les poids cibles avec l'allocateur de la stratégie.
         
-        # Poids initiaux (égaux)
-        initial_weights = np.array([1/n_assets] * n_assets)
+        L'allocateur est params['allocator'] ou, à défaut, celui du profil de risque (STRATEGY_ALLOCATORS).
         
-        # Optimisation
-        result = minimize(
-            objective,
-            initial_weights,
-            method='SLSQP',
-            bounds=bounds,
-            constraints=constraints
-        )
+        Avec params['risk_model'] = 'factor', max_sharpe utilise le modèle à facteurs (optimize_factor_model).
         
-        # Obtenir les poids optimaux
-        optimal_weights = result.x
+        Args:
+            returns_df: Rendements historiques (une colonne par actif)
+            risk_free_rate: Taux sans risque annuel (max_sharpe uniquement)
+            max_weight: Poids maximal par actif
+            
+        Returns:
+            Dict[str, float]: Poids cible de chaque actif
+        """
+        allocator = self.params['allocator'] or STRATEGY_ALLOCATORS[self.strategy]
+        if self.params['risk_model'] not in ('sample', 'factor'):
+            raise ValueError(f"Modèle de risque inconnu : {self.params['risk_model']}")
+        if allocator == 'max_sharpe' and self.params['risk_model'] == 'factor':
+            return self.optimize_factor_model(returns_df, risk_free_rate, max_weight)
+        if allocator == 'max_sharpe':
+            return self.optimize(returns_df, risk_free_rate, max_weight, timeout=self.params['optimize_timeout'],
+                                 fallback=self.params['fallback_allocator'])
+        return allocate_weights(allocator, returns_df, max_weight)
+    
+    def get_sectors(self) -> Dict[str, str]:
+        """
+        Récupère le secteur de chaque produit du portefeuille (produits chargés par le dépôt).
         
-        # Créer un dictionnaire des poids optimaux
-        target_weights = dict(zip(returns_df.columns, optimal_weights))
+        Returns:
+            Dict[str, str]: Secteur de chaque ticker
+        """
+        if self.sectors is None:
+            self.sectors = {product.ticker: product.sector for product in self.products}
+        return self.sectors
+    
+    @timed('optimize_factor_model')
+    def optimize_factor_model(self, returns_df: pd.DataFrame, risk_free_rate: float = 0.02,
+                              max_weight: float = 0.20) -> Dict[str, float]:
+        """
+        Maximise le ratio de Sharpe avec le modèle de risque à facteurs (marché + secteurs ms_*).
         
-        return target_weights 
-
+        La covariance n'est pas construite : l'optimisation reste rapide et bien conditionnée
+        pour des milliers de produits (voir risk_models.max_sharpe_weights).
+        
+        Args:
+            returns_df: Rendements historiques (une colonne par actif)
+            risk_free_rate: Taux sans risque annuel
+            max_weight: Poids maximal par actif
+            
+        Returns:
+            Dict[str, float]: Poids optimal de chaque actif
+        """
+        model = FactorRiskModel.from_returns(returns_df, self.get_sectors())
+        weights = max_sharpe_weights(model, returns_df.mean().to_numpy(), risk_free_rate, max_weight)
+        return dict(zip(returns_df.columns, weights))
+    
+    @timed('optimize')
+    def optimize(self, returns_df: pd.DataFrame, risk_free_rate: float = 0.02, max_weight: float = 0.20,
+                 timeout: Optional[float] = None, fallback: Optional[str] = None) -> Dict[str, float]:
+        """
+        Optimize portfolio weights to maximize Sharpe ratio (see allocators.max_sharpe_slsqp)
+        
+        Args:
+            returns_df: DataFrame with historical returns (one column per asset)
+            risk_free_rate: Annual risk-free rate (default: 2%)
+            max_weight: Maximum weight per asset (default: 20%)
+            timeout: Maximum duration of the optimization in seconds (default: none)
+            fallback: Fast allocator (see ALLOCATORS) used if SLSQP fails or times out (default: none,
+                      SLSQP weights are returned as is and a timeout raises OptimizationTimeout)
+            
+        Returns:
+            Dictionary mapping asset tickers to their optimal weights
+        """
+        return max_sharpe_slsqp(returns_df, risk_free_rate, max_weight, timeout, fallback)
     
     def _get_product_id(self, ticker: str) -> int:
         """
@@ -429,11 +754,8 @@ class Simulation:
         Returns:
             int: ID du produit
         """
-        self.cursor.execute("""
-            SELECT id FROM Products WHERE ticker = ?
-        """, (ticker,))
-        result = self.cursor.fetchone()
-        return result[0] if result else None
+        product = self.repository.get(Product, ticker)
+        return product.id if product else None
     
     def _get_current_price(self, ticker: str, date: datetime) -> float:
         """
@@ -449,39 +771,25 @@ class Simulation:
         self.cursor.execute(f"""
             SELECT price FROM Returns_{ticker}
             WHERE date = ?
-        """, (date.strftime("%Y-%m-%d"),))
+        """, (to_day(date),))
         result = self.cursor.fetchone()
         return result[0] if result else None
 
     
 
-    def _save_deals_positions(self, deals: List[Dict[str, Any]], positions: List[Dict[str, Any]], cash: Dict[str, Any], date: datetime) -> None:
+    @timed('save_deals_positions')
+    def _save_deals_positions(self, deals: DealBuffer, positions: PositionBook, date: datetime) -> None:
         """
-        Enregistre les deals dans la base de données et met à jour les positions.
+        Enregistre les deals et met à jour les positions du portefeuille (voir UnitOfWork).
         
         Args:
-            deals: Liste des deals à enregistrer
-            positions: Liste des positions mises à jour
+            deals: Deals de la semaine
+            positions: Positions et cash mis à jour
             date: Date d'exécution des deals
         """
-        # Créer et sauvegarder les deals
-        deal_objects = []
-        for deal in deals:
-            deal_obj = Deal(
-                portfolio_id=self.portfolio_id,
-                product_id=deal['product_id'],
-                date=date.strftime("%Y-%m-%d"),
-                action=deal['action'],
-                quantity=deal['quantity'],
-                price=deal['price']
-            )
-            deal_objects.append(deal_obj)
-        
-        Deal.save_multiple(deal_objects, self.db)
-        
-        # Mettre à jour les positions du portefeuille
-        self.portfolio_value=Portfolio.update_positions(self.db, self.portfolio_id, positions, cash)
-
+        deals.stamp(self.portfolio_id, to_day(date))
+        self.book.merge(positions)
         
-    
-
+        # Deals et positions écrits par l'unité de travail, à son prochain point de validation
+        self.unit_of_work.record(self.portfolio_id, deals, self.book)
+        self.portfolio_value = positions.total_value()
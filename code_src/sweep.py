@@ -0,0 +1,229 @@
+import itertools
+import math
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from strategies import DEFAULT_PARAMS
+from backtest import (PortfolioSetup, PriceHistory, load_portfolio_setup, load_price_history, run_backtest,
+                      summarize_backtest)
+from price_snapshot import ensure_price_snapshot, snapshot_price_history
+
+
+# Paramètres qui déterminent les statistiques mises en cache (fenêtres de rendements et poids optimaux)
+STATS_PARAMS = ('lookback_weeks', 'risk_free_rate', 'max_weight', 'allocator', 'fallback_allocator', 'optimize_timeout',
+                'risk_model')
+
+# État de chaque processus du pool : données de prix reçues une seule fois, cache des statistiques
+# et contexte propre au harnais (période du balayage, configurations du walk-forward, ...)
+_worker_setup: Optional[PortfolioSetup] = None
+_worker_history: Optional[PriceHistory] = None
+_worker_cache: Dict[Any, Any] = {}
+_worker_context: Dict[str, Any] = {}
+
+
+def expand_grid(grid: Dict[str, Iterable[Any]]) -> List[Dict[str, Any]]:
+    """
+    Développe une grille de paramètres en la liste de toutes ses combinaisons.
+
+    Args:
+        grid: Valeurs à tester par paramètre (ex: {'vol_target': [0.08, 0.10], 'max_weight': [0.2, 0.3]})
+
+    Returns:
+        List[Dict[str, Any]]: Une configuration par combinaison
+    """
+    unknown = set(grid) - set(DEFAULT_PARAMS)
+    if unknown:
+        raise ValueError(f"Paramètres inconnus : {', '.join(sorted(unknown))}")
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(list(grid[name]) for name in names))]
+
+
+def prepare_backtests(db: sqlite3.Connection, portfolio_id: int, grid: Dict[str, Iterable[Any]],
+                      snapshot_path: Optional[str] = None
+                      ) -> Tuple[List[Dict[str, Any]], PortfolioSetup, Optional[PriceHistory]]:
+    """
+    Prépare les simulations d'une grille : configurations, portefeuille et prix lus une seule fois.
+
+    Les configurations sont triées de sorte que celles qui partagent les mêmes statistiques (fenêtre,
+    taux sans risque, poids maximal) se suivent : le processus qui les simule les réutilise.
+
+    Args:
+        db: Connexion à la base de données
+        portfolio_id: ID du portefeuille
+        grid: Valeurs à tester par paramètre (voir DEFAULT_PARAMS)
+        snapshot_path: (facultatif) Dossier de l'instantané des prix, exporté s'il est périmé (les prix
+            ne sont alors pas chargés : les processus ouvrent l'instantané)
+
+    Returns:
+        Tuple: Configurations complètes (DEFAULT_PARAMS compris), portefeuille et historique des prix
+        (None avec snapshot_path)
+    """
+    configs = [{**DEFAULT_PARAMS, **config} for config in expand_grid(grid)]
+    configs.sort(key=lambda config: tuple(str(config[name]) for name in STATS_PARAMS))
+
+    setup = load_portfolio_setup(db, portfolio_id)
+    if snapshot_path is None:
+        history = load_price_history(db, setup.tickers)
+    else:
+        history = None
+        ensure_price_snapshot(db, snapshot_path)
+    return configs, setup, history
+
+
+def _init_backtest_worker(setup: PortfolioSetup, history: Optional[PriceHistory], snapshot_path: Optional[str],
+                          context: Dict[str, Any]) -> None:
+    """
+    Reçoit les données partagées (une fois par processus) et vide le cache des statistiques.
+    Avec snapshot_path, les prix sont lus dans l'instantané en mémoire partagée au lieu d'être transmis.
+    """
+    global _worker_setup, _worker_history
+    _worker_setup = setup
+    _worker_history = history if snapshot_path is None else snapshot_price_history(snapshot_path, setup.tickers)
+    _worker_context.clear()
+    _worker_context.update(context)
+    _worker_cache.clear()
+
+
+def worker_context() -> Dict[str, Any]:
+    """Contexte du harnais transmis au processus courant (voir run_backtests)."""
+    return _worker_context
+
+
+def worker_backtest(params: Dict[str, Any], start_date: Optional[str], end_date: Optional[datetime]) -> Dict[str, float]:
+    """
+    Simule une configuration sur les données du processus (exécuté dans un processus du pool).
+
+    Args:
+        params: Paramètres de la stratégie
+        start_date: Date de début (None : date d'enregistrement du client)
+        end_date: Date de fin (None : 31/12/2024)
+
+    Returns:
+        Dict[str, float]: Statistiques de summarize_backtest
+    """
+    performance_df, deals = run_backtest(_worker_setup, _worker_history, params, start_date, end_date,
+                                         stats_cache=_worker_cache)
+    return summarize_backtest(performance_df, deals)
+
+
+def run_backtests(task: Callable[[Any], Dict[str, Any]], items: List[Any], setup: PortfolioSetup,
+                  history: Optional[PriceHistory], context: Dict[str, Any], max_workers: Optional[int] = 1,
+                  snapshot_path: Optional[str] = None) -> Tuple[List[Dict[str, Any]], float]:
+    """
+    Exécute une tâche de simulation pour chaque élément, dans le processus courant ou dans un pool.
+
+    Chaque processus reçoit une fois le portefeuille, les prix (ou l'instantané) et le contexte du
+    harnais ; les éléments sont répartis en lots contigus, de sorte que les éléments voisins, qui
+    partagent leurs statistiques, soient traités par le même processus.
+
+    Args:
+        task: Fonction de niveau module appelée pour chaque élément (voir worker_backtest et worker_context)
+        items: Éléments à traiter (configurations, étapes de walk-forward, ...)
+        setup: Portefeuille simulé
+        history: Historique des prix (None avec snapshot_path)
+        context: Données du harnais transmises à chaque processus
+        max_workers: Nombre de processus (1 : dans le processus courant, None : nombre de CPU)
+        snapshot_path: (facultatif) Dossier de l'instantané des prix ouvert par chaque processus
+
+    Returns:
+        Tuple[List[Dict[str, Any]], float]: Résultat de chaque élément, dans l'ordre, et durée en secondes
+    """
+    start = time.perf_counter()
+    if max_workers == 1:
+        _init_backtest_worker(setup, history, snapshot_path, context)
+        results = [task(item) for item in items]
+    else:
+        workers = max_workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_backtest_worker,
+                                 initargs=(setup, history, snapshot_path, context)) as executor:
+            results = list(executor.map(task, items, chunksize=math.ceil(len(items) / workers)))
+    return results, time.perf_counter() - start
+
+
+def save_results(results: List[Dict[str, Any]], output_path: Optional[str] = None) -> pd.DataFrame:
+    """
+    Rassemble les résultats d'un harnais et les écrit en CSV si demandé.
+
+    Args:
+        results: Une ligne de résultats par élément
+        output_path: (facultatif) Fichier CSV dans lequel écrire les résultats
+
+    Returns:
+        pd.DataFrame: Résultats
+    """
+    results_df = pd.DataFrame(results)
+    if output_path is not None:
+        results_df.to_csv(output_path, index=False)
+        print(f"✅ Résultats enregistrés dans {output_path}")
+    return results_df
+
+
+def _run_config(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Simule une configuration sur la période du balayage (exécuté dans un processus du pool)."""
+    context = worker_context()
+    return {**params, **worker_backtest(params, context['start_date'], context['end_date'])}
+
+
+def run_parameter_sweep(db: sqlite3.Connection, portfolio_id: int, grid: Dict[str, Iterable[Any]],
+                        start_date: Optional[str] = None, end_date: Optional[datetime] = None,
+                        max_workers: Optional[int] = 1,
+                        output_path: Optional[str] = None, snapshot_path: Optional[str] = None) -> pd.DataFrame:
+    """
+    Simule un portefeuille pour chaque combinaison d'une grille de paramètres.
+
+    Les prix sont lus une seule fois dans la base puis transmis une fois à chaque processus. Les
+    configurations sont triées de sorte que celles qui partagent les mêmes statistiques (fenêtre,
+    taux sans risque, poids maximal) soient simulées par le même processus, qui les réutilise.
+    La base n'est pas modifiée.
+
+    Args:
+        db: Connexion à la base de données
+        portfolio_id: ID du portefeuille
+        grid: Valeurs à tester par paramètre (voir DEFAULT_PARAMS)
+        start_date: Date de début (par défaut: date d'enregistrement du client)
+        end_date: Date de fin (par défaut: 31/12/2024)
+        max_workers: Nombre de processus (1 : dans le processus courant, None : nombre de CPU)
+        output_path: (facultatif) Fichier CSV dans lequel écrire les résultats
+        snapshot_path: (facultatif) Dossier de l'instantané des prix (voir price_snapshot.py), exporté
+            s'il est périmé ; les processus l'ouvrent en mémoire partagée au lieu de recevoir les prix
+
+    Returns:
+        pd.DataFrame: Une ligne par configuration : paramètres, valeur finale, performance,
+        statistiques de performance et nombre de deals
+    """
+    configs, setup, history = prepare_backtests(db, portfolio_id, grid, snapshot_path)
+    results, elapsed = run_backtests(_run_config, configs, setup, history,
+                                     {'start_date': start_date, 'end_date': end_date}, max_workers, snapshot_path)
+    print(f"✅ {len(configs)} configurations simulées en {elapsed:.1f} s (portefeuille {portfolio_id}, {setup.strategy})")
+    return save_results(results, output_path)
+
+
+def print_sweep_results(results_df: pd.DataFrame, sort_by: str = 'sharpe_ratio', limit: int = 10) -> None:
+    """
+    Affiche les meilleures configurations d'un balayage de paramètres.
+
+    Args:
+        results_df: Résultat de run_parameter_sweep
+        sort_by: Colonne de tri (décroissant)
+        limit: Nombre de configurations affichées
+    """
+    print(f"\n=== Meilleures configurations ({sort_by}) ===")
+    print(results_df.sort_values(sort_by, ascending=False).head(limit).to_string(index=False))
+
+
+if __name__ == "__main__":
+    from base_builder import BaseModel
+
+    db = BaseModel.get_db_connection()
+    results_df = run_parameter_sweep(
+        db, portfolio_id=1,
+        grid={'vol_target': [0.08, 0.10, 0.12], 'max_weight': [0.2, 0.3], 'lookback_weeks': [8, 12, 26]},
+        max_workers=os.cpu_count(), output_path='sweep_results.csv')
+    print_sweep_results(results_df)
+    db.close()
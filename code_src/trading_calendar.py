@@ -0,0 +1,102 @@
+import sqlite3
+from datetime import datetime
+from typing import Dict, Iterator, List, Union
+
+import numpy as np
+
+from base_builder import from_day, to_day
+
+
+# Le 01/01/1970 (jour 0) est un jeudi : le jour n est un lundi si (n + 3) % 7 == 0
+MONDAY_OFFSET = 3
+
+
+def rebalance_days(start_date: Union[str, datetime, int], end_date: Union[str, datetime, int]) -> np.ndarray:
+    """
+    Calcule les lundis de rééquilibrage entre deux dates.
+
+    Args:
+        start_date: Date de début (ramenée au lundi suivant)
+        end_date: Dernière date incluse
+
+    Returns:
+        np.ndarray: Numéros de jour (int32) des lundis, triés
+    """
+    start, end = to_day(start_date), to_day(end_date)
+    first_monday = start + (-(start + MONDAY_OFFSET)) % 7
+    return np.arange(first_monday, end + 1, 7, dtype=np.int32)
+
+
+def load_price_dates(db: sqlite3.Connection, tickers: List[str]) -> Dict[str, np.ndarray]:
+    """
+    Charge les dates des prix de plusieurs produits (une requête par produit, sur la clé primaire).
+
+    Args:
+        db: Connexion à la base de données
+        tickers: Tickers des produits
+
+    Returns:
+        Dict[str, np.ndarray]: Numéros de jour triés, par ticker
+    """
+    cursor = db.cursor()
+    dates = {}
+    for ticker in dict.fromkeys(tickers):
+        cursor.execute(f"SELECT date FROM Returns_{ticker} ORDER BY date")
+        dates[ticker] = np.array([row[0] for row in cursor.fetchall()], dtype=np.int32)
+    return dates
+
+
+class TradingCalendar:
+    """
+    Calendrier de rééquilibrage précalculé d'une simulation.
+
+    Pour chaque lundi du calendrier et chaque produit, l'indice de la dernière ligne de prix connue
+    à cette date (prix « as-of ») est calculé une fois, en une recherche vectorisée par produit :
+    la simulation n'a plus ni arithmétique de dates ni recherche de prix à faire chaque semaine.
+    """
+
+    def __init__(self, price_dates: Dict[str, np.ndarray], days: np.ndarray):
+        """
+        Initialise le calendrier.
+
+        Args:
+            price_dates: Numéros de jour triés des prix, par ticker (voir load_price_dates)
+            days: Numéros de jour des lundis de rééquilibrage (voir rebalance_days)
+        """
+        self.price_dates = price_dates
+        self.days = np.asarray(days, dtype=np.int32)
+        self.weeks = {int(day): week for week, day in enumerate(self.days)}
+        # Indice de la ligne de prix as-of par ticker et par semaine (-1 si aucun prix connu)
+        self.asof = {ticker: np.searchsorted(dates, self.days, side='right') - 1
+                     for ticker, dates in price_dates.items()}
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def dates(self) -> Iterator[datetime]:
+        """
+        Parcourt les lundis de rééquilibrage.
+
+        Yields:
+            datetime: Lundi de rééquilibrage (à minuit)
+        """
+        for day in self.days:
+            yield from_day(day)
+
+    def asof_row(self, ticker: str, date: Union[datetime, int]) -> int:
+        """
+        Retourne l'indice de la dernière ligne de prix d'un produit connue à une date.
+
+        Args:
+            ticker: Ticker du produit
+            date: Date d'analyse (lundi du calendrier, ou toute autre date)
+
+        Returns:
+            int: Indice dans price_dates[ticker], -1 si aucun prix n'est connu à cette date
+        """
+        day = to_day(date)
+        week = self.weeks.get(day)
+        if week is not None:
+            return int(self.asof[ticker][week])
+        # Date hors calendrier (appel direct de la stratégie) : recherche ponctuelle
+        return int(np.searchsorted(self.price_dates[ticker], day, side='right')) - 1
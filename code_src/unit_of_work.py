@@ -0,0 +1,149 @@
+import sqlite3
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+from base_builder import Deal, Portfolio
+from instrumentation import instrumentation, timed
+from position_book import DealBuffer, PositionBook
+from writer_service import WriterService
+
+
+class UnitOfWork:
+    """
+    Unité de travail : regroupe les écritures des simulations (deals, positions et cash) en transactions.
+
+    Chaque semaine avec des deals, une simulation enregistre ses deals et l'état de ses positions
+    (record) au lieu d'écrire et de valider immédiatement. Les écritures sont appliquées en une seule
+    transaction, avec executemany, aux points de validation : fin de la simulation (end_run), toutes
+    les flush_every_weeks semaines et dès que max_pending_deals deals sont en attente. Seul le dernier
+    état des positions de chaque portefeuille est écrit.
+
+    Avec un service d'écriture (writer), les transactions lui sont confiées au lieu d'être validées
+    par la simulation : elle ne prend pas le verrou d'écriture et n'attend les validations qu'en fin
+    de simulation (end_run). Les deals et les positions d'une validation forment une seule écriture :
+    ils ne peuvent être validés l'un sans l'autre.
+
+    Sans connexion ni service d'écriture (db=None), rien n'est écrit : les deals restent dans le tampon
+    (simulation en mémoire).
+    """
+
+    def __init__(self, db: Optional[sqlite3.Connection], flush_every_weeks: Optional[int] = None,
+                 max_pending_deals: Optional[int] = None, writer: Optional[WriterService] = None):
+        """
+        Initialise l'unité de travail.
+
+        Args:
+            db: Connexion à la base de données (None : simulation en mémoire)
+            flush_every_weeks: (facultatif) Validation toutes les N semaines simulées
+            max_pending_deals: (facultatif) Validation dès que ce nombre de deals est en attente
+            writer: (facultatif) Service d'écriture auquel les transactions sont confiées
+        """
+        self.db = db
+        self.writer = writer
+        self.submitted: List[Future] = []      # Transactions confiées au service d'écriture, non attendues
+        self.flush_every_weeks = flush_every_weeks
+        self.max_pending_deals = max_pending_deals
+
+        self.deals = DealBuffer()
+        self.positions: Dict[int, List[tuple]] = {}     # Dernières positions de chaque portefeuille
+        self.portfolios: Dict[int, tuple] = {}          # Dernières (valeur, cash) de chaque portefeuille
+
+        self.weeks = 0
+        self.commits = 0                # Transactions validées
+        self.commits_saved = 0          # Validations évitées par rapport à une écriture par semaine
+        self.pending_commits = 0        # Validations qu'auraient faites les écritures en attente
+
+    def record(self, portfolio_id: int, deals: DealBuffer, positions: PositionBook) -> float:
+        """
+        Enregistre les deals d'une semaine et l'état des positions qui en résulte.
+
+        Args:
+            portfolio_id: ID du portefeuille
+            deals: Deals de la semaine (portefeuille et date renseignés, voir DealBuffer.stamp)
+            positions: Positions et cash du portefeuille après les deals
+
+        Returns:
+            float: Valeur totale du portefeuille
+        """
+        total_value = positions.total_value()
+        self.deals.extend(deals)
+        if self.persistent:
+            self.positions[portfolio_id] = Portfolio.position_rows(portfolio_id, positions)
+            self.portfolios[portfolio_id] = (total_value, positions.cash)
+            # Écriture directe : une validation pour les deals, une pour les positions
+            self.pending_commits += 2
+            if self.max_pending_deals is not None and len(self.deals) >= self.max_pending_deals:
+                self.flush()
+        return total_value
+
+    @property
+    def persistent(self) -> bool:
+        """Les écritures sont-elles appliquées à une base (connexion ou service d'écriture) ?"""
+        return self.db is not None or self.writer is not None
+
+    def reset_positions(self, portfolio_id: int) -> None:
+        """
+        Remet à zéro les positions d'un portefeuille avant sa simulation (validé avec les écritures suivantes).
+
+        Args:
+            portfolio_id: ID du portefeuille
+        """
+        query = """
+            UPDATE Portfolios_Products
+            SET quantity = ?,
+                weight = ?,
+                value = ?
+            WHERE portfolio_id = ?
+        """
+        if self.writer is not None:
+            self.submitted.append(self.writer.submit(lambda db: db.execute(query, (0, 0, 0, portfolio_id))))
+        elif self.db is not None:
+            self.db.execute(query, (0, 0, 0, portfolio_id))
+
+    def end_week(self) -> None:
+        """Marque la fin d'une semaine simulée (validation toutes les flush_every_weeks semaines)."""
+        self.weeks += 1
+        if self.flush_every_weeks is not None and self.weeks % self.flush_every_weeks == 0:
+            self.flush()
+
+    def end_run(self) -> None:
+        """Marque la fin d'une simulation : les écritures en attente sont validées (et attendues)."""
+        self.flush()
+        submitted, self.submitted = self.submitted, []
+        for future in submitted:
+            future.result()
+
+    @timed('flush')
+    def flush(self) -> None:
+        """Applique les écritures en attente en une seule transaction."""
+        if not self.persistent or not self.pending_commits:
+            return
+        position_rows = [row for rows in self.positions.values() for row in rows]
+        portfolio_rows = [(value, cash, portfolio_id) for portfolio_id, (value, cash) in self.portfolios.items()]
+        if self.writer is not None:
+            # Deals et positions confiés ensemble au service d'écriture (deals copiés : le tampon est vidé ci-dessous)
+            self.submitted.append(self.writer.write_run(self.deals, position_rows, portfolio_rows))
+        else:
+            try:
+                if len(self.deals):
+                    Deal.save_multiple(self.deals, self.db, commit=False)
+                Portfolio.write_positions(self.db, position_rows, portfolio_rows)
+                self.db.commit()
+            except Exception:
+                self.db.rollback()
+                raise
+
+        self.commits += 1
+        self.commits_saved += self.pending_commits - 1
+        instrumentation.count('commits')
+        instrumentation.count('commits_saved', self.pending_commits - 1)
+        self.pending_commits = 0
+        self.deals.clear()
+        self.positions.clear()
+        self.portfolios.clear()
+
+    def __enter__(self) -> 'UnitOfWork':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.end_run()
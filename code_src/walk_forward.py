@@ -0,0 +1,152 @@
+import os
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from base_builder import from_day
+from sweep import prepare_backtests, run_backtests, save_results, worker_backtest, worker_context
+from trading_calendar import rebalance_days
+
+
+class Fold(NamedTuple):
+    """Fenêtres d'une étape de walk-forward : sélection des paramètres (in-sample) puis évaluation (out-of-sample)."""
+
+    index: int
+    in_sample_start: datetime
+    in_sample_end: datetime
+    out_of_sample_start: datetime
+    out_of_sample_end: datetime
+
+
+def make_folds(start_date: datetime, end_date: datetime, in_sample_weeks: int = 52, out_of_sample_weeks: int = 13,
+               step_weeks: Optional[int] = None) -> List[Fold]:
+    """
+    Découpe une période en fenêtres glissantes in-sample / out-of-sample.
+
+    Args:
+        start_date: Date de début (ramenée au lundi suivant)
+        end_date: Date de fin
+        in_sample_weeks: Nombre de semaines de chaque fenêtre in-sample
+        out_of_sample_weeks: Nombre de semaines de chaque fenêtre out-of-sample
+        step_weeks: Décalage entre deux étapes (par défaut: out_of_sample_weeks, fenêtres out-of-sample contiguës)
+
+    Returns:
+        List[Fold]: Étapes complètes contenues dans la période
+    """
+    if step_weeks is None:
+        step_weeks = out_of_sample_weeks
+    mondays = [from_day(day) for day in rebalance_days(start_date, end_date)]
+
+    folds = []
+    for first in range(0, len(mondays) - in_sample_weeks - out_of_sample_weeks + 1, step_weeks):
+        split = first + in_sample_weeks
+        folds.append(Fold(len(folds), mondays[first], mondays[split - 1],
+                          mondays[split], mondays[split + out_of_sample_weeks - 1]))
+    return folds
+
+
+def _backtest(params: Dict[str, Any], start_date: datetime, end_date: datetime) -> Dict[str, float]:
+    """Simule une configuration entre deux dates sur les données du processus."""
+    return worker_backtest(params, start_date.strftime('%Y-%m-%d'), end_date)
+
+
+def _run_fold(fold: Fold) -> Dict[str, Any]:
+    """Sélectionne la meilleure configuration in-sample puis l'évalue out-of-sample (exécuté dans un processus du pool)."""
+    context = worker_context()
+    configs, metric = context['configs'], context['metric']
+    in_sample = [_backtest(config, fold.in_sample_start, fold.in_sample_end) for config in configs]
+    scores = np.array([result[metric] for result in in_sample], dtype=float)
+    best = int(np.nanargmax(scores)) if np.isfinite(scores).any() else 0
+
+    out_of_sample = _backtest(configs[best], fold.out_of_sample_start, fold.out_of_sample_end)
+
+    return {
+        **fold._asdict(),
+        **configs[best],
+        f'in_sample_{metric}': in_sample[best][metric],
+        **{f'oos_{name}': value for name, value in out_of_sample.items()},
+    }
+
+
+def run_walk_forward(db: sqlite3.Connection, portfolio_id: int, grid: Dict[str, Iterable[Any]],
+                     in_sample_weeks: int = 52, out_of_sample_weeks: int = 13, step_weeks: Optional[int] = None,
+                     metric: str = 'sharpe_ratio', start_date: Optional[str] = None,
+                     end_date: Optional[datetime] = None, max_workers: Optional[int] = 1,
+                     output_path: Optional[str] = None, snapshot_path: Optional[str] = None) -> pd.DataFrame:
+    """
+    Valide une stratégie par walk-forward.
+
+    À chaque étape, la configuration de la grille qui maximise metric sur la fenêtre in-sample est
+    évaluée sur la fenêtre out-of-sample suivante. Les prix sont lus une seule fois dans la base et
+    transmis une fois à chaque processus ; les étapes voisines, dont les fenêtres se chevauchent, sont
+    traitées par le même processus et réutilisent ses fenêtres de rendements et poids optimaux.
+    La base n'est pas modifiée.
+
+    Args:
+        db: Connexion à la base de données
+        portfolio_id: ID du portefeuille
+        grid: Valeurs à tester par paramètre (voir DEFAULT_PARAMS)
+        in_sample_weeks: Nombre de semaines de chaque fenêtre in-sample
+        out_of_sample_weeks: Nombre de semaines de chaque fenêtre out-of-sample
+        step_weeks: Décalage entre deux étapes (par défaut: out_of_sample_weeks)
+        metric: Statistique de summarize_backtest à maximiser in-sample
+        start_date: Date de début (par défaut: date d'enregistrement du client)
+        end_date: Date de fin (par défaut: 31/12/2024)
+        max_workers: Nombre de processus (1 : dans le processus courant, None : nombre de CPU)
+        output_path: (facultatif) Fichier CSV dans lequel écrire les résultats
+        snapshot_path: (facultatif) Dossier de l'instantané des prix (voir price_snapshot.py), exporté
+            s'il est périmé ; les processus l'ouvrent en mémoire partagée au lieu de recevoir les prix
+
+    Returns:
+        pd.DataFrame: Une ligne par étape : fenêtres, paramètres retenus, score in-sample et
+        statistiques out-of-sample (préfixe oos_)
+    """
+    configs, setup, history = prepare_backtests(db, portfolio_id, grid, snapshot_path)
+
+    if start_date is None:
+        start_date = setup.registration_date
+    if end_date is None:
+        end_date = datetime(2024, 12, 31)
+    folds = make_folds(datetime.strptime(start_date, '%Y-%m-%d'), end_date, in_sample_weeks, out_of_sample_weeks,
+                       step_weeks)
+    if not folds:
+        raise ValueError("Période trop courte pour une étape de walk-forward")
+
+    # Étapes voisines, dont les fenêtres se chevauchent, traitées par le même processus
+    results, elapsed = run_backtests(_run_fold, folds, setup, history, {'configs': configs, 'metric': metric},
+                                     max_workers, snapshot_path)
+    print(f"✅ {len(folds)} étapes × {len(configs)} configurations en {elapsed:.1f} s "
+          f"(portefeuille {portfolio_id}, {setup.strategy})")
+    return save_results(results, output_path)
+
+
+def print_walk_forward_results(results_df: pd.DataFrame) -> None:
+    """
+    Affiche les résultats out-of-sample d'un walk-forward.
+
+    Args:
+        results_df: Résultat de run_walk_forward
+    """
+    print("\n=== Walk-forward ===")
+    for _, row in results_df.iterrows():
+        print(f"{row['out_of_sample_start']:%Y-%m-%d} → {row['out_of_sample_end']:%Y-%m-%d}  "
+              f"performance {row['oos_performance']:>8.2%}  sharpe {row['oos_sharpe_ratio']:>6.2f}  "
+              f"drawdown {row['oos_max_drawdown']:>8.2%}")
+    # Performance des fenêtres out-of-sample enchaînées (contiguës si step_weeks = out_of_sample_weeks)
+    chained = np.prod(1 + results_df['oos_performance'].to_numpy(dtype=float)) - 1
+    print(f"Performance out-of-sample enchaînée : {chained:.2%}")
+
+
+if __name__ == "__main__":
+    from base_builder import BaseModel
+
+    db = BaseModel.get_db_connection()
+    results_df = run_walk_forward(
+        db, portfolio_id=1,
+        grid={'vol_target': [0.08, 0.10, 0.12], 'max_weight': [0.2, 0.3], 'lookback_weeks': [8, 12]},
+        max_workers=os.cpu_count(), output_path='walk_forward_results.csv')
+    print_walk_forward_results(results_df)
+    db.close()
@@ -0,0 +1,419 @@
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import numpy as np
+
+from base_builder import BaseModel, Deal, Portfolio, get_db_path
+from instrumentation import instrumentation
+from position_book import DealBuffer
+
+
+# Nombre maximal d'écritures en attente avant que les producteurs ne soient bloqués (contre-pression)
+DEFAULT_MAX_QUEUE = 1000
+
+# Nombre maximal d'écritures regroupées dans une transaction
+DEFAULT_MAX_BATCH = 500
+
+# Nombre de latences de validation conservées pour les statistiques
+LATENCY_WINDOW = 10000
+
+# Marqueur d'arrêt du thread d'écriture
+_STOP = object()
+
+
+class WriterService:
+    """
+    Service d'écriture unique : un thread consomme une file d'écritures et les regroupe en transactions.
+
+    SQLite n'accepte qu'un écrivain à la fois : au lieu que chaque producteur (enregistrement d'un
+    client, simulation, ...) prenne le verrou d'écriture et valide ses propres transactions, les
+    écritures sont déposées dans une file et exécutées par un seul thread, propriétaire de sa connexion.
+    Toutes les écritures en attente sont appliquées dans une même transaction (BEGIN IMMEDIATE), jusqu'à
+    max_batch écritures : plus la file est chargée, plus les transactions sont grandes.
+
+    Chaque écriture retourne un Future, résolu avec son résultat (ex: ID créé) une fois la transaction
+    validée. Si une transaction échoue, ses écritures sont rejouées une à une : seule l'écriture fautive
+    est en erreur. Si le thread d'écriture s'arrête sur une erreur (ex: base corrompue ou non migrée),
+    toutes les écritures en attente sont en erreur et les dépôts suivants la lèvent. Au-delà de max_queue écritures en attente, les producteurs attendent (contre-pression).
+
+    Le service est un thread du processus qui l'a démarré : les producteurs de ce processus s'y
+    connectent par get_writer. Un autre processus écrivant dans la même base ouvre son propre service,
+    et SQLite sérialise alors leurs transactions (verrou d'écriture, timeout de connexion).
+    """
+
+    def __init__(self, db_path: Optional[str] = None, max_queue: int = DEFAULT_MAX_QUEUE,
+                 max_batch: int = DEFAULT_MAX_BATCH, put_timeout: Optional[float] = None):
+        """
+        Initialise le service (voir start).
+
+        Args:
+            db_path: (facultatif) Chemin de la base (par défaut: get_db_path())
+            max_queue: Nombre maximal d'écritures en attente
+            max_batch: Nombre maximal d'écritures par transaction
+            put_timeout: (facultatif) Attente maximale d'un producteur quand la file est pleine, en secondes
+                         (queue.Full est alors levée ; par défaut: attente illimitée)
+        """
+        self.db_path = db_path or get_db_path()
+        self.max_batch = max_batch
+        self.put_timeout = put_timeout
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.thread: Optional[threading.Thread] = None
+        self.closed = False
+        self.error: Optional[BaseException] = None     # Erreur ayant arrêté le thread d'écriture
+
+        # Métriques (voir stats), mises à jour par les producteurs et par le thread d'écriture
+        self.lock = threading.Lock()
+        self.submitted = 0              # Écritures déposées
+        self.written = 0                # Écritures validées
+        self.failed = 0                 # Écritures en erreur
+        self.transactions = 0           # Transactions validées
+        self.backpressure_waits = 0     # Dépôts ayant attendu une place dans la file
+        self.max_queue_depth = 0        # Profondeur maximale de la file observée
+        self.commit_latencies = deque(maxlen=LATENCY_WINDOW)  # Durée de chaque transaction, en secondes
+
+    def start(self) -> 'WriterService':
+        """
+        Démarre le thread d'écriture.
+
+        Returns:
+            WriterService: Le service lui-même
+        """
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="fund-writer", daemon=True)
+            self.thread.start()
+        return self
+
+    def submit(self, write: Callable[..., Any], *args: Any) -> Future:
+        """
+        Dépose une écriture dans la file.
+
+        Args:
+            write: Fonction appelée avec la connexion du service puis args ; elle ne doit pas valider
+                   la transaction (ex: save(db, commit=False))
+            *args: Arguments de la fonction
+
+        Returns:
+            Future: Résultat de la fonction, disponible une fois la transaction validée
+        """
+        if self.closed:
+            raise RuntimeError("Le service d'écriture est arrêté")
+        if self.error is not None:
+            raise RuntimeError("Le service d'écriture s'est arrêté sur une erreur") from self.error
+        self.start()
+
+        future = Future()
+        item = (write, args, future)
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            # Contre-pression : le producteur attend que le thread d'écriture libère de la place
+            with self.lock:
+                self.backpressure_waits += 1
+            instrumentation.count('writer_backpressure')
+            self.queue.put(item, timeout=self.put_timeout)
+        with self.lock:
+            self.submitted += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        if self.error is not None:
+            # Thread arrêté pendant le dépôt : l'écriture ne sera pas consommée
+            self._fail_pending()
+        return future
+
+    def save(self, model: BaseModel) -> Future:
+        """
+        Dépose l'enregistrement d'un client, d'un gestionnaire, d'un portefeuille ou d'un deal.
+
+        Args:
+            model: Objet à enregistrer (méthode save(db, commit))
+
+        Returns:
+            Future: ID de l'objet créé
+        """
+        return self.submit(lambda db: model.save(db, commit=False))
+
+    def save_deals(self, deals: Union[DealBuffer, List[Deal]]) -> Future:
+        """
+        Dépose l'enregistrement de plusieurs deals (copiés : le tampon peut être réutilisé aussitôt).
+
+        Args:
+            deals: Deals à enregistrer (tampon DealBuffer, ou liste de Deal)
+
+        Returns:
+            Future: Résolu une fois les deals validés
+        """
+        copy = _copy_deals(deals)
+        return self.submit(lambda db: Deal.save_multiple(copy, db, commit=False))
+
+    def write_positions(self, position_rows: List[tuple], portfolio_rows: List[tuple]) -> Future:
+        """
+        Dépose l'écriture de positions et de valeurs de portefeuilles (voir Portfolio.write_positions).
+
+        Args:
+            position_rows: (quantity, weight, value, portfolio_id, product_id) de chaque position
+            portfolio_rows: (value, cash_value, portfolio_id) de chaque portefeuille
+
+        Returns:
+            Future: Résolu une fois les positions validées
+        """
+        return self.submit(Portfolio.write_positions, position_rows, portfolio_rows)
+
+    def write_run(self, deals: Union[DealBuffer, List[Deal]], position_rows: List[tuple],
+                  portfolio_rows: List[tuple]) -> Future:
+        """
+        Dépose les deals et l'état des positions qui en résulte en une seule écriture (voir UnitOfWork) :
+        ils sont validés ensemble ou en erreur ensemble, y compris lors du rejeu d'une transaction.
+
+        Args:
+            deals: Deals à enregistrer (copiés : le tampon peut être réutilisé aussitôt)
+            position_rows: (quantity, weight, value, portfolio_id, product_id) de chaque position
+            portfolio_rows: (value, cash_value, portfolio_id) de chaque portefeuille
+
+        Returns:
+            Future: Résolu une fois les deals et les positions validés
+        """
+        copy = _copy_deals(deals)
+
+        def write(db: sqlite3.Connection) -> None:
+            if len(copy):
+                Deal.save_multiple(copy, db, commit=False)
+            Portfolio.write_positions(db, position_rows, portfolio_rows)
+
+        return self.submit(write)
+
+    def flush(self) -> None:
+        """Attend que toutes les écritures déposées soient validées (ou en erreur)."""
+        if self.thread is not None:
+            self.queue.join()
+
+    def close(self) -> None:
+        """Valide les écritures en attente puis arrête le thread d'écriture."""
+        if self.closed:
+            return
+        self.closed = True
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(_STOP)
+            self.thread.join()
+
+    def __enter__(self) -> 'WriterService':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Retourne les métriques du service.
+
+        Returns:
+            Dict[str, float]: Écritures déposées, validées et en erreur, transactions, taille moyenne
+            des transactions, profondeur actuelle et maximale de la file, attentes de contre-pression
+            et latences de validation p50/p95/p99 (ms)
+        """
+        with self.lock:
+            latencies = list(self.commit_latencies)
+            stats = {
+                'submitted': self.submitted,
+                'written': self.written,
+                'failed': self.failed,
+                'transactions': self.transactions,
+                'mean_batch_size': self.written / self.transactions if self.transactions else 0.0,
+                'queue_depth': self.queue.qsize(),
+                'max_queue_depth': self.max_queue_depth,
+                'backpressure_waits': self.backpressure_waits,
+            }
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000 if latencies else (0.0, 0.0, 0.0)
+        stats.update({
+            'commit_p50_ms': float(p50),
+            'commit_p95_ms': float(p95),
+            'commit_p99_ms': float(p99),
+        })
+        return stats
+
+    def _run(self) -> None:
+        """Boucle du thread d'écriture : une transaction par lot d'écritures en attente."""
+        db = None
+        batch = []
+        try:
+            db = sqlite3.connect(self.db_path, timeout=10)
+            BaseModel.check_date_encoding(db)
+            stop = False
+            while not stop:
+                item = self.queue.get()
+                if item is _STOP:
+                    self.queue.task_done()
+                    break
+
+                # Regrouper les écritures déjà en attente, sans attendre les suivantes
+                batch = [item]
+                while len(batch) < self.max_batch:
+                    try:
+                        item = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stop = True
+                        self.queue.task_done()
+                        break
+                    batch.append(item)
+
+                self._write_batch(db, batch)
+                for _ in batch:
+                    self.queue.task_done()
+                batch = []
+        except Exception as e:
+            # Thread arrêté : le lot en cours et les écritures en attente ou déposées ensuite sont en erreur
+            self.error = e
+            self._fail(batch, e)
+            for _ in batch:
+                self.queue.task_done()
+            self._fail_pending()
+        finally:
+            if db is not None:
+                db.close()
+
+    def _fail(self, batch: List[tuple], error: BaseException) -> None:
+        """
+        Met en erreur les écritures non résolues d'un lot.
+
+        Args:
+            batch: (fonction, arguments, Future) de chaque écriture
+            error: Erreur transmise aux Future
+        """
+        pending = [future for _, _, future in batch if not future.done()]
+        with self.lock:
+            self.failed += len(pending)
+        instrumentation.count('writer_failures', len(pending))
+        for future in pending:
+            future.set_exception(error)
+
+    def _fail_pending(self) -> None:
+        """Vide la file après l'arrêt du thread d'écriture, en mettant ses écritures en erreur."""
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not _STOP:
+                self._fail([item], self.error)
+            self.queue.task_done()
+
+    def _write_batch(self, db: sqlite3.Connection, batch: List[tuple]) -> None:
+        """
+        Applique un lot d'écritures en une transaction ; en cas d'échec, les rejoue une à une.
+
+        Args:
+            db: Connexion du thread d'écriture
+            batch: (fonction, arguments, Future) de chaque écriture
+        """
+        start = time.perf_counter()
+        try:
+            with instrumentation.timer('writer_commit'):
+                db.execute("BEGIN IMMEDIATE")
+                results = [write(db, *args) for write, args, _ in batch]
+                db.commit()
+        except Exception as e:
+            db.rollback()
+            if len(batch) > 1:
+                for item in batch:
+                    self._write_batch(db, [item])
+                return
+            with self.lock:
+                self.failed += 1
+            instrumentation.count('writer_failures')
+            batch[0][2].set_exception(e)
+            return
+
+        with self.lock:
+            self.commit_latencies.append(time.perf_counter() - start)
+            self.transactions += 1
+            self.written += len(batch)
+        instrumentation.count('commits')
+        instrumentation.count('writer_transactions')
+        instrumentation.count('writer_writes', len(batch))
+        for (_, _, future), result in zip(batch, results):
+            future.set_result(result)
+
+
+def _copy_deals(deals: Union[DealBuffer, List[Deal]]) -> DealBuffer:
+    """
+    Copie des deals à déposer dans la file (le tampon du producteur peut être réutilisé aussitôt).
+
+    Args:
+        deals: Deals à copier (tampon DealBuffer, ou liste de Deal)
+
+    Returns:
+        DealBuffer: Copie des deals
+    """
+    if isinstance(deals, DealBuffer):
+        copy = DealBuffer(len(deals))
+        copy.extend(deals)
+        return copy
+    return DealBuffer.from_deals(deals)
+
+
+# Services d'écriture partagés, par (processus, chemin de la base) : voir get_writer
+_shared_writers: Dict[tuple, WriterService] = {}
+_shared_lock = threading.Lock()
+
+
+def get_writer(db_path: Optional[str] = None) -> WriterService:
+    """
+    Retourne le service d'écriture partagé du processus pour une base (démarré au premier appel).
+
+    Les producteurs d'un processus (enregistrement des clients, simulations sur la base) déposent
+    ainsi leurs écritures dans la même file. Les services sont arrêtés, écritures en attente validées,
+    à la sortie du processus (voir close_shared_writers). Un service arrêté sur une erreur est
+    remplacé au prochain appel.
+
+    Args:
+        db_path: (facultatif) Chemin de la base (par défaut: get_db_path())
+
+    Returns:
+        WriterService: Service d'écriture partagé
+    """
+    # Un processus créé par fork hérite de la table, pas des threads : la clé inclut le processus
+    key = (os.getpid(), os.path.abspath(db_path or get_db_path()))
+    with _shared_lock:
+        writer = _shared_writers.get(key)
+        if writer is None or writer.closed or writer.error is not None:
+            writer = _shared_writers[key] = WriterService(key[1]).start()
+    return writer
+
+
+def writer_for(db: sqlite3.Connection) -> Optional[WriterService]:
+    """
+    Retourne le service d'écriture partagé de la base d'une connexion.
+
+    Args:
+        db: Connexion à la base de données
+
+    Returns:
+        Optional[WriterService]: Service d'écriture, ou None pour une base en mémoire (ex: instantané)
+    """
+    path = next((row[2] for row in db.execute("PRAGMA database_list") if row[1] == 'main'), '')
+    return get_writer(path) if path else None
+
+
+def close_shared_writers(db_path: Optional[str] = None) -> None:
+    """
+    Arrête les services d'écriture partagés du processus, après validation des écritures en attente.
+
+    Args:
+        db_path: (facultatif) Chemin de la base (par défaut: toutes les bases)
+    """
+    path = os.path.abspath(db_path) if db_path else None
+    with _shared_lock:
+        keys = [key for key in _shared_writers if key[0] == os.getpid() and (path is None or key[1] == path)]
+        writers = [_shared_writers.pop(key) for key in keys]
+    for writer in writers:
+        writer.close()
+
+
+atexit.register(close_shared_writers)